@@ -44,11 +44,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the request timings include every other middleware
+    "food.middleware.metrics_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "food.replica.ReplicaMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     'django.middleware.security.SecurityMiddleware',
@@ -59,10 +62,9 @@ ROOT_URLCONF = "core.urls"
 
 SESSION_COOKIE_AGE = 1209600
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
-SESSION_ENGINE = 'django.contrib.sessions.backends.file'
-SESSION_FILE_PATH = '/tmp/django_sessions' 
-SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+# Write-through: reads come from the shared cache, the DB keeps sessions
+# alive across cache restarts and evictions
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 
 LOGIN_URL = 'signin'
 LOGIN_REDIRECT_URL = 'index'
@@ -91,10 +93,133 @@ WSGI_APPLICATION = "core.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
+# Seconds a writer waits for the lock before "database is locked"
+SQLITE_BUSY_TIMEOUT = 20
+
+# DB_ENGINE=postgres switches to PostgreSQL, configured from POSTGRES_* in
+# the environment or .env. POSTGRES_REPLICA_HOST adds a read replica.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+
+def postgres_database(host, port):
+    return {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ.get('POSTGRES_DB', 'fridge'),
+        "USER": os.environ.get('POSTGRES_USER', 'fridge'),
+        "PASSWORD": os.environ.get('POSTGRES_PASSWORD', ''),
+        "HOST": host,
+        "PORT": port,
+        "OPTIONS": {
+            # psycopg 3 connection pool (pip install "psycopg[pool]"), one per
+            # worker process; it replaces persistent connections
+            "pool": {
+                "min_size": int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                "max_size": int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+                "timeout": int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            },
+        },
+        "CONN_MAX_AGE": 0,
+    }
+
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        "default": postgres_database(
+            os.environ.get('POSTGRES_HOST', 'localhost'), os.environ.get('POSTGRES_PORT', '5432')
+        ),
+    }
+    if os.environ.get('POSTGRES_REPLICA_HOST'):
+        DATABASES["replica"] = postgres_database(
+            os.environ['POSTGRES_REPLICA_HOST'], os.environ.get('POSTGRES_REPLICA_PORT', '5432')
+        )
+        # Tests have no replication: read the test primary instead
+        DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+            "OPTIONS": {
+                # Worker threads write concurrently: take the write lock at BEGIN
+                # and wait for it, instead of failing with "database is locked"
+                "transaction_mode": "IMMEDIATE",
+                "timeout": SQLITE_BUSY_TIMEOUT,
+            },
+            # Keep each worker's connection instead of reconnecting per request;
+            # health checks replace one that went bad between requests
+            "CONN_MAX_AGE": int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+            "CONN_HEALTH_CHECKS": True,
+            # A file, not shared-cache memory, so tests see real locking behaviour
+            "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+        }
+    }
+    # Stand-in replica for local runs: by default a second connection to the
+    # same file. Its test database is a separate file, so tests can tell
+    # which one a read went to.
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": os.environ.get('SQLITE_REPLICA_NAME', BASE_DIR / "db.sqlite3"),
+        "TEST": {"NAME": BASE_DIR / "test_replica.sqlite3"},
+    }
+
+DATABASE_ROUTERS = ["food.replica.ReplicaRouter"]
+
+# Alias that read-only views read from (None: everything reads the primary).
+# On by default with a Postgres replica; DB_READ_REPLICA=replica enables the
+# SQLite stand-in.
+DATABASE_READ_REPLICA = os.environ.get(
+    'DB_READ_REPLICA', 'replica' if DB_ENGINE == 'postgres' and 'replica' in DATABASES else ''
+) or None
+# After a write, the browser reads from the primary for this long, so
+# replica lag never hides the user's own changes
+DATABASE_REPLICA_STICKY_SECONDS = 15
+
+
+# Run on every new SQLite connection (food/db.py), in this order
+SQLITE_PRAGMAS = {
+    # Readers no longer block the writer, nor the writer readers
+    "journal_mode": "WAL",
+    # Safe with WAL: a power cut may lose the last commits, never corrupts
+    "synchronous": "NORMAL",
+    "busy_timeout": SQLITE_BUSY_TIMEOUT * 1000,
+    "mmap_size": int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    # Negative means KiB: 64 MiB of page cache per connection
+    "cache_size": int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 1024)),
+    "temp_store": "MEMORY",
+}
+
+
+# Cache
+# Must be shared by every worker process: sessions, expiry counts, metrics
+# and rate limits all live here. Pick one per environment with CACHE_BACKEND:
+#   db        - table in the main database, fine for a single host (default)
+#   file      - files under CACHE_LOCATION, single host only
+#   redis     - CACHE_LOCATION=redis://host:6379/1 (needs redis-py)
+#   memcached - CACHE_LOCATION=host:11211 (needs pymemcache)
+#   locmem    - per process, only for one worker or local experiments
+# On db every cache call is SQL against the primary. A cached read such as
+# the expiry banner is still a SELECT, and each cache write is several
+# statements. That suits sessions on a small install. But the rate limiter,
+# single-flight locks, circuit breaker and metrics write on every Gemini
+# request, so with real AI traffic use redis or memcached to keep those
+# throttling and lock keys off SQLite.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'db')
+
+CACHE_BACKENDS = {
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'food_cache'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / '.cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+    'memcached': ('django.core.cache.backends.memcached.PyMemcacheCache', '127.0.0.1:11211'),
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'fridge'),
+}
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND][0],
+        "LOCATION": os.environ.get('CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1]),
+        "KEY_PREFIX": os.environ.get('CACHE_KEY_PREFIX', 'fridge'),
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 10000} if CACHE_BACKEND in ('db', 'file', 'locmem') else {},
     }
 }
 
@@ -152,6 +277,71 @@ AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',  # Keep the default backend
 ]
 
+# Gemini recipe generation
+GEMINI_API_BASE = os.environ.get('GEMINI_API_BASE', 'https://generativelanguage.googleapis.com/v1beta')
+GEMINI_MODEL = 'gemini-2.5-flash'
+GEMINI_POOL_SIZE = 10
+GEMINI_ASYNC_POOL_SIZE = 100
+GEMINI_CONNECT_TIMEOUT = 5
+GEMINI_READ_TIMEOUT = 30
+GEMINI_MAX_RETRIES = 2
+GEMINI_RETRY_BACKOFF = 0.5
+GEMINI_RETRY_MAX_DELAY = 8
+# Render the suggestion page immediately and stream recipes in over SSE
+GEMINI_STREAM_SUGGESTIONS = True
+# Serve the AI views with their async versions (use when running under ASGI)
+ASYNC_AI_VIEWS = os.environ.get('ASYNC_AI_VIEWS', '') == '1'
+
+# AI recipe suggestion cache (seconds / max rows kept before LRU eviction)
+RECIPE_CACHE_TTL = 60 * 60 * 6
+RECIPE_CACHE_MAX_ENTRIES = 1000
+
+# Token-bucket limits on Gemini calls (free tier: 60 requests per minute).
+# Only upstream calls spend tokens; cached and coalesced answers are free.
+# Waits up to GEMINI_RATE_LIMIT_MAX_WAIT seconds are queued, longer ones get 429.
+GEMINI_RATE_LIMIT_PER_MINUTE = 60
+GEMINI_RATE_LIMIT_BURST = 10
+GEMINI_USER_RATE_LIMIT_PER_MINUTE = 10
+GEMINI_USER_RATE_LIMIT_BURST = 3
+GEMINI_RATE_LIMIT_MAX_WAIT = 2
+
+# Single-flight: identical concurrent Gemini calls share one upstream request.
+# The cross-worker lock must outlive a slow call (timeouts x retries).
+SINGLE_FLIGHT_LOCK_TIMEOUT = 90
+SINGLE_FLIGHT_RESULT_TTL = 30
+SINGLE_FLIGHT_POLL_INTERVAL = 0.1
+
+# Circuit breaker: after this many failed Gemini calls in a row, stop calling
+# for GEMINI_CIRCUIT_RESET_TIMEOUT seconds and suggest saved recipes instead
+GEMINI_CIRCUIT_FAILURE_THRESHOLD = 5
+GEMINI_CIRCUIT_RESET_TIMEOUT = 30
+
+# Ingredient names are normalized ("2 tomatoes, diced" -> "tomato"); names
+# that still miss match an existing ingredient at this trigram similarity
+INGREDIENT_FUZZY_THRESHOLD = 0.7
+INGREDIENT_FUZZY_CANDIDATES = 10
+
+# Expiry banner counts are cached per user and invalidated on grocery changes
+EXPIRY_COUNTS_CACHE_TTL = 60 * 60
+
+# Keyset pagination for the pantry and shopping pages (?page_size= is clamped)
+GROCERY_PAGE_SIZE = 50
+GROCERY_PAGE_SIZE_MAX = 200
+
+# Background recipe jobs: views enqueue, "manage.py recipe_worker" runs them
+RECIPE_JOBS_ENABLED = os.environ.get('RECIPE_JOBS', '') == '1'
+RECIPE_JOB_CONCURRENCY = int(os.environ.get('RECIPE_JOB_CONCURRENCY', 4))
+RECIPE_JOB_MAX_ATTEMPTS = 3
+RECIPE_JOB_RETRY_BACKOFF = 5  # seconds, doubled on every retry
+RECIPE_JOB_LOCK_TIMEOUT = 120  # running jobs older than this are requeued
+RECIPE_JOB_POLL_INTERVAL = 1.0
+
+# Request and Gemini metrics for /metrics: buffered per process and added to
+# the shared cache every METRICS_FLUSH_INTERVAL seconds (None: only on scrape)
+METRICS_FLUSH_INTERVAL = 10
+# When set, /metrics requires "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 JAZZMIN_SETTINGS = {
     "site_title": "Food Groceries",
     "site_header": "My Administration",
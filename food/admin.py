@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Grocery, GroceryType, Ingredient, Receipe, Receipe_Ingredients, ShoppingList
+from .models import Grocery, GroceryType, Ingredient, Receipe, Receipe_Ingredients, ShoppingList, RecipeSuggestionCache, RecipeJob
 
 admin.site.register(Grocery)
 admin.site.register(GroceryType)
@@ -7,3 +7,16 @@ admin.site.register(Ingredient)
 admin.site.register(Receipe)
 admin.site.register(Receipe_Ingredients)
 admin.site.register(ShoppingList)
+
+
+@admin.register(RecipeSuggestionCache)
+class RecipeSuggestionCacheAdmin(admin.ModelAdmin):
+    list_display = ('key', 'model_name', 'hit_count', 'last_accessed', 'expires_at')
+    ordering = ('-last_accessed',)
+
+
+@admin.register(RecipeJob)
+class RecipeJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'user', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    ordering = ('-created_at',)
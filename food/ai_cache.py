@@ -0,0 +1,114 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from . import metrics, singleflight
+from .models import RecipeSuggestionCache
+
+# ============================================
+# AI RECIPE RESPONSE CACHE
+# ============================================
+
+HITS = 'ai_cache_hits'
+MISSES = 'ai_cache_misses'
+
+
+def make_cache_key(ingredients_list, preferences, model, generation_config):
+    """
+    Build a content-addressed key for a recipe request.
+    Ingredients are lower-cased and sorted so the same pantry hits the
+    same entry no matter which order the items came back in.
+    """
+    ingredients = sorted(name.strip().lower() for name in ingredients_list)
+    payload = json.dumps({
+        'ingredients': ingredients,
+        'preferences': preferences.strip().lower(),
+        'model': model,
+        'generation_config': generation_config,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def peek_cached_response(key):
+    """
+    Return the cached response text for key, or None, without counting a
+    hit or miss. For polling while another request fills the entry.
+    """
+    entry = RecipeSuggestionCache.objects.filter(
+        key=key,
+        expires_at__gt=timezone.now()
+    ).only('response_text').first()
+    return entry.response_text if entry is not None else None
+
+
+def record_lookup(key, hit):
+    """Count one lookup of key, keeping hit_count and last_accessed for LRU"""
+    if not hit:
+        metrics.incr(MISSES)
+        return
+
+    RecipeSuggestionCache.objects.filter(key=key).update(
+        hit_count=F('hit_count') + 1,
+        last_accessed=timezone.now()
+    )
+    metrics.incr(HITS)
+
+
+def get_cached_response(key):
+    """Return the cached response text for key, or None on a miss"""
+    response_text = peek_cached_response(key)
+    record_lookup(key, response_text is not None)
+    return response_text
+
+
+def store_response(key, model, response_text):
+    """Save a response and evict expired and least recently used entries"""
+    now = timezone.now()
+    ttl = getattr(settings, 'RECIPE_CACHE_TTL', 60 * 60 * 6)
+
+    RecipeSuggestionCache.objects.update_or_create(
+        key=key,
+        defaults={
+            'model_name': model,
+            'response_text': response_text,
+            'last_accessed': now,
+            'expires_at': now + timedelta(seconds=ttl),
+        }
+    )
+    evict()
+
+
+def evict():
+    """Drop expired entries, then trim to RECIPE_CACHE_MAX_ENTRIES by LRU"""
+    RecipeSuggestionCache.objects.filter(expires_at__lte=timezone.now()).delete()
+
+    max_entries = getattr(settings, 'RECIPE_CACHE_MAX_ENTRIES', 1000)
+    stale_ids = RecipeSuggestionCache.objects.order_by(
+        '-last_accessed'
+    ).values_list('id', flat=True)[max_entries:]
+    stale_ids = list(stale_ids)
+    if stale_ids:
+        RecipeSuggestionCache.objects.filter(id__in=stale_ids).delete()
+
+
+def purge(expired_only=False):
+    """Delete cache entries, returns the number of rows removed"""
+    entries = RecipeSuggestionCache.objects.all()
+    if expired_only:
+        entries = entries.filter(expires_at__lte=timezone.now())
+    deleted, _ = entries.delete()
+    return deleted
+
+
+def get_stats():
+    return {
+        'entries': RecipeSuggestionCache.objects.count(),
+        'hits': metrics.get_counter(HITS),
+        'misses': metrics.get_counter(MISSES),
+        'coalesced': metrics.get_counter(singleflight.COALESCED),
+        'upstream_calls': metrics.get_counter(singleflight.UPSTREAM_CALLS),
+    }
@@ -0,0 +1,329 @@
+import json
+import os
+import statistics
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import gemini, metrics
+from .cookable import recipe_index
+from .fake_gemini import FakeGeminiServer
+from .models import Grocery, GroceryType, Receipe, RecipeJob, ShoppingList
+from .recipes import clean_recipe, create_recipe
+from .seed import seed_data
+
+# ============================================
+# VIEW BENCHMARKS
+# ============================================
+#
+# Seeds a data set, drives every URL in food/urls.py through the test
+# client and records the queries and wall time of each request. Gemini
+# is a local FakeGeminiServer, so runs are offline and repeatable.
+# Each data size runs in a transaction that is rolled back afterwards.
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'benchmark_baseline.json'
+
+# Per size: seed_data() arguments. groceries and shopping are per user.
+SIZES = {
+    'small': {'users': 5, 'groceries': 50, 'shopping': 10, 'recipes': 200, 'ingredients': 300},
+    'medium': {'users': 20, 'groceries': 500, 'shopping': 50, 'recipes': 2000, 'ingredients': 1500},
+    'large': {'users': 50, 'groceries': 2000, 'shopping': 200, 'recipes': 20000, 'ingredients': 5000},
+}
+
+# A request may take this many times its baseline time, plus SLACK_MS
+TIME_TOLERANCE = 1.5
+SLACK_MS = 5
+
+GEMINI_RECIPES = json.dumps([{
+    "name": "Benchmark Frittata",
+    "summary": "Eggs and whatever is about to expire.",
+    "ingredients": [{"name": "Egg", "quantity": 4, "unit": "pcs"}, {"name": "Spinach", "quantity": 1, "unit": "cup"}],
+    "steps": ["Whisk the eggs.", "Bake with the spinach."],
+    "cook_time_minutes": 20,
+    "difficulty": "Easy"
+}])
+
+
+class ViewBenchmark:
+    """
+    Scenarios for one seeded user. Each scenario method does its setup
+    (not measured) and returns the request to time.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.client = Client()
+        self.client.force_login(user)
+        self.grocery_type = GroceryType.objects.first()
+        self.recipe = Receipe.objects.order_by('-id').first()
+
+    def scenarios(self):
+        """(name, method) pairs; a name is the URL name, optionally ':variant'"""
+        return [
+            (name, getattr(self, name.replace(':', '__')))
+            for name in [
+                'index', 'index:search', 'add', 'add:post', 'edit', 'edit:post', 'delete',
+                'grocery_search', 'grocery_page', 'import_groceries', 'export_groceries',
+                'bulk_edit_groceries', 'shopping', 'shopping_grocery_page',
+                'add_to_shopping_list', 'bulk_add_to_shopping_list', 'remove_from_shopping_list',
+                'signin', 'signup', 'signout',
+                'suggest_recipes', 'stream_recipes', 'save_recipe', 'refine_recipe', 'recipe_job_status',
+                'view_saved_recipes', 'cookable_now', 'recipe_detail', 'delete_recipe', 'metrics',
+            ]
+        ]
+
+    def make_grocery(self):
+        return Grocery.objects.create(
+            grocery_name='Benchmark milk', ex_date=date.today() + timedelta(days=3),
+            grocerie_type=self.grocery_type, user=self.user
+        )
+
+    def grocery_form(self):
+        return {
+            'grocery_name': 'Benchmark milk',
+            'ex_date': (date.today() + timedelta(days=5)).isoformat(),
+            'quantity': 2,
+            'grocerie_type': self.grocery_type.pk,
+        }
+
+    def index(self):
+        return lambda: self.client.get(reverse('index'))
+
+    def index__search(self):
+        return lambda: self.client.get(reverse('index'), {'search': 'mil'})
+
+    def add(self):
+        return lambda: self.client.get(reverse('add'))
+
+    def add__post(self):
+        return lambda: self.client.post(reverse('add'), self.grocery_form())
+
+    def edit(self):
+        grocery = self.make_grocery()
+        return lambda: self.client.get(reverse('edit', args=[grocery.pk]))
+
+    def edit__post(self):
+        grocery = self.make_grocery()
+        return lambda: self.client.post(reverse('edit', args=[grocery.pk]), self.grocery_form())
+
+    def delete(self):
+        grocery = self.make_grocery()
+        return lambda: self.client.post(reverse('delete', args=[grocery.pk]))
+
+    def grocery_search(self):
+        return lambda: self.client.get(reverse('grocery_search'), {'q': 'tom'})
+
+    def grocery_page(self):
+        # The second page, as infinite scroll asks for it
+        after = self.client.get(reverse('grocery_page')).json()['next']
+        return lambda: self.client.get(reverse('grocery_page'), {'after': after})
+
+    def shopping(self):
+        return lambda: self.client.get(reverse('shopping'))
+
+    def shopping_grocery_page(self):
+        after = self.client.get(reverse('shopping_grocery_page')).json()['next']
+        return lambda: self.client.get(reverse('shopping_grocery_page'), {'after': after})
+
+    def add_to_shopping_list(self):
+        grocery = self.make_grocery()
+        return lambda: self.client.post(reverse('add_to_shopping_list', args=[grocery.pk]))
+
+    def import_groceries(self):
+        upload = (
+            'grocery_name,ex_date,quantity,category\n'
+            + f'Benchmark milk,{date.today().isoformat()},1,{self.grocery_type.type_name}\n' * 50
+        )
+        return lambda: self.client.post(reverse('import_groceries'), {
+            'file': SimpleUploadedFile('groceries.csv', upload.encode(), content_type='text/csv')
+        })
+
+    def export_groceries(self):
+        def request():
+            response = self.client.get(reverse('export_groceries'))
+            b''.join(response.streaming_content)
+            return response
+        return request
+
+    def bulk_edit_groceries(self):
+        ids = list(Grocery.objects.filter(user=self.user).values_list('pk', flat=True)[:50])
+        return lambda: self.client.post(
+            reverse('bulk_edit_groceries'), {'action': 'shift_expiry', 'ids': ids, 'days': 1},
+            content_type='application/json'
+        )
+
+    def bulk_add_to_shopping_list(self):
+        return lambda: self.client.post(reverse('bulk_add_to_shopping_list'), {'expiring': '1'})
+
+    def remove_from_shopping_list(self):
+        item = ShoppingList.objects.create(grocery=self.make_grocery(), user=self.user)
+        return lambda: self.client.post(reverse('remove_from_shopping_list', args=[item.pk]))
+
+    def signin(self):
+        return lambda: Client().get(reverse('signin'))
+
+    def signup(self):
+        return lambda: Client().get(reverse('signup'))
+
+    def signout(self):
+        client = Client()
+        client.force_login(self.user)
+        return lambda: client.post(reverse('signout'))
+
+    def suggest_recipes(self):
+        return lambda: self.client.get(reverse('suggest_recipes'))
+
+    def stream_recipes(self):
+        def request():
+            response = self.client.get(reverse('stream_recipes'))
+            b''.join(response.streaming_content)
+            return response
+        return request
+
+    def save_recipe(self):
+        return lambda: self.client.post(
+            reverse('save_recipe'), {'recipe': json.loads(GEMINI_RECIPES)[0]}, content_type='application/json'
+        )
+
+    def refine_recipe(self):
+        return lambda: self.client.post(
+            reverse('refine_recipe'),
+            {'recipes': json.loads(GEMINI_RECIPES), 'preferences': 'vegetarian'},
+            content_type='application/json'
+        )
+
+    def recipe_job_status(self):
+        job = RecipeJob.objects.create(
+            user=self.user, kind=RecipeJob.SUGGEST, dedup_key=f'benchmark-{time.monotonic_ns()}',
+            status=RecipeJob.DONE, result=json.loads(GEMINI_RECIPES)
+        )
+        return lambda: self.client.get(reverse('recipe_job_status', args=[job.pk]))
+
+    def view_saved_recipes(self):
+        return lambda: self.client.get(reverse('view_saved_recipes'))
+
+    def cookable_now(self):
+        return lambda: self.client.get(reverse('cookable_now'))
+
+    def recipe_detail(self):
+        return lambda: self.client.get(reverse('recipe_detail', args=[self.recipe.pk]))
+
+    def metrics(self):
+        # Flushed here, so the scrape's own flush has the same (empty) work every run
+        metrics.flush()
+        return lambda: Client().get(reverse('metrics'))
+
+    def delete_recipe(self):
+        recipe = create_recipe(clean_recipe(json.loads(GEMINI_RECIPES)[0]))
+        return lambda: self.client.post(reverse('delete_recipe', args=[recipe.pk]))
+
+
+def committed(func):
+    """
+    Call func and run the on_commit callbacks it registers. Everything here
+    is rolled back in the end, so they would otherwise never run.
+    """
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        return func()
+
+
+def measure(prepare, repeat):
+    """Median milliseconds and most queries over repeat runs, after a warm-up"""
+    committed(committed(prepare))
+    timings, queries = [], 0
+    for _ in range(repeat):
+        request = committed(prepare)
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = committed(request)
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise AssertionError(f"HTTP {response.status_code}: {response.content[:200]!r}")
+        timings.append(elapsed * 1000)
+        queries = max(queries, len(captured))
+    return {'queries': queries, 'ms': round(statistics.median(timings), 2)}
+
+
+def run_size(params, repeat=5, only=None):
+    """Seed one data size, measure every scenario, then roll it all back"""
+    with transaction.atomic():
+        counts = seed_data(prefix='benchmark', **params)
+        # The index may hold recipes from an earlier, rolled-back size
+        recipe_index.reset()
+        benchmark = ViewBenchmark(counts['users'][0])
+        results = {}
+        for name, prepare in benchmark.scenarios():
+            if only and name not in only:
+                continue
+            try:
+                with transaction.atomic():
+                    results[name] = measure(prepare, repeat)
+            except Exception as e:
+                # Reported as a regression, the other scenarios still run
+                results[name] = {'error': f"{type(e).__name__}: {e}"}
+        transaction.set_rollback(True)
+    recipe_index.reset()
+    return results
+
+
+def run_benchmarks(sizes, repeat=5, only=None):
+    """
+    Returns: {size name: {scenario: {'queries': n, 'ms': median}}}, or
+    {'error': message} for a scenario that failed
+    """
+    with FakeGeminiServer(text=GEMINI_RECIPES) as server, \
+            override_settings(GEMINI_API_BASE=server.base_url,
+                              GEMINI_RATE_LIMIT_PER_MINUTE=10 ** 6,
+                              GEMINI_RATE_LIMIT_BURST=10 ** 6,
+                              GEMINI_USER_RATE_LIMIT_PER_MINUTE=10 ** 6,
+                              GEMINI_USER_RATE_LIMIT_BURST=10 ** 6), \
+            mock.patch.dict(os.environ, {'GEMINI_API_KEY': 'benchmark'}):
+        gemini.reset_session()
+        try:
+            return {name: run_size(params, repeat, only) for name, params in sizes.items()}
+        finally:
+            gemini.reset_session()
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def regressions(results, baseline, check_time=True):
+    """
+    Compare a run with the baseline. More queries than the baseline is
+    always a regression; time only beyond TIME_TOLERANCE and SLACK_MS.
+    Returns: list of messages, empty when nothing regressed
+    """
+    problems = []
+    for size, scenarios in results.items():
+        for name, result in scenarios.items():
+            if 'error' in result:
+                problems.append(f"{size} {name}: {result['error']}")
+                continue
+            expected = baseline.get(size, {}).get(name)
+            if expected is None or 'error' in expected:
+                continue
+            if result['queries'] > expected['queries']:
+                problems.append(f"{size} {name}: {result['queries']} queries, baseline {expected['queries']}")
+            limit = expected['ms'] * TIME_TOLERANCE + SLACK_MS
+            if check_time and result['ms'] > limit:
+                problems.append(f"{size} {name}: {result['ms']:.1f} ms, baseline {expected['ms']:.1f} ms")
+    return problems
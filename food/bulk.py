@@ -0,0 +1,91 @@
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import DateField, ExpressionWrapper, F
+
+from .expiry import invalidate_expiry_counts
+from .models import Grocery, GroceryType, ShoppingList
+
+# ============================================
+# BULK GROCERY EDITS
+# ============================================
+#
+# Every action is scoped to the user and runs a fixed number of queries,
+# whatever the number of groceries. Deletes send post_delete, whose
+# receiver drops the cached expiry counts once per delete; queryset
+# updates send no post_save, so the counts are dropped here.
+
+ACTIONS = ('delete', 'delete_expired', 'shift_expiry', 'set_category')
+
+# Furthest an expiry date can be moved in one go, either way
+MAX_SHIFT_DAYS = 3650
+
+# Ids accepted per request
+MAX_IDS = 5000
+
+
+def _selected(user, data):
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        return None, "Select at least one grocery"
+    if len(ids) > MAX_IDS:
+        return None, f"Select at most {MAX_IDS} groceries at a time"
+    try:
+        ids = [int(pk) for pk in ids]
+    except (TypeError, ValueError):
+        return None, "ids must be grocery ids"
+    return Grocery.objects.filter(user=user, pk__in=ids), None
+
+
+def delete_groceries(groceries):
+    """
+    Delete a queryset of groceries and their shopping list entries.
+    The entries go first in one DELETE, so the groceries' own delete()
+    has nothing left to cascade to.
+    Returns the number of groceries deleted.
+    """
+    with transaction.atomic():
+        ShoppingList.objects.filter(grocery__in=groceries).delete()
+        _, deleted = groceries.delete()
+    return deleted.get(Grocery._meta.label, 0)
+
+
+def apply_action(user, data):
+    """
+    Run one bulk action from a request payload for user's groceries.
+    Returns: (number of groceries changed, None) or (None, error message)
+    """
+    action = data.get('action')
+    if action not in ACTIONS:
+        return None, f"Unknown action. Use one of: {', '.join(ACTIONS)}"
+
+    if action == 'delete_expired':
+        groceries = Grocery.objects.filter(user=user, ex_date__lt=date.today())
+    else:
+        groceries, error = _selected(user, data)
+        if error:
+            return None, error
+
+    if action in ('delete', 'delete_expired'):
+        return delete_groceries(groceries), None
+
+    if action == 'shift_expiry':
+        try:
+            days = int(data.get('days'))
+        except (TypeError, ValueError):
+            return None, "days must be a whole number"
+        if not days or abs(days) > MAX_SHIFT_DAYS:
+            return None, f"days must be between -{MAX_SHIFT_DAYS} and {MAX_SHIFT_DAYS}, and not 0"
+        count = groceries.update(
+            ex_date=ExpressionWrapper(F('ex_date') + timedelta(days=days), output_field=DateField())
+        )
+
+    else:
+        category = GroceryType.objects.filter(pk=data.get('category')).first() \
+            if str(data.get('category', '')).isdigit() else None
+        if category is None:
+            return None, "Choose an existing category"
+        count = groceries.update(grocerie_type=category)
+
+    invalidate_expiry_counts(user.pk)
+    return count, None
@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# ============================================
+# CIRCUIT BREAKER FOR THE GEMINI API
+# ============================================
+#
+# closed:    calls go through, consecutive failures are counted
+# open:      GEMINI_CIRCUIT_FAILURE_THRESHOLD failures in a row; calls
+#            fail instantly for GEMINI_CIRCUIT_RESET_TIMEOUT seconds
+# half-open: after that, one trial call is let through; success closes
+#            the circuit, failure opens it again
+#
+# State lives in the shared cache so every worker trips together.
+
+
+class CircuitBreaker:
+    def __init__(self, name):
+        prefix = f'food:circuit:{name}:'
+        self.failures_key = prefix + 'failures'
+        self.opened_key = prefix + 'opened_at'
+        self.trial_key = prefix + 'trial'
+
+    def retry_after(self):
+        """Seconds until a trial call is allowed, 0 when the circuit is closed"""
+        opened_at = cache.get(self.opened_key)
+        if opened_at is None:
+            return 0
+        return max(0.0, opened_at + settings.GEMINI_CIRCUIT_RESET_TIMEOUT - time.time())
+
+    def is_open(self):
+        return self.retry_after() > 0
+
+    def allow_request(self):
+        opened_at = cache.get(self.opened_key)
+        if opened_at is None:
+            return True
+        if time.time() - opened_at < settings.GEMINI_CIRCUIT_RESET_TIMEOUT:
+            return False
+        # Half-open: only the first caller gets to try
+        trial_timeout = settings.GEMINI_CONNECT_TIMEOUT + settings.GEMINI_READ_TIMEOUT
+        return cache.add(self.trial_key, True, timeout=trial_timeout)
+
+    def record_success(self):
+        cache.delete_many([self.failures_key, self.opened_key, self.trial_key])
+
+    def record_failure(self):
+        try:
+            failures = cache.incr(self.failures_key)
+        except ValueError:
+            cache.set(self.failures_key, 1, timeout=None)
+            failures = 1
+
+        if failures >= settings.GEMINI_CIRCUIT_FAILURE_THRESHOLD or cache.get(self.trial_key):
+            cache.set(self.opened_key, time.time(), timeout=None)
+            cache.delete(self.trial_key)
+
+
+gemini_breaker = CircuitBreaker('gemini')
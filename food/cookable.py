@@ -0,0 +1,313 @@
+import heapq
+import threading
+import time
+from array import array
+from collections import defaultdict
+from datetime import date
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .expiry import EXPIRING_SOON_DAYS
+from .ingredients import match_ingredients
+from .models import Grocery, Ingredient, Receipe, Receipe_Ingredients
+
+# ============================================
+# "COOKABLE NOW" MATCHING
+# ============================================
+#
+# Every process keeps an inverted index of saved recipes in memory: each
+# recipe gets a bit position, each ingredient a bitset of the recipes that
+# use it. Scoring a pantry adds those bitsets into bit-sliced counters, so
+# the work is a few hundred big-integer operations instead of a pass over
+# every matching recipe row.
+#
+# Recipe saves and deletes bump a version in the shared cache and record
+# which recipes changed; each process re-reads only those recipes before
+# its next query, and does a full reload if it fell too far behind.
+
+VERSION_KEY = 'food:cookable:version'
+CHANGES_PREFIX = 'food:cookable:changes:'
+CHANGES_TTL = 60 * 60
+MAX_REPLAY = 500
+
+# Weights are whole units so they can be summed bitwise: a fresh item is
+# worth WEIGHT_SCALE, one expiring today twice that
+WEIGHT_SCALE = EXPIRING_SOON_DAYS
+
+
+def grocery_weight(ex_date, today):
+    """Weight in units for a non-expired grocery, higher the sooner it expires"""
+    days_left = (ex_date - today).days
+    return WEIGHT_SCALE + max(0, EXPIRING_SOON_DAYS - days_left)
+
+
+def _add_to_slices(slices, level, bits):
+    """Add bits * 2**level into the bit-sliced counters (ripple carry)"""
+    carry = bits
+    while carry:
+        while len(slices) <= level:
+            slices.append(0)
+        slices[level], carry = slices[level] ^ carry, slices[level] & carry
+        level += 1
+
+
+def _best(slices, mask):
+    """Highest counter value among the recipes in mask, and who has it"""
+    value = 0
+    for level in reversed(range(len(slices))):
+        hit = mask & slices[level]
+        if hit:
+            mask, value = hit, value | (1 << level)
+    return value, mask
+
+
+def _to_bitset(slots, width):
+    buf = bytearray(width // 8 + 1)
+    for slot in slots:
+        buf[slot >> 3] |= 1 << (slot & 7)
+    return int.from_bytes(buf, 'little')
+
+
+def _iter_bits(bits):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class RecipeIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.version = None
+        self.slots = {}         # recipe id -> bit position
+        self.recipe_ids = []    # bit position -> recipe id (None once removed)
+        self.ingredients = {}   # recipe id -> ingredient ids
+        self.postings = {}      # ingredient id -> array of bit positions
+        self.dense = {}         # ingredient id -> bitset, for common ingredients
+        self.by_size = defaultdict(int)  # ingredient count -> bitset of recipes
+
+    def reset(self):
+        """Forget everything; the next query reloads from the database"""
+        with self.lock:
+            self._clear()
+
+    # --- maintenance ---
+
+    def _is_dense(self, ingredient_id):
+        # A bitset costs one bit per slot, a posting array 64 bits per entry
+        return len(self.postings.get(ingredient_id, ())) * 64 >= len(self.recipe_ids)
+
+    def _bitset(self, ingredient_id):
+        if ingredient_id in self.dense:
+            return self.dense[ingredient_id]
+        return _to_bitset(self.postings.get(ingredient_id, ()), len(self.recipe_ids))
+
+    def _refresh_dense(self, ingredient_ids):
+        """Keep bitsets only for ingredients where they are the smaller form"""
+        for ingredient_id in ingredient_ids:
+            if not self._is_dense(ingredient_id):
+                self.dense.pop(ingredient_id, None)
+            elif ingredient_id not in self.dense:
+                self.dense[ingredient_id] = _to_bitset(self.postings[ingredient_id], len(self.recipe_ids))
+
+    def _remove(self, recipe_id):
+        slot = self.slots.pop(recipe_id, None)
+        if slot is None:
+            return ()
+        self.recipe_ids[slot] = None
+        ingredient_ids = self.ingredients.pop(recipe_id)
+        self.by_size[len(ingredient_ids)] &= ~(1 << slot)
+        for ingredient_id in ingredient_ids:
+            self.postings[ingredient_id].remove(slot)
+            if ingredient_id in self.dense:
+                self.dense[ingredient_id] &= ~(1 << slot)
+        return ingredient_ids
+
+    def _add(self, recipe_id, ingredient_ids):
+        """Give a recipe the next slot; by_size is left to the caller"""
+        slot = len(self.recipe_ids)
+        self.recipe_ids.append(recipe_id)
+        self.slots[recipe_id] = slot
+        self.ingredients[recipe_id] = ingredient_ids
+        for ingredient_id in ingredient_ids:
+            self.postings.setdefault(ingredient_id, array('l')).append(slot)
+            if ingredient_id in self.dense:
+                self.dense[ingredient_id] |= 1 << slot
+        return slot
+
+    def _load(self):
+        self._clear()
+        recipe_ingredients = defaultdict(set)
+        rows = Receipe_Ingredients.objects.order_by().values_list('receipe_id', 'ingredient_id')
+        for recipe_id, ingredient_id in rows.iterator(chunk_size=10000):
+            recipe_ingredients[recipe_id].add(ingredient_id)
+        # Recipes without ingredients can never match, so they get no slot
+        sizes = defaultdict(list)
+        for recipe_id in sorted(recipe_ingredients):
+            ingredient_ids = tuple(recipe_ingredients[recipe_id])
+            sizes[len(ingredient_ids)].append(self._add(recipe_id, ingredient_ids))
+        # Built in one go: setting bits one at a time on a growing int is quadratic
+        for size, slots in sizes.items():
+            self.by_size[size] = _to_bitset(slots, len(self.recipe_ids))
+        self._refresh_dense(self.postings)
+
+    def _reload_recipes(self, recipe_ids):
+        recipe_ingredients = defaultdict(set)
+        rows = Receipe_Ingredients.objects.filter(receipe_id__in=recipe_ids).values_list('receipe_id', 'ingredient_id')
+        for recipe_id, ingredient_id in rows:
+            recipe_ingredients[recipe_id].add(ingredient_id)
+
+        touched = set()
+        for recipe_id in sorted(recipe_ids):
+            touched.update(self._remove(recipe_id))
+            if recipe_ingredients.get(recipe_id):
+                ingredient_ids = tuple(recipe_ingredients[recipe_id])
+                self.by_size[len(ingredient_ids)] |= 1 << self._add(recipe_id, ingredient_ids)
+                touched.update(ingredient_ids)
+        self._refresh_dense(touched)
+
+    def sync(self):
+        """Catch up with recipe changes made by any process"""
+        current = cache.get(VERSION_KEY)
+        if current is None:
+            # Seeded from the clock so a wiped cache never repeats a version
+            cache.add(VERSION_KEY, time.time_ns() // 1000, timeout=None)
+            current = cache.get(VERSION_KEY)
+
+        if current == self.version:
+            return
+        # Changed recipes take new slots, so compact once half are stale
+        stale = len(self.recipe_ids) > 2 * len(self.slots) + MAX_REPLAY
+        if self.version is None or stale or not 0 < current - self.version <= MAX_REPLAY:
+            self._load()
+        else:
+            changes = cache.get_many([f'{CHANGES_PREFIX}{v}' for v in range(self.version + 1, current + 1)])
+            if len(changes) < current - self.version:
+                self._load()
+            else:
+                self._reload_recipes(set().union(*changes.values()))
+        self.version = current
+
+    # --- queries ---
+
+    def rank(self, weights, limit):
+        """
+        Recipes ranked by sum of matched weights / number of ingredients.
+        Returns: list of (recipe_id, weight_sum, ingredient_count)
+        """
+        slices, candidates = [], 0
+        for ingredient_id, units in weights.items():
+            if ingredient_id not in self.postings:
+                continue
+            bits = self._bitset(ingredient_id)
+            candidates |= bits
+            for level in range(units.bit_length()):
+                if units >> level & 1:
+                    _add_to_slices(slices, level, bits)
+
+        # One heap entry per recipe size: the best recipes of that size
+        heap = []
+
+        def push(size, mask):
+            if mask:
+                value, best = _best(slices, mask)
+                heapq.heappush(heap, (-value / size, (best & -best).bit_length(), size, value, best, mask))
+
+        for size, mask in self.by_size.items():
+            push(size, mask & candidates)
+
+        ranked = []
+        while heap and len(ranked) < limit:
+            _, _, size, value, best, mask = heapq.heappop(heap)
+            for slot in _iter_bits(best):
+                ranked.append((self.recipe_ids[slot], value, size))
+                if len(ranked) == limit:
+                    break
+            push(size, mask & ~best)
+        return ranked
+
+
+recipe_index = RecipeIndex()
+
+
+def recipes_changed(*recipe_ids):
+    """Tell every process's index to re-read these recipes"""
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.incr(VERSION_KEY)
+    cache.set(f'{CHANGES_PREFIX}{version}', set(recipe_ids), CHANGES_TTL)
+
+
+def recipes_changed_on_commit(*recipe_ids):
+    # Readers re-query the database, so only announce committed rows
+    transaction.on_commit(lambda: recipes_changed(*recipe_ids))
+
+
+def all_recipes_changed():
+    """After bulk writes that send no signals: every process reloads in full"""
+    try:
+        # Jumping past the replay window forces a full load
+        cache.incr(VERSION_KEY, MAX_REPLAY + 1)
+    except ValueError:
+        pass  # no version yet, so nobody has an index to refresh
+
+
+def pantry_ingredient_weights(user, today=None):
+    """
+    Map the ingredients in a user's non-expired groceries to weight units.
+    Returns: {ingredient_id: units}
+    """
+    today = today or date.today()
+    weights_by_name = {}
+    for name, ex_date in Grocery.objects.filter(user=user, ex_date__gte=today).values_list('grocery_name', 'ex_date'):
+        weights_by_name[name] = max(weights_by_name.get(name, 0), grocery_weight(ex_date, today))
+
+    weights = {}
+    for name, ingredient in match_ingredients(weights_by_name).items():
+        weights[ingredient.pk] = max(weights.get(ingredient.pk, 0), weights_by_name[name])
+    return weights
+
+
+def cookable_recipes(user, limit=10, today=None):
+    """
+    Saved recipes ranked by weighted coverage of the user's pantry, with
+    soon-to-expire groceries counting for more
+    """
+    weights = pantry_ingredient_weights(user, today)
+    if not weights:
+        return []
+
+    with recipe_index.lock:
+        recipe_index.sync()
+        ranked = recipe_index.rank(weights, limit)
+        uses = {
+            recipe_id: [pk for pk in recipe_index.ingredients[recipe_id] if pk in weights]
+            for recipe_id, _, _ in ranked
+        }
+
+    recipe_names = dict(Receipe.objects.filter(pk__in=uses).values_list('id', 'name'))
+    ingredient_names = dict(
+        Ingredient.objects.filter(pk__in={pk for pks in uses.values() for pk in pks}).values_list('id', 'name')
+    )
+
+    results = []
+    for recipe_id, value, size in ranked:
+        if recipe_id not in recipe_names:
+            continue  # deleted since the index last synced
+        matched = len(uses[recipe_id])
+        results.append({
+            'id': recipe_id,
+            'name': recipe_names[recipe_id],
+            'score': round(value / (WEIGHT_SCALE * size), 4),
+            'coverage': round(matched / size, 4),
+            'matched': matched,
+            'missing': size - matched,
+            'uses': sorted(ingredient_names[pk] for pk in uses[recipe_id]),
+        })
+    return results
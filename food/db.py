@@ -0,0 +1,22 @@
+from django.conf import settings
+
+# ============================================
+# SQLITE CONNECTION TUNING
+# ============================================
+#
+# Applied to every new SQLite connection (see signals.py). With
+# CONN_MAX_AGE a worker keeps its connection, so this runs once per
+# worker thread rather than once per request.
+
+
+def apply_pragmas(cursor, pragmas):
+    """Run PRAGMA name=value for each item, in order, on a DB-API cursor"""
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+
+
+def configure_connection(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, settings.SQLITE_PRAGMAS)
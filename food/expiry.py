@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import EXPIRING_SOON_DAYS, Grocery
+
+# ============================================
+# CACHED EXPIRY COUNTS
+# ============================================
+
+
+def _cache_key(user_id, today):
+    # Keyed by date so the counts roll over at midnight on their own
+    return f'food:expiry:{user_id}:{today.isoformat()}'
+
+
+def get_expiry_counts(user, today=None):
+    """
+    Expired / expiring-soon counts for a user in one aggregate query,
+    served from the cache until a grocery changes or the date rolls over.
+    """
+    today = today or date.today()
+    key = _cache_key(user.pk, today)
+    counts = cache.get(key)
+
+    if counts is None:
+        counts = Grocery.objects.filter(user=user).aggregate(
+            expired_count=Count('id', filter=Q(ex_date__lt=today)),
+            expiring_soon_count=Count('id', filter=Q(
+                ex_date__gte=today,
+                ex_date__lte=today + timedelta(days=EXPIRING_SOON_DAYS)
+            ))
+        )
+        cache.set(key, counts, settings.EXPIRY_COUNTS_CACHE_TTL)
+
+    return counts
+
+
+def invalidate_expiry_counts(user_id):
+    cache.delete(_cache_key(user_id, date.today()))
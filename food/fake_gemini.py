@@ -0,0 +1,162 @@
+"""
+Local stand-in for the Gemini REST API, used by tests and benchmarks.
+Answers generateContent with the same response shape test_api.py prints,
+and streamGenerateContent?alt=sse with the text split over several events.
+
+    with FakeGeminiServer(text="## 1. Omelette ...") as server:
+        with override_settings(GEMINI_API_BASE=server.base_url):
+            ...
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_response(text, finish_reason='STOP'):
+    return {
+        "candidates": [
+            {
+                "content": {
+                    "parts": [
+                        {
+                            "text": text
+                        }
+                    ],
+                    "role": "model"
+                },
+                "finishReason": finish_reason,
+                "index": 0
+            }
+        ],
+        "usageMetadata": {
+            "promptTokenCount": 12,
+            "candidatesTokenCount": len(text.split()),
+            "totalTokenCount": 12 + len(text.split())
+        },
+        "modelVersion": "gemini-2.5-flash"
+    }
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # One handler instance per TCP connection
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+
+        with server.lock:
+            server.requests.append({'path': self.path, 'payload': payload})
+            status = server.statuses.pop(0) if server.statuses else 200
+
+        if server.delay:
+            time.sleep(server.delay)
+
+        if status != 200:
+            body = {"error": {"code": status, "message": f"Fake error {status}", "status": "UNAVAILABLE"}}
+            self._send_json(status, body)
+            return
+
+        text = server.text(payload) if callable(server.text) else server.text
+        if ':streamGenerateContent' in self.path:
+            self._send_stream(text)
+        else:
+            self._send_json(status, make_response(text, server.finish_reason))
+
+    def _send_stream(self, text):
+        server = self.server
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        size = max(1, -(-len(text) // server.stream_chunks))
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        for index, piece in enumerate(pieces):
+            finish_reason = server.finish_reason if index == len(pieces) - 1 else None
+            chunk = make_response(piece, finish_reason)
+            if finish_reason is None:
+                del chunk['candidates'][0]['finishReason']
+            self._write_chunk(f"data: {json.dumps(chunk)}\r\n\r\n".encode('utf-8'))
+            if server.stream_delay:
+                time.sleep(server.stream_delay)
+        self._write_chunk(b'')
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeGeminiHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open hundreds of connections at once
+    request_queue_size = 512
+
+
+class FakeGeminiServer:
+    """
+    Threaded HTTP server on 127.0.0.1 with a random port.
+    text: reply text, or a callable taking the request payload
+    statuses: status codes to return for the next requests (then 200)
+    delay: seconds to wait before answering, to simulate model latency
+    stream_chunks / stream_delay: how streamed replies are split and paced
+    """
+
+    def __init__(self, text="Fake recipe", statuses=None, delay=0, finish_reason='STOP',
+                 stream_chunks=4, stream_delay=0):
+        self.httpd = FakeGeminiHTTPServer(('127.0.0.1', 0), FakeGeminiHandler)
+        self.httpd.text = text
+        self.httpd.statuses = list(statuses or [])
+        self.httpd.delay = delay
+        self.httpd.finish_reason = finish_reason
+        self.httpd.stream_chunks = stream_chunks
+        self.httpd.stream_delay = stream_delay
+        self.httpd.requests = []
+        self.httpd.connections = 0
+        self.httpd.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    @property
+    def connections(self):
+        return self.httpd.connections
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,48 @@
+from django.db.models import Count, Prefetch, Q
+
+from .ingredients import match_ingredients
+from .models import Receipe, Receipe_Ingredients
+
+# ============================================
+# OFFLINE FALLBACK SUGGESTIONS
+# ============================================
+
+
+def saved_recipe_matches(groceries, limit=3):
+    """
+    Saved recipes ranked by how many of the given groceries they use,
+    in the same shape as parsed Gemini recipes so the cards render alike.
+    Only recipes using at least one of the groceries are returned.
+    """
+    ingredient_ids = {i.pk for i in match_ingredients({g.grocery_name for g in groceries}).values()}
+    if not ingredient_ids:
+        return []
+
+    ranked = (
+        Receipe.objects
+        .annotate(matches=Count('receipe_ingredients', filter=Q(receipe_ingredients__ingredient_id__in=ingredient_ids)))
+        .filter(matches__gt=0)
+        .order_by('-matches', 'name', 'id')
+        .prefetch_related(Prefetch(
+            'receipe_ingredients_set',
+            queryset=Receipe_Ingredients.objects.select_related('ingredient').order_by('id')
+        ))[:limit]
+    )
+
+    recipes = []
+    for recipe in ranked:
+        lines = recipe.receipe_ingredients_set.all()
+        recipes.append({
+            'name': recipe.name,
+            'summary': recipe.description or '',
+            'ingredients': [
+                {'name': line.ingredient.name, 'quantity': line.quantity, 'unit': line.unit or ''}
+                for line in lines
+            ],
+            'steps': recipe.steps,
+            'cook_time_minutes': recipe.cook_time_minutes,
+            'difficulty': recipe.difficulty,
+            'saved_id': recipe.pk,
+            'uses': sorted(line.ingredient.name for line in lines if line.ingredient_id in ingredient_ids),
+        })
+    return recipes
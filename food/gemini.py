@@ -0,0 +1,345 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+from .circuit import gemini_breaker
+
+# ============================================
+# SHARED GEMINI API CLIENT
+# ============================================
+
+# Status codes worth retrying: rate limited / temporarily overloaded
+RETRY_STATUS_CODES = (429, 503)
+
+# usageMetadata fields -> gemini_tokens_total kind label
+USAGE_FIELDS = {
+    'promptTokenCount': 'prompt',
+    'candidatesTokenCount': 'response',
+    'thoughtsTokenCount': 'thoughts',
+    'totalTokenCount': 'total',
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class GeminiError(Exception):
+    """Raised by the streaming client, carries a user-facing message"""
+
+
+class CircuitOpenError(GeminiError):
+    """Gemini has been failing, calls are short-circuited for a while"""
+
+
+CIRCUIT_OPEN_MESSAGE = "The recipe service is temporarily unavailable. Please try again shortly."
+
+
+def is_upstream_failure(status_code):
+    """Responses that count against the circuit breaker"""
+    return status_code == 429 or status_code >= 500
+
+
+def get_session():
+    """
+    Return the process-wide keep-alive session.
+    Connections are pooled per host, so only the first call in a worker
+    pays for the TCP + TLS handshake.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = settings.GEMINI_POOL_SIZE
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({"Content-Type": "application/json"})
+                _session = session
+    return _session
+
+
+def reset_session():
+    """Close pooled connections, the next call opens a fresh session"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+_async_client = None
+_async_client_loop = None
+
+
+def get_async_client():
+    """
+    Return the httpx client for the running event loop.
+    An ASGI worker runs one loop, so this is one pool per worker.
+    """
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        _async_client = httpx.AsyncClient(
+            headers={"Content-Type": "application/json"},
+            limits=httpx.Limits(
+                max_connections=settings.GEMINI_ASYNC_POOL_SIZE,
+                max_keepalive_connections=settings.GEMINI_ASYNC_POOL_SIZE
+            ),
+            timeout=httpx.Timeout(
+                settings.GEMINI_READ_TIMEOUT,
+                connect=settings.GEMINI_CONNECT_TIMEOUT
+            )
+        )
+        _async_client_loop = loop
+    return _async_client
+
+
+def build_url(method='generateContent', model=None):
+    model = model or settings.GEMINI_MODEL
+    return f"{settings.GEMINI_API_BASE}/models/{model}:{method}"
+
+
+def build_payload(prompt, generation_config):
+    return {
+        "contents": [
+            {
+                "parts": [
+                    {
+                        "text": prompt
+                    }
+                ]
+            }
+        ],
+        "generationConfig": generation_config
+    }
+
+
+def parse_response(data):
+    """
+    Extract the generated text from a generateContent response
+    Returns: (text, error)
+    """
+    candidates = data.get('candidates') or []
+    if not candidates:
+        return None, "No candidates in response"
+
+    candidate = candidates[0]
+    finish_reason = candidate.get('finishReason', '')
+    parts = candidate.get('content', {}).get('parts') or []
+
+    text = ''.join(part.get('text', '') for part in parts)
+    if text:
+        return text, None
+
+    # Content without parts (or with empty text) means the token limit was hit
+    if finish_reason == 'MAX_TOKENS':
+        return None, "Response cut off (token limit reached). Please try again."
+    if not parts:
+        return None, "Invalid response structure: no content in response"
+    return None, "API returned empty text"
+
+
+def record_usage(data):
+    """Count finish reasons and token usage of a response (or final stream chunk)"""
+    for candidate in data.get('candidates') or []:
+        if candidate.get('finishReason'):
+            metrics.count('gemini_finish_reasons_total', reason=candidate['finishReason'])
+    usage = data.get('usageMetadata') or {}
+    for field, kind in USAGE_FIELDS.items():
+        if usage.get(field):
+            metrics.count('gemini_tokens_total', usage[field], kind=kind)
+
+
+def parse_error(response):
+    try:
+        error_data = response.json()
+        return error_data.get('error', {}).get('message', f'HTTP {response.status_code}')
+    except ValueError:
+        return f'HTTP {response.status_code}: {response.text[:200]}'
+
+
+def _retry_delay(attempt, response):
+    """Full-jitter exponential backoff, honouring Retry-After when sent"""
+    retry_after = response.headers.get('Retry-After')
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), settings.GEMINI_RETRY_MAX_DELAY)
+    backoff = settings.GEMINI_RETRY_BACKOFF * (2 ** attempt)
+    return random.uniform(0, min(backoff, settings.GEMINI_RETRY_MAX_DELAY))
+
+
+def post(method, payload, model=None, stream=False):
+    """
+    POST to a Gemini model method with pooled connections and retries.
+    Returns the final response; raises requests exceptions on network errors.
+    """
+    if not gemini_breaker.allow_request():
+        raise CircuitOpenError(CIRCUIT_OPEN_MESSAGE)
+
+    api_key = os.environ.get('GEMINI_API_KEY')
+    url = build_url(method, model)
+    if stream:
+        url += '?alt=sse'
+    timeout = (settings.GEMINI_CONNECT_TIMEOUT, settings.GEMINI_READ_TIMEOUT)
+    session = get_session()
+
+    attempt = 0
+    while True:
+        started = time.perf_counter()
+        try:
+            response = session.post(
+                url,
+                json=payload,
+                headers={"x-goog-api-key": api_key},
+                timeout=timeout,
+                stream=stream
+            )
+        except (requests.Timeout, requests.ConnectionError):
+            metrics.observe('gemini_request_duration_seconds', time.perf_counter() - started, method=method, status='error')
+            gemini_breaker.record_failure()
+            raise
+        # Streamed calls are timed to the response headers
+        metrics.observe('gemini_request_duration_seconds', time.perf_counter() - started,
+                        method=method, status=response.status_code)
+        if response.status_code not in RETRY_STATUS_CODES or attempt >= settings.GEMINI_MAX_RETRIES:
+            if is_upstream_failure(response.status_code):
+                gemini_breaker.record_failure()
+            else:
+                gemini_breaker.record_success()
+            return response
+        delay = _retry_delay(attempt, response)
+        response.close()
+        time.sleep(delay)
+        attempt += 1
+
+
+def generate_content(prompt, generation_config, model=None):
+    """
+    Call generateContent and return (text, error) like the views expect
+    """
+    if not os.environ.get('GEMINI_API_KEY'):
+        return None, "Gemini API key not configured. Please set GEMINI_API_KEY environment variable."
+
+    try:
+        response = post('generateContent', build_payload(prompt, generation_config), model)
+        if response.status_code != 200:
+            return None, f"API Error: {parse_error(response)}"
+        data = response.json()
+        record_usage(data)
+        return parse_response(data)
+    except CircuitOpenError as e:
+        return None, str(e)
+    except requests.Timeout:
+        return None, "Request timeout. The API took too long to respond. Please try again."
+    except requests.ConnectionError:
+        return None, "Connection error. Please check your internet connection."
+    except ValueError:
+        return None, "Invalid API response format."
+
+
+def stream_generate_content(prompt, generation_config, model=None):
+    """
+    Call streamGenerateContent and yield text chunks as they arrive.
+    Raises GeminiError with a user-facing message on failure.
+    """
+    if not os.environ.get('GEMINI_API_KEY'):
+        raise GeminiError("Gemini API key not configured. Please set GEMINI_API_KEY environment variable.")
+
+    try:
+        response = post('streamGenerateContent', build_payload(prompt, generation_config), model, stream=True)
+        if response.status_code != 200:
+            raise GeminiError(f"API Error: {parse_error(response)}")
+
+        with response:
+            finish_reason = ''
+            produced = False
+            data = {}
+            for line in response.iter_lines(decode_unicode=True):
+                # Server-sent events: one JSON response chunk per "data:" line
+                if not line or not line.startswith('data:'):
+                    continue
+                data = json.loads(line[len('data:'):])
+                for candidate in data.get('candidates', [])[:1]:
+                    finish_reason = candidate.get('finishReason', finish_reason)
+                    for part in candidate.get('content', {}).get('parts', []):
+                        if part.get('text'):
+                            produced = True
+                            yield part['text']
+            # Usage is cumulative, the last chunk has the totals
+            record_usage(data)
+
+        if not produced:
+            if finish_reason == 'MAX_TOKENS':
+                raise GeminiError("Response cut off (token limit reached). Please try again.")
+            raise GeminiError("API returned empty text")
+    except requests.Timeout:
+        raise GeminiError("Request timeout. The API took too long to respond. Please try again.")
+    except requests.ConnectionError:
+        raise GeminiError("Connection error. Please check your internet connection.")
+    except ValueError:
+        raise GeminiError("Invalid API response format.")
+
+
+async def apost(method, payload, model=None):
+    """Async version of post() using the pooled httpx client"""
+    if not await sync_to_async(gemini_breaker.allow_request)():
+        raise CircuitOpenError(CIRCUIT_OPEN_MESSAGE)
+
+    api_key = os.environ.get('GEMINI_API_KEY')
+    client = get_async_client()
+
+    attempt = 0
+    while True:
+        started = time.perf_counter()
+        try:
+            response = await client.post(
+                build_url(method, model),
+                json=payload,
+                headers={"x-goog-api-key": api_key}
+            )
+        except httpx.TransportError:
+            metrics.observe('gemini_request_duration_seconds', time.perf_counter() - started, method=method, status='error')
+            await sync_to_async(gemini_breaker.record_failure)()
+            raise
+        metrics.observe('gemini_request_duration_seconds', time.perf_counter() - started,
+                        method=method, status=response.status_code)
+        if response.status_code not in RETRY_STATUS_CODES or attempt >= settings.GEMINI_MAX_RETRIES:
+            if is_upstream_failure(response.status_code):
+                await sync_to_async(gemini_breaker.record_failure)()
+            else:
+                await sync_to_async(gemini_breaker.record_success)()
+            return response
+        await asyncio.sleep(_retry_delay(attempt, response))
+        attempt += 1
+
+
+async def agenerate_content(prompt, generation_config, model=None):
+    """Async version of generate_content(), returns (text, error)"""
+    if not os.environ.get('GEMINI_API_KEY'):
+        return None, "Gemini API key not configured. Please set GEMINI_API_KEY environment variable."
+
+    try:
+        response = await apost('generateContent', build_payload(prompt, generation_config), model)
+        if response.status_code != 200:
+            return None, f"API Error: {parse_error(response)}"
+        data = response.json()
+        record_usage(data)
+        return parse_response(data)
+    except CircuitOpenError as e:
+        return None, str(e)
+    except httpx.TimeoutException:
+        return None, "Request timeout. The API took too long to respond. Please try again."
+    except httpx.TransportError:
+        return None, "Connection error. Please check your internet connection."
+    except ValueError:
+        return None, "Invalid API response format."
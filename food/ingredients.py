@@ -0,0 +1,168 @@
+import re
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+
+from .models import Ingredient, IngredientTrigram
+
+# ============================================
+# INGREDIENT NAME NORMALIZATION
+# ============================================
+#
+# "2 Tomatoes, diced", "tomatoes" and "Tomato (ripe)" all normalize to
+# "tomato", which is stored on Ingredient.normalized_name and looked up
+# through its index. Names that still miss are matched by trigram
+# similarity against the food_ingredient_trigram table.
+
+UNITS = {
+    'g', 'gram', 'kg', 'kilogram', 'mg', 'ml', 'l', 'litre', 'liter', 'oz', 'ounce', 'lb', 'pound',
+    'cup', 'tbsp', 'tablespoon', 'tsp', 'teaspoon', 'pinch', 'dash', 'clove', 'can', 'tin', 'jar',
+    'slice', 'piece', 'pc', 'pcs', 'bunch', 'handful', 'pack', 'packet', 'stick', 'sprig', 'head',
+}
+
+DESCRIPTORS = {
+    'fresh', 'freshly', 'chopped', 'diced', 'minced', 'sliced', 'grated', 'shredded', 'crushed',
+    'peeled', 'pitted', 'halved', 'cubed', 'beaten', 'melted', 'softened', 'cooked', 'raw', 'ripe',
+    'large', 'medium', 'small', 'finely', 'roughly', 'thinly', 'coarsely', 'organic', 'optional',
+    'about', 'approx', 'of', 'a', 'an', 'to', 'taste', 'for', 'serving', 'extra',
+}
+
+IRREGULAR_PLURALS = {
+    'leaves': 'leaf', 'halves': 'half', 'loaves': 'loaf', 'knives': 'knife',
+    'geese': 'goose', 'mice': 'mouse', 'teeth': 'tooth',
+}
+
+# Plural-looking words that are already singular
+SINGULAR_ENDINGS = ('ss', 'us', 'is', 'ous')
+
+QUANTITY_RE = re.compile(r'\d+(?:[.,/]\d+)?|[¼-¾⅐-⅞]')
+PARENTHESES_RE = re.compile(r'\([^)]*\)|\[[^\]]*\]')
+WORD_RE = re.compile(r'[^\W\d_]+')
+
+
+def singularize(word):
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if len(word) <= 3 or word.endswith(SINGULAR_ENDINGS):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('oes', 'ches', 'shes', 'sses', 'xes', 'zes')):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+
+def normalize_ingredient(name):
+    """
+    Canonical form of an ingredient name: case-folded, without quantities,
+    units, preparation words or notes, each word singular
+    """
+    text = unicodedata.normalize('NFKC', str(name)).casefold()
+    # Notes in brackets and after the first comma ("tomatoes, diced")
+    text = PARENTHESES_RE.sub(' ', text).split(',')[0]
+    text = QUANTITY_RE.sub(' ', text)
+
+    words = []
+    for word in WORD_RE.findall(text):
+        word = singularize(word)
+        if word not in UNITS and word not in DESCRIPTORS:
+            words.append(word)
+
+    if words:
+        return ' '.join(words)
+    # Nothing left but units or descriptors ("Fresh"): keep it recognisable
+    return ' '.join(WORD_RE.findall(str(name).casefold())) or str(name).strip().casefold()
+
+
+def display_name(normalized):
+    """Name for a new Ingredient row created from a normalized name"""
+    return normalized.capitalize()
+
+
+def trigrams(normalized):
+    """Padded word trigrams, as pg_trgm builds them"""
+    grams = set()
+    for word in normalized.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    """Jaccard similarity of two trigram sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def build_trigrams(ingredients):
+    """Trigram rows for saved ingredients, from their normalized_name"""
+    return [
+        IngredientTrigram(ingredient=ingredient, trigram=gram)
+        for ingredient in ingredients
+        for gram in trigrams(ingredient.normalized_name)
+    ]
+
+
+def fuzzy_matches(keys, threshold=None):
+    """
+    Closest existing ingredient id by trigram similarity for each
+    normalized name that has one. One indexed query fetches every trigram
+    row shared with any of the names; the scores are computed here.
+    Returns: dict of normalized name -> ingredient id
+    """
+    threshold = settings.INGREDIENT_FUZZY_THRESHOLD if threshold is None else threshold
+    grams = {key: trigrams(key) for key in keys}
+    keys_by_gram = defaultdict(list)
+    for key, key_grams in grams.items():
+        for gram in key_grams:
+            keys_by_gram[gram].append(key)
+    if not keys_by_gram:
+        return {}
+
+    shared = defaultdict(lambda: defaultdict(int))
+    candidate_grams = {}
+    rows = IngredientTrigram.objects.filter(trigram__in=keys_by_gram).values_list(
+        'ingredient_id', 'trigram', 'ingredient__normalized_name'
+    )
+    for ingredient_id, gram, normalized_name in rows:
+        if ingredient_id not in candidate_grams:
+            candidate_grams[ingredient_id] = trigrams(normalized_name)
+        for key in keys_by_gram[gram]:
+            shared[key][ingredient_id] += 1
+
+    matches = {}
+    for key, counts in shared.items():
+        # Score the candidates sharing the most trigrams, as the index ranks them
+        ranked = sorted(counts, key=lambda pk: (-counts[pk], pk))[:settings.INGREDIENT_FUZZY_CANDIDATES]
+        best_id, best_score = None, threshold
+        for ingredient_id in ranked:
+            score = similarity(grams[key], candidate_grams[ingredient_id])
+            if score > best_score or (best_id is None and score == best_score):
+                best_id, best_score = ingredient_id, score
+        if best_id is not None:
+            matches[key] = best_id
+    return matches
+
+
+def match_ingredients(names, fuzzy=True):
+    """
+    Resolve raw names to existing ingredients: exact on the normalized
+    name first, then by trigram similarity for the rest.
+    Returns: dict of raw name -> Ingredient, for the names that matched
+    """
+    keys = {name: normalize_ingredient(name) for name in names}
+    by_key = {
+        i.normalized_name: i
+        for i in Ingredient.objects.filter(normalized_name__in=set(keys.values())).order_by('-id')
+    }
+
+    fuzzy_ids = fuzzy_matches(set(keys.values()) - set(by_key)) if fuzzy else {}
+    if fuzzy_ids:
+        rows = Ingredient.objects.in_bulk(set(fuzzy_ids.values()))
+        by_key.update({key: rows[pk] for key, pk in fuzzy_ids.items()})
+
+    return {name: by_key[key] for name, key in keys.items() if key in by_key}
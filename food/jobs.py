@@ -0,0 +1,205 @@
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import ratelimit
+from .models import RecipeJob
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# DB-BACKED RECIPE JOB QUEUE
+# ============================================
+
+
+def make_dedup_key(user, kind, payload):
+    """Identical requests from the same user share one queued job"""
+    data = json.dumps({'user': user.pk, 'kind': kind, 'payload': payload}, sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def enqueue(user, kind, payload):
+    """
+    Queue a generation job, or return the identical job already waiting
+    Returns: (job, created)
+    """
+    dedup_key = make_dedup_key(user, kind, payload)
+    active = RecipeJob.objects.filter(dedup_key=dedup_key, status__in=RecipeJob.ACTIVE_STATUSES)
+
+    job = active.first()
+    if job is not None:
+        return job, False
+    try:
+        # The partial unique constraint settles a race between two requests
+        with transaction.atomic():
+            return RecipeJob.objects.create(
+                user=user, kind=kind, dedup_key=dedup_key, payload=payload
+            ), True
+    except IntegrityError:
+        return active.get(), False
+
+
+def claim_jobs(worker_id, limit):
+    """
+    Atomically mark up to limit runnable jobs as running for this worker.
+    The status filter on the UPDATE makes a claim a compare-and-swap, so
+    two workers can never run the same job.
+    """
+    token = f"{worker_id}:{uuid.uuid4().hex[:8]}"
+    now = timezone.now()
+    ids = list(
+        RecipeJob.objects.filter(status=RecipeJob.QUEUED, run_after__lte=now)
+        .order_by('run_after', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+
+    RecipeJob.objects.filter(id__in=ids, status=RecipeJob.QUEUED).update(
+        status=RecipeJob.RUNNING,
+        locked_by=token,
+        locked_at=now,
+        attempts=F('attempts') + 1
+    )
+    return list(RecipeJob.objects.filter(locked_by=token, status=RecipeJob.RUNNING).select_related('user'))
+
+
+def requeue_stale_jobs():
+    """Put back jobs whose worker died mid-run"""
+    cutoff = timezone.now() - timedelta(seconds=settings.RECIPE_JOB_LOCK_TIMEOUT)
+    return RecipeJob.objects.filter(status=RecipeJob.RUNNING, locked_at__lt=cutoff).update(
+        status=RecipeJob.QUEUED,
+        locked_by=''
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff in seconds before retry number attempts"""
+    return settings.RECIPE_JOB_RETRY_BACKOFF * (2 ** (attempts - 1))
+
+
+def execute(job):
+    """Run the Gemini call for job. Returns: (recipes, error)"""
+    # Imported here: views enqueue jobs, so it imports this module
+    from . import views
+
+    if job.kind == RecipeJob.SUGGEST:
+        return views.get_ai_recipe_suggestion(
+            job.payload.get('ingredients', []),
+            job.payload.get('preferences', ''),
+            job.user_id
+        )
+    if job.kind == RecipeJob.REFINE:
+        return views.refine_recipes(
+            job.payload.get('recipes', []),
+            job.payload.get('preferences', ''),
+            job.user_id
+        )
+    return None, f"Unknown job kind: {job.kind}"
+
+
+def process_job(job):
+    """Run a claimed job and record the result or schedule a retry"""
+    # Only the worker holding the lock may finish the job
+    owned = RecipeJob.objects.filter(pk=job.pk, locked_by=job.locked_by, status=RecipeJob.RUNNING)
+
+    try:
+        recipes, error = execute(job)
+    except ratelimit.RateLimited as e:
+        # Over the Gemini budget: put the job back without using an attempt
+        owned.update(
+            status=RecipeJob.QUEUED,
+            locked_by='',
+            attempts=F('attempts') - 1,
+            run_after=timezone.now() + timedelta(seconds=e.retry_after)
+        )
+        return RecipeJob.QUEUED
+    except Exception as e:
+        logger.exception("Recipe job %s crashed", job.pk)
+        recipes, error = None, str(e)
+
+    now = timezone.now()
+    if not error:
+        owned.update(status=RecipeJob.DONE, result=recipes, error='', finished_at=now)
+        return RecipeJob.DONE
+
+    if job.attempts >= settings.RECIPE_JOB_MAX_ATTEMPTS:
+        owned.update(status=RecipeJob.FAILED, error=error, finished_at=now)
+        return RecipeJob.FAILED
+
+    owned.update(
+        status=RecipeJob.QUEUED,
+        error=error,
+        locked_by='',
+        run_after=now + timedelta(seconds=retry_delay(job.attempts))
+    )
+    return RecipeJob.QUEUED
+
+
+def run_worker(concurrency=None, poll_interval=None, once=False, max_jobs=None, stop_event=None):
+    """
+    Claim and run jobs on a pool of concurrency threads until stopped.
+    With once=True, return as soon as the queue has nothing runnable.
+    Returns: number of jobs processed
+    """
+    concurrency = concurrency or settings.RECIPE_JOB_CONCURRENCY
+    poll_interval = settings.RECIPE_JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    stop_event = stop_event or threading.Event()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    processed = 0
+    running = set()
+    lock = threading.Lock()
+    # Set whenever a job finishes so a full pool refills without waiting
+    slot_freed = threading.Event()
+
+    def work(job):
+        try:
+            process_job(job)
+        finally:
+            # Each pool thread has its own DB connection
+            connection.close()
+            with lock:
+                running.discard(job.pk)
+            slot_freed.set()
+
+    requeue_stale_jobs()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while not stop_event.is_set():
+            if max_jobs is not None and processed >= max_jobs:
+                break
+            close_old_connections()
+
+            with lock:
+                free = concurrency - len(running)
+            if max_jobs is not None:
+                free = min(free, max_jobs - processed)
+
+            jobs = claim_jobs(worker_id, free) if free > 0 else []
+            for job in jobs:
+                with lock:
+                    running.add(job.pk)
+                pool.submit(work, job)
+            processed += len(jobs)
+
+            if not jobs:
+                with lock:
+                    idle = not running
+                if idle:
+                    if once:
+                        break
+                    requeue_stale_jobs()
+                slot_freed.wait(poll_interval)
+                slot_freed.clear()
+
+    return processed
@@ -0,0 +1,61 @@
+import json
+
+# ============================================
+# INCREMENTAL JSON ARRAY PARSING
+# ============================================
+
+
+class JSONArrayStream:
+    """
+    Pull complete objects out of a JSON array that arrives in pieces.
+
+        stream = JSONArrayStream()
+        for chunk in chunks:
+            for item in stream.feed(chunk):
+                ...
+
+    Only tracks string/escape state and nesting depth, so each character
+    is looked at once however the input is split.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.item = None
+
+    def feed(self, text):
+        items = []
+        for char in text:
+            if self.item is not None:
+                self.item.append(char)
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+
+            if char == '"':
+                self.in_string = True
+            elif char in '[{':
+                self.depth += 1
+                if self.depth == 2 and char == '{':
+                    # An element of the top-level array starts here
+                    self.item = [char]
+            elif char in ']}':
+                self.depth -= 1
+                if self.depth == 1 and char == '}' and self.item is not None:
+                    items.append(json.loads(''.join(self.item)))
+                    self.item = None
+        return items
+
+
+def iter_array_items(chunks):
+    """Yield each object of a JSON array from an iterable of text chunks"""
+    stream = JSONArrayStream()
+    for chunk in chunks:
+        yield from stream.feed(chunk)
@@ -0,0 +1,54 @@
+import statistics
+import time
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from food import ratelimit
+
+
+class Command(BaseCommand):
+    help = "Measure the per-request overhead of the Gemini rate limiter on each cache backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=50,
+                            help="Distinct users the calls are spread over")
+
+    def handle(self, *args, **options):
+        backends = {
+            'configured': None,
+            'locmem': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                   'LOCATION': 'ratelimit-benchmark'}},
+        }
+        self.stdout.write(f"{options['iterations']} acquire() calls over {options['users']} users")
+        self.stdout.write(f"{'cache':<12}{'p50 us':>10}{'p99 us':>10}{'mean us':>10}")
+
+        # Huge budgets so every call takes the allow path, the common case
+        with override_settings(GEMINI_RATE_LIMIT_PER_MINUTE=10 ** 9, GEMINI_RATE_LIMIT_BURST=10 ** 6,
+                               GEMINI_USER_RATE_LIMIT_PER_MINUTE=10 ** 9, GEMINI_USER_RATE_LIMIT_BURST=10 ** 6):
+            for name, cache_settings in backends.items():
+                if cache_settings is None:
+                    timings = self.measure(options['iterations'], options['users'])
+                else:
+                    with override_settings(CACHES=cache_settings):
+                        timings = self.measure(options['iterations'], options['users'])
+                timings.sort()
+                self.stdout.write(
+                    f"{name:<12}{statistics.median(timings):>10.0f}"
+                    f"{timings[int(len(timings) * 0.99) - 1]:>10.0f}{statistics.mean(timings):>10.0f}"
+                )
+
+        self.stdout.write("For scale, one Gemini call takes 1-10 s (1,000,000-10,000,000 us).")
+
+    def measure(self, iterations, users):
+        timings = []
+        for n in range(iterations):
+            started = time.perf_counter()
+            ratelimit.acquire(n % users)
+            timings.append((time.perf_counter() - started) * 1_000_000)
+
+        cache = caches['default']
+        cache.delete_many([ratelimit.GLOBAL_KEY] + [f'{ratelimit.KEY_PREFIX}user:{n}' for n in range(users)])
+        return timings
@@ -0,0 +1,90 @@
+import json
+import os
+import statistics
+import time
+import uuid
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils import timezone
+
+from food import gemini, jobs
+from food.fake_gemini import FakeGeminiServer
+from food.models import RecipeJob, RecipeSuggestionCache
+
+RECIPES = json.dumps([{"name": "Benchmark Hash", "ingredients": [], "steps": ["Cook."]}])
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure recipe job throughput: enqueue jobs against a local fake "
+        "Gemini server and drain them with recipe_worker at several concurrency levels"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=100,
+                            help="Distinct jobs enqueued per level")
+        parser.add_argument('--duplicates', type=int, default=1,
+                            help="Times each request is submitted (extra copies are deduplicated)")
+        parser.add_argument('--levels', default='1,4,16',
+                            help="Comma separated worker concurrency levels")
+        parser.add_argument('--latency', type=float, default=0.2,
+                            help="Simulated Gemini latency in seconds")
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['levels'].split(',')]
+        user = User.objects.create(username=f'job-benchmark-{uuid.uuid4().hex[:8]}')
+        started = timezone.now()
+
+        self.stdout.write(
+            f"{options['jobs']} jobs x{options['duplicates']} submissions, "
+            f"fake Gemini latency {options['latency']}s"
+        )
+        self.stdout.write(
+            f"{'workers':>8}{'jobs':>8}{'gemini':>8}{'jobs/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+        )
+
+        try:
+            with FakeGeminiServer(text=RECIPES, delay=options['latency']) as server, \
+                    override_settings(GEMINI_API_BASE=server.base_url,
+                                      GEMINI_POOL_SIZE=max(levels),
+                                      RECIPE_JOB_RETRY_BACKOFF=0,
+                                      GEMINI_RATE_LIMIT_PER_MINUTE=10 ** 6,
+                                      GEMINI_USER_RATE_LIMIT_PER_MINUTE=10 ** 6), \
+                    mock.patch.dict(os.environ, {'GEMINI_API_KEY': 'benchmark'}):
+                gemini.reset_session()
+                for concurrency in levels:
+                    self.run_level(user, server, concurrency, options['jobs'], options['duplicates'])
+                gemini.reset_session()
+        finally:
+            # Jobs cascade with the user; drop the cached fake responses too
+            user.delete()
+            RecipeSuggestionCache.objects.filter(created_at__gte=started).delete()
+
+    def run_level(self, user, server, concurrency, count, duplicates):
+        run = uuid.uuid4().hex[:8]
+        requests_before = len(server.requests)
+        enqueued_at = timezone.now()
+
+        for n in range(count):
+            payload = {'ingredients': ['Eggs'], 'preferences': f'benchmark {run} {n}'}
+            for _ in range(duplicates):
+                jobs.enqueue(user, RecipeJob.SUGGEST, payload)
+
+        began = time.perf_counter()
+        processed = jobs.run_worker(concurrency=concurrency, poll_interval=0.01, once=True)
+        elapsed = time.perf_counter() - began
+
+        waits = sorted(
+            (job.finished_at - job.created_at).total_seconds()
+            for job in RecipeJob.objects.filter(user=user, created_at__gte=enqueued_at)
+            if job.finished_at
+        )
+        p50 = statistics.median(waits) * 1000 if waits else 0
+        p95 = waits[max(int(len(waits) * 0.95) - 1, 0)] * 1000 if waits else 0
+        self.stdout.write(
+            f"{concurrency:>8}{processed:>8}{len(server.requests) - requests_before:>8}"
+            f"{processed / elapsed:>10.1f}{p50:>10.0f}{p95:>10.0f}"
+        )
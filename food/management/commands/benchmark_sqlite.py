@@ -0,0 +1,158 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from food.db import apply_pragmas
+
+# SQLite's defaults, and Django's before this tuning: rollback journal,
+# a full fsync per commit and a new connection for every request
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrent read/write throughput on a scratch SQLite file: stock settings "
+        "with a connection per request versus SQLITE_PRAGMAS with persistent connections"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help="Threads running pantry page queries")
+        parser.add_argument('--writers', type=int, default=4, help="Threads adding and updating groceries")
+        parser.add_argument('--duration', type=float, default=5.0, help="Seconds per configuration")
+        parser.add_argument('--rows', type=int, default=20000, help="Groceries seeded before the run")
+        parser.add_argument('--users', type=int, default=100)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.stdout.write(
+            f"{options['readers']} readers, {options['writers']} writers, "
+            f"{options['duration']}s each, {options['rows']} groceries"
+        )
+        self.stdout.write(
+            f"{'config':<8}{'reads/s':>10}{'writes/s':>10}{'read p95 ms':>13}{'write p95 ms':>14}{'locked':>8}"
+        )
+        self.run('stock', DEFAULT_PRAGMAS, persistent=False)
+        self.run('tuned', settings.SQLITE_PRAGMAS, persistent=True)
+
+    def run(self, label, pragmas, persistent):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'benchmark.sqlite3')
+            self.seed(path, pragmas)
+
+            stop = threading.Event()
+            results = {'read': [], 'write': [], 'locked': 0}
+            lock = threading.Lock()
+
+            def connect():
+                # Same driver timeout as DATABASES OPTIONS
+                connection = sqlite3.connect(path, timeout=settings.SQLITE_BUSY_TIMEOUT, isolation_level=None)
+                apply_pragmas(connection.cursor(), pragmas)
+                return connection
+
+            def worker(kind, seed):
+                rng = random.Random(seed)
+                connection = connect() if persistent else None
+                timings, locked = [], 0
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    current = connection or connect()
+                    try:
+                        if kind == 'read':
+                            self.read(current, rng)
+                        else:
+                            self.write(current, rng)
+                        timings.append(time.perf_counter() - started)
+                    except sqlite3.OperationalError:
+                        locked += 1
+                    finally:
+                        if connection is None:
+                            current.close()
+                if connection is not None:
+                    connection.close()
+                with lock:
+                    results[kind] += timings
+                    results['locked'] += locked
+
+            threads = [
+                threading.Thread(target=worker, args=('read', n)) for n in range(self.options['readers'])
+            ] + [
+                threading.Thread(target=worker, args=('write', -n - 1)) for n in range(self.options['writers'])
+            ]
+            for thread in threads:
+                thread.start()
+            time.sleep(self.options['duration'])
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        duration = self.options['duration']
+        self.stdout.write(
+            f"{label:<8}{len(results['read']) / duration:>10.0f}{len(results['write']) / duration:>10.0f}"
+            f"{self.p95(results['read']):>13.1f}{self.p95(results['write']):>14.1f}{results['locked']:>8}"
+        )
+
+    def seed(self, path, pragmas):
+        connection = sqlite3.connect(path, isolation_level=None)
+        apply_pragmas(connection.cursor(), pragmas)
+        connection.executescript("""
+            CREATE TABLE grocery (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                name VARCHAR(200) NOT NULL,
+                ex_date DATE NOT NULL,
+                quantity INTEGER NOT NULL
+            );
+            CREATE INDEX grocery_user_exdate ON grocery (user_id, ex_date);
+        """)
+        rng = random.Random(0)
+        today = date.today()
+        connection.execute('BEGIN')
+        connection.executemany(
+            'INSERT INTO grocery (user_id, name, ex_date, quantity) VALUES (?, ?, ?, ?)',
+            [
+                (rng.randrange(self.options['users']), f'item {n}',
+                 (today + timedelta(days=rng.randint(-30, 180))).isoformat(), rng.randint(1, 6))
+                for n in range(self.options['rows'])
+            ]
+        )
+        connection.execute('COMMIT')
+        connection.close()
+
+    def read(self, connection, rng):
+        """The pantry page: one user's groceries by expiry"""
+        connection.execute(
+            'SELECT id, name, ex_date, quantity FROM grocery WHERE user_id = ? ORDER BY ex_date, id LIMIT 50',
+            (rng.randrange(self.options['users']),)
+        ).fetchall()
+
+    def write(self, connection, rng):
+        """An add or a shopping-list style increment, in an IMMEDIATE transaction like Django's"""
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if rng.random() < 0.5:
+                connection.execute(
+                    'INSERT INTO grocery (user_id, name, ex_date, quantity) VALUES (?, ?, ?, 1)',
+                    (rng.randrange(self.options['users']), 'new item', date.today().isoformat())
+                )
+            else:
+                connection.execute(
+                    'UPDATE grocery SET quantity = quantity + 1 WHERE id = ?',
+                    (rng.randint(1, self.options['rows']),)
+                )
+            connection.execute('COMMIT')
+        except sqlite3.Error:
+            connection.execute('ROLLBACK')
+            raise
+
+    def p95(self, timings):
+        if not timings:
+            return 0.0
+        timings = sorted(timings)
+        return timings[max(int(len(timings) * 0.95) - 1, 0)] * 1000
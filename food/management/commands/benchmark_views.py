@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from food.benchmark import SIZES, load_baseline, regressions, run_benchmarks, save_baseline
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive every food URL through the test client at several data sizes, "
+        "recording queries and wall time, and fail on regressions against the stored baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium',
+                            help=f"Comma separated data sizes from: {', '.join(SIZES)}")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per request")
+        parser.add_argument('--only', default='', help="Comma separated scenarios to run")
+        parser.add_argument('--no-timing', action='store_true',
+                            help="Only compare query counts (for noisy machines)")
+        parser.add_argument('--update-baseline', action='store_true',
+                            help="Store this run as the new baseline")
+
+    def handle(self, *args, **options):
+        names = options['sizes'].split(',')
+        unknown = set(names) - set(SIZES)
+        if unknown:
+            raise CommandError(f"Unknown size(s): {', '.join(sorted(unknown))}")
+        only = set(filter(None, options['only'].split(',')))
+
+        # Lets the test client through ALLOWED_HOSTS; the data is rolled back
+        setup_test_environment()
+        try:
+            results = run_benchmarks({name: SIZES[name] for name in names}, options['repeat'], only)
+        finally:
+            teardown_test_environment()
+
+        baseline = load_baseline()
+        self.stdout.write(f"{'size':<8}{'scenario':<28}{'queries':>8}{'base':>6}{'ms':>10}{'base ms':>10}")
+        for size, scenarios in results.items():
+            for name, result in scenarios.items():
+                expected = baseline.get(size, {}).get(name, {})
+                if 'error' in result:
+                    self.stdout.write(f"{size:<8}{name:<28}{result['error']}")
+                    continue
+                self.stdout.write(
+                    f"{size:<8}{name:<28}{result['queries']:>8}{expected.get('queries', '-'):>6}"
+                    f"{result['ms']:>10.1f}{expected.get('ms', '-'):>10}"
+                )
+
+        if options['update_baseline']:
+            save_baseline({**baseline, **results})
+            self.stdout.write(self.style.SUCCESS("Baseline updated"))
+            return
+
+        problems = regressions(results, baseline, check_time=not options['no_timing'])
+        if problems:
+            raise CommandError("Regressions against the baseline:\n  " + '\n  '.join(problems))
+        self.stdout.write(self.style.SUCCESS("No regressions"))
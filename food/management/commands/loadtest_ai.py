@@ -0,0 +1,111 @@
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+
+from food import gemini, views
+from food.fake_gemini import FakeGeminiServer
+
+REFINED_RECIPES = json.dumps([{"name": "Vegan Omelette", "ingredients": [], "steps": ["Cook."]}])
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the AI refine view against a local fake Gemini server, "
+        "comparing a WSGI-style thread pool with a single ASGI event loop"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--levels', default='1,10,50,100,200',
+                            help="Comma separated concurrency levels")
+        parser.add_argument('--latency', type=float, default=0.5,
+                            help="Simulated Gemini latency in seconds")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="WSGI worker threads (gunicorn workers x threads)")
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['levels'].split(',')]
+        self.workers = options['workers']
+        self.factory = RequestFactory()
+        self.request_ids = itertools.count()
+        # Never saved: refine only needs an authenticated user, not the DB
+        self.user = User(username='loadtest')
+
+        self.stdout.write(
+            f"Fake Gemini latency {options['latency']}s, WSGI workers {self.workers}"
+        )
+        self.stdout.write(
+            f"{'mode':<6}{'concurrency':>12}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'req/s':>10}"
+        )
+
+        with FakeGeminiServer(text=REFINED_RECIPES, delay=options['latency']) as server, \
+                override_settings(GEMINI_API_BASE=server.base_url,
+                                  GEMINI_POOL_SIZE=self.workers,
+                                  GEMINI_ASYNC_POOL_SIZE=max(levels),
+                                  # Refine inline, calling Gemini from the request
+                                  RECIPE_JOBS_ENABLED=False,
+                                  # Measure the views, not the rate limiter
+                                  GEMINI_RATE_LIMIT_PER_MINUTE=10 ** 6,
+                                  GEMINI_RATE_LIMIT_BURST=10 ** 6,
+                                  GEMINI_USER_RATE_LIMIT_PER_MINUTE=10 ** 6,
+                                  GEMINI_USER_RATE_LIMIT_BURST=10 ** 6), \
+                mock.patch.dict(os.environ, {'GEMINI_API_KEY': 'loadtest'}):
+            gemini.reset_session()
+            for concurrency in levels:
+                self.report('WSGI', concurrency, *self.run_wsgi(concurrency))
+                self.report('ASGI', concurrency, *asyncio.run(self.run_asgi(concurrency)))
+            gemini.reset_session()
+
+    def make_request(self):
+        request = self.factory.post(
+            '/recipes/refine/',
+            # A different prompt per request, so single-flight can't merge them
+            data=json.dumps({'recipes': [{'name': 'Omelette'}], 'preferences': f'vegan #{next(self.request_ids)}'}),
+            content_type='application/json'
+        )
+        request.user = self.user
+
+        async def auser():
+            return self.user
+        request.auser = auser
+        return request
+
+    def run_wsgi(self, concurrency):
+        def call(submitted):
+            response = views.refine_recipe(self.make_request())
+            assert response.status_code == 200, response.content
+            return time.perf_counter() - submitted
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(call, time.perf_counter()) for _ in range(concurrency)]
+            latencies = [future.result() for future in futures]
+        return latencies, time.perf_counter() - started
+
+    async def run_asgi(self, concurrency):
+        async def call():
+            submitted = time.perf_counter()
+            response = await views.arefine_recipe(self.make_request())
+            assert response.status_code == 200, response.content
+            return time.perf_counter() - submitted
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(call() for _ in range(concurrency)))
+        return latencies, time.perf_counter() - started
+
+    def report(self, mode, concurrency, latencies, elapsed):
+        latencies = sorted(latencies)
+        p50 = statistics.median(latencies) * 1000
+        p95 = latencies[int(len(latencies) * 0.95) - 1 if len(latencies) > 1 else 0] * 1000
+        self.stdout.write(
+            f"{mode:<6}{concurrency:>12}{p50:>10.0f}{p95:>10.0f}{latencies[-1] * 1000:>10.0f}"
+            f"{concurrency / elapsed:>10.1f}"
+        )
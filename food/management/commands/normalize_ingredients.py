@@ -0,0 +1,86 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+
+from food.cookable import recipes_changed_on_commit
+from food.ingredients import build_trigrams, normalize_ingredient
+from food.models import Ingredient, IngredientTrigram, Receipe_Ingredients
+
+
+class Command(BaseCommand):
+    help = "Re-normalize ingredient names, rebuild their trigrams and merge duplicates"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Report what would change without writing",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        renamed = 0
+        batch = []
+        seen = Counter()
+        for ingredient in Ingredient.objects.order_by('id').iterator(chunk_size=batch_size):
+            normalized = normalize_ingredient(ingredient.name)
+            seen[normalized] += 1
+            if ingredient.normalized_name != normalized:
+                ingredient.normalized_name = normalized
+                batch.append(ingredient)
+            if len(batch) >= batch_size:
+                renamed += self.save_batch(batch, dry_run)
+                batch = []
+        renamed += self.save_batch(batch, dry_run)
+
+        merged = sum(rows - 1 for rows in seen.values())
+        if not dry_run:
+            groups = (
+                Ingredient.objects.values('normalized_name')
+                .annotate(rows=Count('id'), keep=Min('id'))
+                .filter(rows__gt=1)
+                .order_by('normalized_name')
+            )
+            for group in list(groups):
+                self.merge(group['normalized_name'], group['keep'])
+
+        verb = "Would update" if dry_run else "Updated"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {renamed} normalized name(s), merged {merged} duplicate ingredient(s)"
+        ))
+
+    def save_batch(self, ingredients, dry_run):
+        if not ingredients or dry_run:
+            return len(ingredients)
+        with transaction.atomic():
+            Ingredient.objects.bulk_update(ingredients, ['normalized_name'])
+            IngredientTrigram.objects.filter(ingredient__in=ingredients).delete()
+            IngredientTrigram.objects.bulk_create(build_trigrams(ingredients))
+        return len(ingredients)
+
+    @transaction.atomic
+    def merge(self, normalized_name, keep_id):
+        """Point every recipe line at the oldest row, then drop the others"""
+        duplicate_ids = list(
+            Ingredient.objects.filter(normalized_name=normalized_name).exclude(pk=keep_id).values_list('id', flat=True)
+        )
+        lines = Receipe_Ingredients.objects.filter(ingredient_id__in=duplicate_ids)
+        recipe_ids = set(lines.values_list('receipe_id', flat=True))
+
+        # A recipe that already lists the kept ingredient keeps that line
+        lines.filter(
+            receipe_id__in=Receipe_Ingredients.objects.filter(ingredient_id=keep_id).values('receipe_id')
+        ).delete()
+        # and a recipe listing several duplicates keeps the first of them
+        lines.exclude(pk__in=lines.values('receipe_id').annotate(first=Min('id')).values('first')).delete()
+        lines.update(ingredient_id=keep_id)
+        Ingredient.objects.filter(pk__in=duplicate_ids).delete()
+
+        # update() sends no signals, so tell the cookable-now index directly
+        if recipe_ids:
+            recipes_changed_on_commit(*recipe_ids)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from food import ai_cache
+
+
+class Command(BaseCommand):
+    help = "Purge cached Gemini recipe suggestions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--expired-only',
+            action='store_true',
+            help="Only remove entries whose TTL has passed",
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help="Print cache size, hit/miss and coalescing counters without purging",
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            stats = ai_cache.get_stats()
+            self.stdout.write(
+                f"entries={stats['entries']} hits={stats['hits']} misses={stats['misses']} "
+                f"coalesced={stats['coalesced']} upstream_calls={stats['upstream_calls']}"
+            )
+            return
+
+        deleted = ai_cache.purge(expired_only=options['expired_only'])
+        self.stdout.write(self.style.SUCCESS(f"Removed {deleted} cached recipe suggestion(s)"))
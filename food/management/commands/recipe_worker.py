@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from food import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued AI recipe jobs (enable queueing with RECIPE_JOBS=1)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help="Jobs run at once (default RECIPE_JOB_CONCURRENCY)")
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help="Seconds to sleep when the queue is empty")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once nothing is left to run")
+        parser.add_argument('--max-jobs', type=int, default=None,
+                            help="Exit after this many jobs")
+
+    def handle(self, *args, **options):
+        try:
+            processed = jobs.run_worker(
+                concurrency=options['concurrency'],
+                poll_interval=options['poll_interval'],
+                once=options['once'],
+                max_jobs=options['max_jobs'],
+            )
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} recipe job(s)"))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from food.seed import seed_data
+
+
+class Command(BaseCommand):
+    help = "Seed users with groceries and shopping items, plus recipes and ingredients, for benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--groceries', type=int, default=100, help="Groceries per user")
+        parser.add_argument('--shopping', type=int, default=10, help="Shopping list items per user")
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument('--ingredients', type=int, default=200, help="New ingredients to create")
+        parser.add_argument('--prefix', default='seed', help="Username prefix of the seeded users")
+        parser.add_argument('--password', default='password123')
+        parser.add_argument('--seed', type=int, default=0, help="Random seed")
+
+    def handle(self, *args, **options):
+        counts = seed_data(
+            users=options['users'],
+            groceries=options['groceries'],
+            shopping=options['shopping'],
+            recipes=options['recipes'],
+            ingredients=options['ingredients'],
+            prefix=options['prefix'],
+            password=options['password'],
+            seed=options['seed'],
+        )
+        users = counts.pop('users')
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(users)} user(s): " + ', '.join(f"{count} {name}" for name, count in counts.items())
+        ))
+        if users:
+            self.stdout.write(f"Sign in as {users[0].email} / {options['password']}")
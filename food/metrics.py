@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+# Counters live in the Django cache so every worker sharing the cache
+# backend reports the same numbers.
+KEY_PREFIX = 'food:metrics:'
+
+# Every (metric, labels) pair any process has reported, for /metrics
+SERIES_KEY = 'series'
+
+# Request timings and labelled counters change on every request, so they
+# are added up in process memory and flushed to the cache in one batch
+# every METRICS_FLUSH_INTERVAL seconds (and on every /metrics scrape).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+GEMINI_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': ("Time to response by URL name", LATENCY_BUCKETS),
+    'http_db_queries': ("Database queries per request by URL name", QUERY_BUCKETS),
+    'http_db_duration_seconds': ("Database time per request by URL name", LATENCY_BUCKETS),
+    'gemini_request_duration_seconds': ("Gemini API calls by method and HTTP status", GEMINI_BUCKETS),
+}
+
+COUNTERS = {
+    'http_responses_total': "Responses by URL name, method and status code",
+    'gemini_finish_reasons_total': "Gemini candidates by finish reason",
+    'gemini_tokens_total': "Gemini tokens reported in usageMetadata, by kind",
+}
+
+# Histogram sums are stored as integers (cache incr), in millionths
+SUM_SCALE = 10 ** 6
+
+_lock = threading.Lock()
+_pending = defaultdict(int)
+_seen = set()
+_last_flush = time.monotonic()
+
+
+def incr(name, amount=1):
+    """Increment a named counter, creating it on first use"""
+    with _lock:
+        _seen.add((name, ()))
+    key = KEY_PREFIX + name
+    try:
+        return cache.incr(key, amount)
+    except ValueError:
+        if cache.add(key, amount, timeout=None):
+            return amount
+        return cache.incr(key, amount)
+
+
+def get_counter(name):
+    return cache.get(KEY_PREFIX + name, 0)
+
+
+def reset(*names):
+    cache.delete_many([KEY_PREFIX + name for name in names])
+
+
+# --- buffered metrics ---
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def series_name(name, labels=()):
+    """Exposition name of a series: name{a="x",b="y"}"""
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _bucket_label(bound):
+    return f'{bound:g}'
+
+
+def count(name, amount=1, **labels):
+    """Add to a labelled counter, buffered until the next flush"""
+    labels = tuple(sorted(labels.items()))
+    with _lock:
+        _seen.add((name, labels))
+        _pending[series_name(name, labels)] += amount
+
+
+def observe(name, value, **labels):
+    """Record one observation in a histogram from HISTOGRAMS"""
+    buckets = HISTOGRAMS[name][1]
+    labels = tuple(sorted(labels.items()))
+    bound = next((_bucket_label(b) for b in buckets if value <= b), '+Inf')
+    with _lock:
+        _seen.add((name, labels))
+        _pending[series_name(f'{name}_bucket', labels + (('le', bound),))] += 1
+        _pending[series_name(f'{name}_count', labels)] += 1
+        _pending[series_name(f'{name}_sum', labels)] += round(value * SUM_SCALE)
+
+
+def flush():
+    """Add this process's buffered metrics to the shared cache"""
+    global _pending, _last_flush
+    with _lock:
+        pending, _pending = _pending, defaultdict(int)
+        seen = set(_seen)
+        _last_flush = time.monotonic()
+
+    for name, amount in pending.items():
+        key = KEY_PREFIX + name
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            if not cache.add(key, amount, timeout=None):
+                cache.incr(key, amount)
+
+    # Re-checked on every flush, so a series lost to a concurrent write comes back
+    registry = cache.get(KEY_PREFIX + SERIES_KEY) or set()
+    if not seen <= registry:
+        cache.set(KEY_PREFIX + SERIES_KEY, registry | seen, timeout=None)
+
+
+def maybe_flush():
+    """
+    Flush when the interval has passed. Never inside a transaction: with
+    the database cache the writes would share its fate, and tests that
+    count queries run inside one.
+    """
+    interval = settings.METRICS_FLUSH_INTERVAL
+    if interval is None or connection.in_atomic_block:
+        return
+    if time.monotonic() - _last_flush >= interval:
+        flush()
+
+
+def _histogram_series(name, labels):
+    """Cache series of one histogram: cumulative-to-be buckets, sum, count"""
+    buckets = [_bucket_label(b) for b in HISTOGRAMS[name][1]] + ['+Inf']
+    return (
+        [series_name(f'{name}_bucket', labels + (('le', bound),)) for bound in buckets],
+        series_name(f'{name}_sum', labels),
+        series_name(f'{name}_count', labels),
+    )
+
+
+def render():
+    """All series in the Prometheus text exposition format"""
+    flush()
+    registry = cache.get(KEY_PREFIX + SERIES_KEY) or set()
+
+    by_metric = defaultdict(list)
+    keys = []
+    for name, labels in registry:
+        by_metric[name].append(labels)
+        if name in HISTOGRAMS:
+            buckets, sum_series, count_series = _histogram_series(name, labels)
+            keys += buckets + [sum_series, count_series]
+        else:
+            keys.append(series_name(name, labels))
+    cached = cache.get_many([KEY_PREFIX + key for key in keys])
+    values = {key[len(KEY_PREFIX):]: value for key, value in cached.items()}
+
+    lines = []
+    for name in sorted(by_metric):
+        if name in HISTOGRAMS:
+            lines += [f'# HELP {name} {HISTOGRAMS[name][0]}', f'# TYPE {name} histogram']
+            for labels in sorted(by_metric[name]):
+                buckets, sum_series, count_series = _histogram_series(name, labels)
+                total = 0
+                for series in buckets:
+                    total += values.get(series, 0)
+                    lines.append(f'{series} {total}')
+                lines.append(f'{sum_series} {values.get(sum_series, 0) / SUM_SCALE:g}')
+                lines.append(f'{count_series} {values.get(count_series, 0)}')
+        else:
+            help_text = COUNTERS.get(name, name.replace('_', ' ').capitalize())
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for labels in sorted(by_metric[name]):
+                series = series_name(name, labels)
+                lines.append(f'{series} {values.get(series, 0)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,68 @@
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+
+from . import metrics
+
+# Anything else a client sends is counted as "other", keeping labels bounded
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+class QueryTimer:
+    """execute_wrapper that counts queries and the time spent in them"""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.seconds += time.perf_counter() - started
+
+
+def record_request(request, response, seconds, timer=None):
+    match = request.resolver_match
+    view = match.view_name if match else 'unmatched'
+    method = request.method if request.method in METHODS else 'other'
+
+    metrics.observe('http_request_duration_seconds', seconds, view=view)
+    metrics.count('http_responses_total', view=view, method=method, status=response.status_code)
+    if timer is not None:
+        metrics.observe('http_db_queries', timer.queries, view=view)
+        metrics.observe('http_db_duration_seconds', timer.seconds, view=view)
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Time every request by URL name, with its database queries. Streaming
+    responses are timed to the first byte.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            # Async views query from worker threads, out of reach of
+            # execute_wrapper, so only latency and status are recorded
+            started = time.perf_counter()
+            response = await get_response(request)
+            record_request(request, response, time.perf_counter() - started)
+            await sync_to_async(metrics.maybe_flush)()
+            return response
+    else:
+        def middleware(request):
+            timer = QueryTimer()
+            started = time.perf_counter()
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = get_response(request)
+            record_request(request, response, time.perf_counter() - started, timer)
+            metrics.maybe_flush()
+            return response
+    return middleware
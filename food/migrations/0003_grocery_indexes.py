@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:40
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_shopping_items(apps, schema_editor):
+    """Fold duplicate (user, grocery) rows into one before adding the unique constraint"""
+    ShoppingList = apps.get_model('food', 'ShoppingList')
+    duplicates = (
+        ShoppingList.objects.values('user_id', 'grocery_id')
+        .annotate(rows=Count('id'), total=Sum('quantity'))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates:
+        items = ShoppingList.objects.filter(
+            user_id=duplicate['user_id'],
+            grocery_id=duplicate['grocery_id']
+        ).order_by('id')
+        keep = items.first()
+        items.exclude(pk=keep.pk).delete()
+        keep.quantity = duplicate['total']
+        keep.save(update_fields=['quantity'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0002_recipe_suggestion_cache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_shopping_items, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='grocery',
+            index=models.Index(fields=['user', 'ex_date'], name='food_groc_user_exdate_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grocery',
+            index=models.Index(fields=['user', 'grocery_name'], name='food_groc_user_name_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglist',
+            constraint=models.UniqueConstraint(fields=('user', 'grocery'), name='food_shop_list_user_grocery_uniq'),
+        ),
+        # EmailBackend looks users up by email, which auth_user does not index
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS food_auth_user_email_idx ON auth_user (email)",
+            "DROP INDEX IF EXISTS food_auth_user_email_idx",
+        ),
+    ]
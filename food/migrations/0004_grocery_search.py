@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:42
+
+from django.db import migrations
+
+# SQLite: an FTS5 index over grocery and category names, kept in sync by
+# triggers so bulk updates and raw SQL stay searchable too. The owner
+# column holds "u<user_id>" so a search only walks one user's entries.
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE food_groceries_fts USING fts5(
+        grocery_name, type_name, owner,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    INSERT INTO food_groceries_fts (rowid, grocery_name, type_name, owner)
+    SELECT g.id, g.grocery_name, t.type_name, 'u' || g.user_id
+    FROM food_groceries g JOIN food_groceries_type t ON t.id = g.grocerie_type_id
+    """,
+    """
+    CREATE TRIGGER food_groceries_fts_insert AFTER INSERT ON food_groceries BEGIN
+        INSERT INTO food_groceries_fts (rowid, grocery_name, type_name, owner)
+        SELECT new.id, new.grocery_name, t.type_name, 'u' || new.user_id
+        FROM food_groceries_type t WHERE t.id = new.grocerie_type_id;
+    END
+    """,
+    """
+    CREATE TRIGGER food_groceries_fts_delete AFTER DELETE ON food_groceries BEGIN
+        DELETE FROM food_groceries_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER food_groceries_fts_update
+    AFTER UPDATE OF grocery_name, grocerie_type_id, user_id ON food_groceries BEGIN
+        DELETE FROM food_groceries_fts WHERE rowid = old.id;
+        INSERT INTO food_groceries_fts (rowid, grocery_name, type_name, owner)
+        SELECT new.id, new.grocery_name, t.type_name, 'u' || new.user_id
+        FROM food_groceries_type t WHERE t.id = new.grocerie_type_id;
+    END
+    """,
+    """
+    CREATE TRIGGER food_groceries_type_fts_update AFTER UPDATE OF type_name ON food_groceries_type BEGIN
+        UPDATE food_groceries_fts SET type_name = new.type_name
+        WHERE rowid IN (SELECT id FROM food_groceries WHERE grocerie_type_id = new.id);
+    END
+    """,
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS food_groceries_type_fts_update",
+    "DROP TRIGGER IF EXISTS food_groceries_fts_update",
+    "DROP TRIGGER IF EXISTS food_groceries_fts_delete",
+    "DROP TRIGGER IF EXISTS food_groceries_fts_insert",
+    "DROP TABLE IF EXISTS food_groceries_fts",
+]
+
+# PostgreSQL: trigram GIN indexes let the icontains (ILIKE) search use an index
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS food_groc_name_trgm_idx ON food_groceries USING gin (grocery_name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS food_groc_type_trgm_idx ON food_groceries_type USING gin (type_name gin_trgm_ops)",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS food_groc_type_trgm_idx",
+    "DROP INDEX IF EXISTS food_groc_name_trgm_idx",
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0003_grocery_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run_statements({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}),
+        ),
+    ]
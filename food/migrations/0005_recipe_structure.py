@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0004_grocery_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receipe',
+            name='cook_time_minutes',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='receipe',
+            name='difficulty',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='receipe',
+            name='steps',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:40
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # Same as running "manage.py createcachetable"; a no-op unless
+    # CACHE_BACKEND is "db", so a fresh "migrate" leaves nothing to forget
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0005_recipe_structure'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
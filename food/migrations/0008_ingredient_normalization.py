@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def normalize_existing(apps, schema_editor):
+    """Fill normalized_name and trigrams; "manage.py normalize_ingredients" merges duplicates"""
+    from food.ingredients import normalize_ingredient, trigrams
+
+    Ingredient = apps.get_model('food', 'Ingredient')
+    IngredientTrigram = apps.get_model('food', 'IngredientTrigram')
+
+    ingredients = list(Ingredient.objects.all())
+    for ingredient in ingredients:
+        ingredient.normalized_name = normalize_ingredient(ingredient.name)
+    Ingredient.objects.bulk_update(ingredients, ['normalized_name'], batch_size=500)
+    IngredientTrigram.objects.bulk_create([
+        IngredientTrigram(ingredient=ingredient, trigram=gram)
+        for ingredient in ingredients
+        for gram in trigrams(ingredient.normalized_name)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0007_recipe_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='normalized_name',
+            field=models.CharField(db_index=True, default='', max_length=200),
+        ),
+        migrations.CreateModel(
+            name='IngredientTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='food.ingredient')),
+            ],
+            options={
+                'db_table': 'food_ingredient_trigram',
+                'indexes': [models.Index(fields=['trigram', 'ingredient'], name='food_ing_trigram_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ingredient', 'trigram'), name='food_ing_trigram_uniq')],
+            },
+        ),
+        migrations.RunPython(normalize_existing, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,53 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
 from datetime import date, timedelta
 
+EXPIRING_SOON_DAYS = 7
+
+# Grocery expiry status, as annotated by GroceryQuerySet.with_expiry_status()
+EXPIRED = 'expired'
+EXPIRING_SOON = 'soon'
+FRESH = 'ok'
+
+
+class DaysUntil(models.Func):
+    """Whole days from a date value to a date column (negative once past)"""
+    output_field = models.IntegerField()
+
+    def __init__(self, expression, today, **extra):
+        super().__init__(expression, models.Value(today, output_field=models.DateField()), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # PostgreSQL: date - date is already an integer number of days
+        return super().as_sql(compiler, connection, template='(%(expressions)s)', arg_joiner=' - ', **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)', arg_joiner=') - julianday(',
+            **extra_context
+        )
+
+
+class GroceryQuerySet(models.QuerySet):
+    def with_expiry_status(self, today=None):
+        """
+        Annotate expiry_status (expired / soon / ok) and days_remaining,
+        computed by the database against one "today"
+        """
+        today = today or date.today()
+        return self.annotate(
+            days_remaining=DaysUntil('ex_date', today),
+            expiry_status=models.Case(
+                models.When(ex_date__lt=today, then=models.Value(EXPIRED)),
+                models.When(ex_date__lte=today + timedelta(days=EXPIRING_SOON_DAYS), then=models.Value(EXPIRING_SOON)),
+                default=models.Value(FRESH),
+                output_field=models.CharField(),
+            ),
+        )
+
+
 # Grocery Categories
 class GroceryType(models.Model):
     type_name = models.CharField(max_length=100)
@@ -20,32 +66,66 @@ class Grocery(models.Model):
     grocerie_type = models.ForeignKey(GroceryType, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    objects = GroceryQuerySet.as_manager()
+
     class Meta:
         db_table = 'food_groceries'  # matches existing table
+        indexes = [
+            # Pantry pages filter by user then order by expiry or name
+            models.Index(fields=['user', 'ex_date'], name='food_groc_user_exdate_idx'),
+            models.Index(fields=['user', 'grocery_name'], name='food_groc_user_name_idx'),
+        ]
 
+    # Both prefer the with_expiry_status() annotation when the row has it
     @property
     def is_expired(self):
+        if hasattr(self, 'expiry_status'):
+            return self.expiry_status == EXPIRED
         return self.ex_date < date.today()
 
     @property
     def is_expiring_soon(self):
-        return date.today() <= self.ex_date <= date.today() + timedelta(days=7)
+        if hasattr(self, 'expiry_status'):
+            return self.expiry_status == EXPIRING_SOON
+        today = date.today()
+        return today <= self.ex_date <= today + timedelta(days=EXPIRING_SOON_DAYS)
+
     def __str__(self):
         return self.grocery_name
 
 # Ingredients
 class Ingredient(models.Model):
     name = models.CharField(max_length=200, unique=True)
+    # food.ingredients.normalize_ingredient(name): what lookups compare on
+    normalized_name = models.CharField(max_length=200, db_index=True, default="")
     default_unit = models.CharField(max_length=50, blank=True, null=True)
 
     def __str__(self):
         return self.name
 
 
+# Padded word trigrams of Ingredient.normalized_name for fuzzy lookups
+class IngredientTrigram(models.Model):
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, related_name='trigrams')
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        db_table = 'food_ingredient_trigram'
+        indexes = [
+            models.Index(fields=['trigram', 'ingredient'], name='food_ing_trigram_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['ingredient', 'trigram'], name='food_ing_trigram_uniq'),
+        ]
+
+
 # Recipe (you need this model since Receipe_Ingredients references it)
 class Receipe(models.Model):
     name = models.CharField(max_length=200, default="Unnamed Recipe")
     description = models.TextField(blank=True, null=True)
+    steps = models.JSONField(default=list, blank=True)
+    cook_time_minutes = models.PositiveIntegerField(blank=True, null=True)
+    difficulty = models.CharField(max_length=10, blank=True, default="")
 
     def __str__(self):
         return self.name
@@ -70,3 +150,78 @@ class ShoppingList(models.Model):
 
     class Meta:
         db_table = 'food_shop_list'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'grocery'], name='food_shop_list_user_grocery_uniq'),
+        ]
+
+
+# Cached Gemini recipe suggestions, keyed on the normalized request
+class RecipeSuggestionCache(models.Model):
+    key = models.CharField(max_length=64, unique=True)
+    model_name = models.CharField(max_length=100)
+    response_text = models.TextField()
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed = models.DateTimeField(default=timezone.now, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'food_ai_recipe_cache'
+
+    def __str__(self):
+        return f"{self.model_name} {self.key[:12]}"
+
+
+# Queued Gemini generation requests, picked up by the recipe_worker command
+class RecipeJob(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+    SUGGEST = 'suggest'
+    REFINE = 'refine'
+    KIND_CHOICES = [
+        (SUGGEST, 'Suggest recipes'),
+        (REFINE, 'Refine recipes'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    dedup_key = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, default="")
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, default="")
+    locked_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'food_recipe_job'
+        indexes = [
+            # The worker's claim query: oldest runnable queued jobs
+            models.Index(fields=['status', 'run_after'], name='food_job_status_run_idx'),
+            models.Index(fields=['locked_by'], name='food_job_locked_by_idx'),
+        ]
+        constraints = [
+            # At most one queued/running job per identical request
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='food_job_active_dedup_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
@@ -0,0 +1,103 @@
+import base64
+import json
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# ============================================
+# KEYSET (CURSOR) PAGINATION
+# ============================================
+
+
+def encode_cursor(values):
+    """Opaque URL-safe cursor for the sort key of the last row on a page"""
+    values = [value.isoformat() if isinstance(value, date) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def _parse_date(value):
+    if not isinstance(value, str):
+        raise TypeError("date must be a string")
+    return date.fromisoformat(value)
+
+
+def _parse_int(value):
+    # bool is an int subclass, but never a valid key
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise TypeError("expected an integer")
+    return value
+
+
+def _parse_str(value):
+    if not isinstance(value, str):
+        raise TypeError("expected a string")
+    return value
+
+
+def value_parser(field):
+    """Function that checks a decoded cursor value for field and converts it"""
+    internal_type = field.get_internal_type()
+    if internal_type == 'DateField':
+        return _parse_date
+    if internal_type.endswith(('IntegerField', 'AutoField')):
+        return _parse_int
+    if internal_type in ('CharField', 'TextField'):
+        return _parse_str
+    return field.to_python
+
+
+def decode_cursor(cursor, parsers):
+    """
+    Returns the decoded sort key, one value per parser, or None if the
+    cursor is missing or invalid. Cursors come from the URL, so every
+    value is checked: a tampered one starts over instead of failing.
+    """
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(parsers):
+        return None
+    try:
+        return [parse(value) for parse, value in zip(parsers, values)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def seek_after(queryset, fields, cursor):
+    """
+    Order queryset by fields (all ascending, last one unique, e.g.
+    ('ex_date', 'id')) and skip to the rows after cursor.
+    Seeks with WHERE (a > x) OR (a = x AND b > y) instead of OFFSET, so
+    every page costs the same no matter how deep it is.
+    """
+    queryset = queryset.order_by(*fields)
+    after = decode_cursor(cursor, [value_parser(queryset.model._meta.get_field(field)) for field in fields])
+    if after is None:
+        return queryset
+
+    seek = Q()
+    for i, field in enumerate(fields):
+        term = Q(**{f'{field}__gt': after[i]})
+        for previous, value in zip(fields[:i], after[:i]):
+            term &= Q(**{previous: value})
+        seek |= term
+    # The redundant >= on the leading column gives the index a range start
+    return queryset.filter(Q(**{f'{fields[0]}__gte': after[0]}), seek)
+
+
+def keyset_page(queryset, fields, cursor=None, page_size=50):
+    """
+    Fetch one page of queryset ordered by fields, starting after cursor
+    Returns: (rows, next_cursor) where next_cursor is None on the last page
+    """
+    rows = list(seek_after(queryset, fields, cursor)[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, field) for field in fields])
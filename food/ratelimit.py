@@ -0,0 +1,190 @@
+import asyncio
+import json
+import math
+import time
+import uuid
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import redirect
+
+from . import metrics
+
+# ============================================
+# GEMINI RATE LIMITING (TOKEN BUCKET)
+# ============================================
+#
+# Each bucket is stored as a single "theoretical arrival time" in the
+# shared cache (GCRA, an exact token bucket that needs no refill timer).
+# One global bucket keeps us under the Gemini quota and one bucket per
+# user stops a single household from using all of it.
+
+KEY_PREFIX = 'food:ratelimit:'
+LOCK_KEY = KEY_PREFIX + 'lock'
+GLOBAL_KEY = KEY_PREFIX + 'global'
+
+DELAYED = 'ratelimit_delayed'
+REJECTED = 'ratelimit_rejected'
+
+
+class TokenBucket:
+    """Refills per_minute tokens a minute, holding at most capacity"""
+
+    def __init__(self, key, per_minute, capacity):
+        self.key = key
+        self.interval = 60.0 / per_minute
+        self.tolerance = self.interval * (capacity - 1)
+
+    def reserve(self, tat, now):
+        """
+        Try to take one token from a bucket whose state is tat
+        Returns: (new_tat, retry_after) where retry_after is 0 if allowed
+        """
+        start = max(tat if tat is not None else now, now)
+        if start - now > self.tolerance:
+            return tat, start - self.tolerance - now
+        return start + self.interval, 0.0
+
+    @property
+    def timeout(self):
+        # State older than a full bucket means "full" anyway
+        return math.ceil(self.tolerance + self.interval) + 1
+
+
+def get_buckets(user_id):
+    return [
+        TokenBucket(GLOBAL_KEY, settings.GEMINI_RATE_LIMIT_PER_MINUTE, settings.GEMINI_RATE_LIMIT_BURST),
+        TokenBucket(f'{KEY_PREFIX}user:{user_id}',
+                    settings.GEMINI_USER_RATE_LIMIT_PER_MINUTE, settings.GEMINI_USER_RATE_LIMIT_BURST),
+    ]
+
+
+def _lock():
+    """Short cache lock so concurrent workers do not double-spend a token"""
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + 0.05
+    while not cache.add(LOCK_KEY, token, timeout=1):
+        if time.monotonic() >= deadline:
+            # Fail open: a rare over-admit beats stalling every request
+            return None
+        time.sleep(0.002)
+    return token
+
+
+def acquire(user_id, now=None):
+    """
+    Take a token from the global and the user's bucket, or from neither.
+    Returns: seconds to wait before retrying, 0 if the call may proceed
+    """
+    buckets = get_buckets(user_id)
+    token = _lock()
+    try:
+        now = time.time() if now is None else now
+        states = cache.get_many([bucket.key for bucket in buckets])
+
+        updates, retry_after = {}, 0.0
+        for bucket in buckets:
+            new_tat, wait = bucket.reserve(states.get(bucket.key), now)
+            updates[bucket.key] = (new_tat, bucket.timeout)
+            retry_after = max(retry_after, wait)
+
+        if retry_after:
+            return retry_after
+        for key, (new_tat, timeout) in updates.items():
+            cache.set(key, new_tat, timeout=timeout)
+        return 0.0
+    finally:
+        # Past the 1 s timeout the lock may belong to another worker by now
+        if token is not None and cache.get(LOCK_KEY) == token:
+            cache.delete(LOCK_KEY)
+
+
+class RateLimited(Exception):
+    """The Gemini budget is spent for longer than a request may wait"""
+
+    def __init__(self, retry_after):
+        super().__init__(retry_message(retry_after))
+        self.retry_after = retry_after
+
+
+def retry_message(retry_after):
+    seconds = max(1, math.ceil(retry_after))
+    return f"Too many recipe requests right now. Please try again in {seconds} seconds."
+
+
+def take_token(user_id):
+    """
+    Wait for a token before calling Gemini for user_id. Waits of up to
+    GEMINI_RATE_LIMIT_MAX_WAIT seconds are queued, longer ones raise
+    RateLimited.
+    """
+    deadline = time.monotonic() + settings.GEMINI_RATE_LIMIT_MAX_WAIT
+    retry_after = acquire(user_id)
+    while retry_after:
+        if time.monotonic() + retry_after > deadline:
+            metrics.incr(REJECTED)
+            raise RateLimited(retry_after)
+        metrics.incr(DELAYED)
+        time.sleep(retry_after)
+        retry_after = acquire(user_id)
+
+
+async def atake_token(user_id):
+    """Async version of take_token(), the wait does not hold a thread"""
+    deadline = time.monotonic() + settings.GEMINI_RATE_LIMIT_MAX_WAIT
+    retry_after = await sync_to_async(acquire)(user_id)
+    while retry_after:
+        if time.monotonic() + retry_after > deadline:
+            await sync_to_async(metrics.incr)(REJECTED)
+            raise RateLimited(retry_after)
+        await sync_to_async(metrics.incr)(DELAYED)
+        await asyncio.sleep(retry_after)
+        retry_after = await sync_to_async(acquire)(user_id)
+
+
+def too_many_requests(request, retry_after):
+    """Reject in the shape the endpoint's client understands"""
+    message = retry_message(retry_after)
+
+    if 'text/event-stream' in request.headers.get('Accept', ''):
+        response = HttpResponse(
+            f"event: error\ndata: {json.dumps({'message': message})}\n\n",
+            content_type='text/event-stream', status=429
+        )
+    elif request.method == 'GET':
+        messages.warning(request, message)
+        response = redirect('index')
+    else:
+        response = JsonResponse({'status': 'error', 'message': message}, status=429)
+
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def rate_limited(view):
+    """
+    Turn RateLimited from a Gemini-backed view (sync or async) into a 429
+    with Retry-After. The token itself is taken right before the upstream
+    call, so answers from the cache or from another request's flight
+    cost nothing.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                return await view(request, *args, **kwargs)
+            except RateLimited as e:
+                return await sync_to_async(too_many_requests)(request, e.retry_after)
+        return wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except RateLimited as e:
+            return too_many_requests(request, e.retry_after)
+    return wrapper
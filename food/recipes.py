@@ -0,0 +1,175 @@
+import json
+
+from django.db import transaction
+
+from .ingredients import build_trigrams, display_name, match_ingredients, normalize_ingredient
+from .models import Ingredient, IngredientTrigram, Receipe, Receipe_Ingredients
+
+# ============================================
+# STRUCTURED RECIPES
+# ============================================
+
+DIFFICULTIES = ('Easy', 'Medium', 'Hard')
+
+# Gemini responseSchema: a list of recipes with real quantities and steps
+RECIPE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "name": {"type": "STRING"},
+            "summary": {"type": "STRING"},
+            "ingredients": {
+                "type": "ARRAY",
+                "items": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "name": {"type": "STRING"},
+                        "quantity": {"type": "NUMBER"},
+                        "unit": {"type": "STRING"},
+                    },
+                    "required": ["name", "quantity", "unit"],
+                    "propertyOrdering": ["name", "quantity", "unit"],
+                },
+            },
+            "steps": {"type": "ARRAY", "items": {"type": "STRING"}},
+            "cook_time_minutes": {"type": "INTEGER"},
+            "difficulty": {"type": "STRING", "enum": list(DIFFICULTIES)},
+        },
+        "required": ["name", "ingredients", "steps", "cook_time_minutes", "difficulty"],
+        "propertyOrdering": ["name", "summary", "ingredients", "steps", "cook_time_minutes", "difficulty"],
+    },
+}
+
+
+def _to_number(value, cast):
+    try:
+        number = cast(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 else None
+
+
+def clean_recipe(data):
+    """
+    Validate one recipe dict from Gemini (or the browser) into the shape
+    the templates and create_recipe expect. Raises ValueError if unusable.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Recipe must be an object")
+
+    ingredients = []
+    for item in data.get('ingredients') or []:
+        if isinstance(item, str):
+            item = {'name': item}
+        if not isinstance(item, dict):
+            continue
+        name = str(item.get('name') or '').strip()
+        if name:
+            ingredients.append({
+                'name': name,
+                'quantity': _to_number(item.get('quantity'), float),
+                'unit': str(item.get('unit') or '').strip(),
+            })
+
+    difficulty = str(data.get('difficulty') or '').strip().capitalize()
+
+    return {
+        'name': str(data.get('name') or '').strip() or 'Unnamed Recipe',
+        'summary': str(data.get('summary') or '').strip(),
+        'ingredients': ingredients,
+        'steps': [str(step).strip() for step in data.get('steps') or [] if str(step).strip()],
+        'cook_time_minutes': _to_number(data.get('cook_time_minutes'), int),
+        'difficulty': difficulty if difficulty in DIFFICULTIES else '',
+    }
+
+
+def parse_recipes(text):
+    """
+    Parse a Gemini JSON response into a list of clean recipes
+    Returns: (recipes, error)
+    """
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None, "API returned recipes in an unexpected format."
+
+    if isinstance(data, dict):
+        data = data.get('recipes', [data])
+    if not isinstance(data, list):
+        return None, "API returned recipes in an unexpected format."
+
+    recipes = []
+    for item in data:
+        try:
+            recipes.append(clean_recipe(item))
+        except ValueError:
+            continue
+
+    if not recipes:
+        return None, "API returned no recipes."
+    return recipes, None
+
+
+# ============================================
+# RECIPE PERSISTENCE
+# ============================================
+
+def get_or_create_ingredients(names):
+    """
+    Resolve raw ingredient names to rows. Names that normalize alike
+    ("2 tomatoes, diced", "Tomato") or are close by trigram similarity
+    share a row; the rest are inserted in one bulk insert with their
+    trigrams.
+    Returns: dict of name -> Ingredient
+    """
+    ingredients = match_ingredients(names)
+    missing = {}
+    for name in names:
+        if name not in ingredients:
+            missing.setdefault(normalize_ingredient(name), []).append(name)
+
+    if missing:
+        # ignore_conflicts covers a concurrent save creating the same name
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=display_name(key), normalized_name=key) for key in missing],
+            ignore_conflicts=True
+        )
+        created = {i.name: i for i in Ingredient.objects.filter(name__in=[display_name(key) for key in missing])}
+        IngredientTrigram.objects.bulk_create(build_trigrams(created.values()), ignore_conflicts=True)
+        for key, raw_names in missing.items():
+            for name in raw_names:
+                ingredients[name] = created[display_name(key)]
+
+    return ingredients
+
+
+def create_recipe(recipe):
+    """Save a clean recipe dict and its ingredient rows in one transaction"""
+    # One row per ingredient name, first mention wins
+    lines = {}
+    for line in recipe['ingredients']:
+        lines.setdefault(line['name'], line)
+
+    with transaction.atomic():
+        saved = Receipe.objects.create(
+            name=recipe['name'],
+            description=recipe['summary'],
+            steps=recipe['steps'],
+            cook_time_minutes=recipe['cook_time_minutes'],
+            difficulty=recipe['difficulty']
+        )
+        if lines:
+            ingredients = get_or_create_ingredients(list(lines))
+            # Spellings of the same ingredient collapse to its first mention
+            rows = {}
+            for name, line in lines.items():
+                rows.setdefault(ingredients[name].pk, Receipe_Ingredients(
+                    receipe=saved,
+                    ingredient=ingredients[name],
+                    quantity=line['quantity'] or 1,
+                    unit=line['unit'] if line['quantity'] else (line['unit'] or 'as needed')
+                ))
+            Receipe_Ingredients.objects.bulk_create(rows.values())
+
+    return saved
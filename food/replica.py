@@ -0,0 +1,101 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+# ============================================
+# READ REPLICA ROUTING
+# ============================================
+#
+# Reads go to the primary unless a request has opted in: GETs of the
+# read-only views below, and the expiry banner on any page. After any
+# request that wrote replicated rows, whatever its method, the browser
+# carries a short-lived cookie that keeps it on the primary, so users
+# always see their own writes despite replica lag.
+
+# URL names of views that only read
+READ_ONLY_VIEWS = {'index', 'shopping', 'view_saved_recipes', 'recipe_detail'}
+
+# Apps whose tables are replicated and safe to read stale. Sessions and
+# the database cache (rate limits, locks) must always read the primary.
+REPLICATED_APPS = {'food', 'auth', 'contenttypes'}
+
+STICKY_COOKIE = 'db_primary'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+# Per-request {'wrote': bool}, flagged by the router. Mutated rather than
+# set, so the middleware sees writes made in another context under ASGI.
+_writes = ContextVar('replica_writes', default=None)
+
+
+def replica_alias():
+    return settings.DATABASE_READ_REPLICA or None
+
+
+def can_use_replica(request):
+    return (
+        replica_alias() is not None
+        and request.method in ('GET', 'HEAD')
+        and STICKY_COOKIE not in request.COOKIES
+    )
+
+
+@contextmanager
+def reading_from_replica(request):
+    """Route this block's reads to the replica when the request allows it"""
+    if not can_use_replica(request):
+        yield
+        return
+    previous = _use_replica.get()
+    _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.set(previous)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and model._meta.app_label in REPLICATED_APPS:
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        writes = _writes.get()
+        if writes is not None and model._meta.app_label in REPLICATED_APPS:
+            writes['wrote'] = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if replica_alias() is None:
+            return None
+        # The replica holds the same rows as the primary
+        databases = {'default', replica_alias()}
+        return obj1._state.db in databases and obj2._state.db in databases
+
+
+class ReplicaMiddleware(MiddlewareMixin):
+    """Opts read-only views into the replica and pins writers to the primary"""
+
+    def process_request(self, request):
+        request.replica_writes = {'wrote': False}
+        _writes.set(request.replica_writes)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.resolver_match.url_name in READ_ONLY_VIEWS and can_use_replica(request):
+            # Set rather than reset with a token: under ASGI this hook runs
+            # in a different context than process_response
+            _use_replica.set(True)
+
+    def process_response(self, request, response):
+        _use_replica.set(False)
+        _writes.set(None)
+        writes = getattr(request, 'replica_writes', None)
+        if writes is not None and writes['wrote'] and replica_alias():
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=settings.DATABASE_REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,82 @@
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+from django.db.models.expressions import RawSQL
+
+from .models import Grocery
+
+# ============================================
+# GROCERY SEARCH (SQLite FTS5 / PostgreSQL trigram)
+# ============================================
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_match_query(user, query):
+    """
+    Turn free text into an FTS5 MATCH expression: every word must match
+    a prefix of the grocery or category name, scoped to the user's rows.
+    Returns None when the query has no searchable words.
+    """
+    tokens = TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return None
+    terms = ' AND '.join(f'"{token}"*' for token in tokens)
+    return f'owner : "u{user.pk}" AND {{grocery_name type_name}} : ({terms})'
+
+
+def search_groceries(queryset, user, query):
+    """Restrict a Grocery queryset to the rows matching query"""
+    if connection.vendor != 'sqlite':
+        # On PostgreSQL the trigram GIN indexes serve these ILIKE lookups
+        return queryset.filter(
+            Q(grocery_name__icontains=query) |
+            Q(grocerie_type__type_name__icontains=query)
+        )
+
+    match = build_match_query(user, query)
+    if match is None:
+        return queryset.none()
+    return queryset.filter(id__in=RawSQL(
+        "SELECT rowid FROM food_groceries_fts WHERE food_groceries_fts MATCH %s",
+        [match]
+    ))
+
+
+def ranked_grocery_ids(user, query, limit=20):
+    """Ids of the best matches for query, most relevant first"""
+    if connection.vendor != 'sqlite':
+        return list(
+            search_groceries(Grocery.objects.filter(user=user), user, query)
+            .order_by('grocery_name')
+            .values_list('id', flat=True)[:limit]
+        )
+
+    match = build_match_query(user, query)
+    if match is None:
+        return []
+    with connection.cursor() as cursor:
+        # bm25 weights: a name hit counts more than a category hit
+        cursor.execute(
+            """
+            SELECT rowid FROM food_groceries_fts
+            WHERE food_groceries_fts MATCH %s
+            ORDER BY bm25(food_groceries_fts, 10.0, 2.0, 0.0)
+            LIMIT %s
+            """,
+            [match, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def ranked_search(user, query, limit=20):
+    """Groceries matching query in relevance order"""
+    ids = ranked_grocery_ids(user, query, limit)
+    if not ids:
+        return Grocery.objects.none()
+    ordering = Case(
+        *[When(id=pk, then=position) for position, pk in enumerate(ids)],
+        output_field=IntegerField()
+    )
+    return Grocery.objects.filter(id__in=ids).select_related('grocerie_type').order_by(ordering)
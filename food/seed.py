@@ -0,0 +1,192 @@
+import random
+from datetime import date, timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .cookable import all_recipes_changed
+from .ingredients import build_trigrams, normalize_ingredient
+from .models import Grocery, GroceryType, Ingredient, IngredientTrigram, Receipe, Receipe_Ingredients, ShoppingList
+
+# ============================================
+# SYNTHETIC DATA
+# ============================================
+#
+# Seeds users with pantries, shopping lists and a shared recipe book for
+# benchmarks and local experiments. Everything is drawn from a seeded
+# random.Random, so the same arguments always produce the same data.
+
+FOODS = {
+    'Dairy': ['Milk', 'Butter', 'Cheese', 'Yogurt', 'Cream', 'Egg', 'Mozzarella', 'Parmesan', 'Feta'],
+    'Produce': [
+        'Tomato', 'Onion', 'Garlic', 'Potato', 'Carrot', 'Spinach', 'Lettuce', 'Cucumber', 'Pepper',
+        'Mushroom', 'Zucchini', 'Broccoli', 'Cabbage', 'Lemon', 'Apple', 'Banana', 'Avocado', 'Ginger',
+        'Celery', 'Kale', 'Leek', 'Basil', 'Parsley', 'Cilantro',
+    ],
+    'Meat': ['Chicken', 'Beef', 'Pork', 'Bacon', 'Sausage', 'Turkey', 'Salmon', 'Tuna', 'Shrimp'],
+    'Bakery': ['Bread', 'Tortilla', 'Bagel', 'Pita', 'Croissant'],
+    'Pantry': [
+        'Rice', 'Pasta', 'Flour', 'Sugar', 'Oat', 'Lentil', 'Chickpea', 'Bean', 'Honey', 'Vinegar',
+        'Olive oil', 'Soy sauce', 'Peanut butter', 'Coconut milk', 'Quinoa', 'Noodle',
+    ],
+    'Frozen': ['Pea', 'Corn', 'Berry', 'Ice cream', 'Dumpling'],
+}
+
+# Qualifiers that survive normalization, so "Smoked salmon" stays distinct
+VARIETIES = [
+    'Smoked', 'Red', 'Green', 'Yellow', 'Sweet', 'Wild', 'Brown', 'White', 'Black', 'Baby', 'Greek',
+    'Spicy', 'Dried', 'Roasted', 'Pickled', 'Toasted', 'Salted', 'Unsalted', 'Frozen', 'Canned',
+]
+
+DISHES = ['Soup', 'Salad', 'Stew', 'Curry', 'Stir Fry', 'Bake', 'Pie', 'Tacos', 'Bowl', 'Skillet', 'Frittata']
+DIFFICULTIES = ['Easy', 'Easy', 'Medium', 'Hard']
+
+# Share of a pantry by days until expiry: (weight, first day, last day)
+EXPIRY_BANDS = [
+    (10, -30, -1),    # already expired
+    (20, 0, 7),       # expiring soon
+    (50, 8, 60),      # fridge
+    (20, 61, 365),    # freezer and cupboard
+]
+
+
+def ingredient_names(count, taken=()):
+    """
+    count distinct ingredient names, plain foods first, that normalize
+    to something not in taken
+    """
+    foods = [food for foods in FOODS.values() for food in foods]
+    candidates = foods + [f'{variety} {food.lower()}' for variety in VARIETIES for food in foods]
+
+    def synthetic(n):
+        word = ''
+        while True:
+            n, letter = divmod(n, 26)
+            word += chr(ord('a') + letter)
+            if not n:
+                return word
+
+    names, seen = [], set(taken)
+    n = 0
+    while len(names) < count:
+        if n < len(candidates):
+            name = candidates[n]
+        else:
+            # Out of real names: "Tomato kab", "Onion kac", ...
+            name = f'{foods[n % len(foods)]} {synthetic(n)}'
+        n += 1
+        key = normalize_ingredient(name)
+        if key not in seen:
+            seen.add(key)
+            names.append(name)
+    return names
+
+
+def random_expiry(rng, today):
+    weights = list(accumulate(band[0] for band in EXPIRY_BANDS))
+    _, first, last = rng.choices(EXPIRY_BANDS, cum_weights=weights)[0]
+    return today + timedelta(days=rng.randint(first, last))
+
+
+@transaction.atomic
+def seed_data(users=10, groceries=100, shopping=10, recipes=100, ingredients=200,
+              prefix='seed', password='password123', seed=0, today=None):
+    """
+    Create users with groceries and shopping items, and recipes over a
+    pool of ingredients. Popular ingredients appear in many recipes, as
+    in a real recipe book.
+    Returns: dict of counts, plus the created users under 'users'
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+
+    types = {name: GroceryType.objects.get_or_create(type_name=name)[0] for name in FOODS}
+    type_of = {food: types[name] for name, foods in FOODS.items() for food in foods}
+
+    # Users: one password hash shared by all, hashing is the slow part
+    start = User.objects.filter(username__startswith=prefix).count()
+    hashed = make_password(password)
+    usernames = [f'{prefix}{n:05d}' for n in range(start, start + users)]
+    User.objects.bulk_create([
+        User(username=username, email=f'{username}@example.com', password=hashed)
+        for username in usernames
+    ])
+    created_users = list(User.objects.filter(username__in=usernames).order_by('id'))
+
+    # Pantries favour common foods, so recipes and groceries overlap
+    foods = [food for foods in FOODS.values() for food in foods]
+    food_weights = list(accumulate(1 / (rank + 1) ** 0.5 for rank in range(len(foods))))
+    pantries = {}
+    for user in created_users:
+        pantries[user] = []
+        for food in rng.choices(foods, cum_weights=food_weights, k=groceries):
+            pantries[user].append(Grocery(
+                grocery_name=food,
+                ex_date=random_expiry(rng, today),
+                quantity=rng.choice([1, 1, 1, 2, 2, 3, 4, 6]),
+                grocerie_type=type_of[food],
+                user=user,
+            ))
+    grocery_rows = [grocery for pantry in pantries.values() for grocery in pantry]
+    Grocery.objects.bulk_create(grocery_rows, batch_size=1000)
+
+    shopping_rows = [
+        ShoppingList(grocery=grocery, user=user, quantity=rng.randint(1, 3))
+        for user, pantry in pantries.items()
+        for grocery in rng.sample(pantry, min(shopping, len(pantry)))
+    ]
+    ShoppingList.objects.bulk_create(shopping_rows, batch_size=1000)
+
+    # Ingredients: bulk_create sends no signals, so normalize and index here
+    taken = set(Ingredient.objects.values_list('normalized_name', flat=True))
+    new_ingredients = [
+        Ingredient(name=name, normalized_name=normalize_ingredient(name))
+        for name in ingredient_names(ingredients, taken)
+    ]
+    Ingredient.objects.bulk_create(new_ingredients, batch_size=1000)
+    IngredientTrigram.objects.bulk_create(build_trigrams(new_ingredients), batch_size=1000)
+
+    # Recipes: 3-12 ingredients each, drawn with a long-tailed popularity
+    pool = new_ingredients or list(Ingredient.objects.order_by('id')[:max(ingredients, 50)])
+    pool_weights = list(accumulate(1 / (rank + 1) for rank in range(len(pool))))
+    recipe_rows = [
+        Receipe(
+            name=f'{rng.choice(VARIETIES)} {rng.choice(foods).lower()} {rng.choice(DISHES).lower()}'.capitalize(),
+            description="A generated recipe.",
+            steps=["Prepare the ingredients.", "Cook everything together.", "Season and serve."],
+            cook_time_minutes=rng.choice([10, 15, 20, 30, 45, 60, 90]),
+            difficulty=rng.choice(DIFFICULTIES),
+        )
+        for _ in range(recipes)
+    ] if pool else []
+    Receipe.objects.bulk_create(recipe_rows, batch_size=1000)
+
+    line_rows = []
+    for recipe in recipe_rows:
+        picked = set()
+        size = min(rng.randint(3, 12), len(pool))
+        while len(picked) < size:
+            picked.add(rng.choices(range(len(pool)), cum_weights=pool_weights)[0])
+        for index in sorted(picked):
+            line_rows.append(Receipe_Ingredients(
+                receipe=recipe,
+                ingredient=pool[index],
+                quantity=rng.choice([0.5, 1, 1, 2, 3, 100, 200]),
+                unit=rng.choice(['g', 'cup', 'pcs', 'tbsp', None]),
+            ))
+    Receipe_Ingredients.objects.bulk_create(line_rows, batch_size=1000)
+
+    # No signals fired, and new users have no cached expiry counts yet
+    if recipe_rows:
+        transaction.on_commit(all_recipes_changed)
+
+    return {
+        'users': created_users,
+        'groceries': len(grocery_rows),
+        'shopping': len(shopping_rows),
+        'ingredients': len(new_ingredients),
+        'recipes': len(recipe_rows),
+        'recipe_ingredients': len(line_rows),
+    }
@@ -0,0 +1,78 @@
+import functools
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cookable import recipes_changed
+from .db import configure_connection
+from .expiry import invalidate_expiry_counts
+from .ingredients import build_trigrams, normalize_ingredient
+from .models import Grocery, Ingredient, IngredientTrigram, Receipe, Receipe_Ingredients
+
+
+def _on_commit_per_origin(origin, key, value, callback, using=None):
+    """
+    Call callback(values) once the transaction commits. A queryset delete
+    sends post_delete for every row with the same origin; those signals
+    share one callback and its set of values instead of one each.
+    """
+    if origin is None:
+        transaction.on_commit(lambda: callback({value}), using=using)
+        return
+    values, flush = origin.__dict__.get(key, (None, None))
+    registered = transaction.get_connection(using).run_on_commit
+    # A callback that already ran or was rolled back cannot be joined
+    if flush is not None and any(func is flush for _, func, _ in registered):
+        values.add(value)
+        return
+    values = {value}
+    flush = functools.partial(callback, values)
+    origin.__dict__[key] = values, flush
+    transaction.on_commit(flush, using=using)
+
+
+def _invalidate_expiry_counts(user_ids):
+    for user_id in user_ids:
+        invalidate_expiry_counts(user_id)
+
+
+@receiver([post_save, post_delete], sender=Grocery)
+def grocery_changed(sender, instance, origin=None, using=None, **kwargs):
+    """Drop the cached banner counts whenever a grocery is saved or deleted"""
+    _on_commit_per_origin(origin, '_expiry_user_ids', instance.user_id, _invalidate_expiry_counts, using)
+
+
+@receiver(pre_save, sender=Ingredient)
+def normalize_ingredient_name(sender, instance, **kwargs):
+    instance.normalized_name = normalize_ingredient(instance.name)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, **kwargs):
+    """Rebuild the fuzzy-match trigrams of an ingredient saved one by one"""
+    IngredientTrigram.objects.filter(ingredient=instance).delete()
+    IngredientTrigram.objects.bulk_create(build_trigrams([instance]))
+
+
+def _recipes_changed(recipe_ids):
+    recipes_changed(*recipe_ids)
+
+
+@receiver([post_save, post_delete], sender=Receipe)
+def recipe_changed(sender, instance, origin=None, using=None, **kwargs):
+    """Have the cookable-now index re-read a saved or deleted recipe"""
+    _on_commit_per_origin(origin, '_changed_recipe_ids', instance.pk, _recipes_changed, using)
+
+
+@receiver([post_save, post_delete], sender=Receipe_Ingredients)
+def recipe_ingredient_changed(sender, instance, origin=None, using=None, **kwargs):
+    # Shares the recipe's callback when a recipe delete cascades here
+    _on_commit_per_origin(origin, '_changed_recipe_ids', instance.receipe_id, _recipes_changed, using)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    """WAL mode and the other SQLite pragmas from settings"""
+    configure_connection(connection)
@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+# ============================================
+# SINGLE-FLIGHT REQUEST COALESCING
+# ============================================
+#
+# Identical concurrent AI requests share one upstream call. Within a
+# process, followers wait on the leader's result. Across workers, the
+# leader holds a lock key in the shared cache and publishes its result
+# under a result key that the other workers poll for.
+
+COALESCED = 'ai_coalesced_requests'
+UPSTREAM_CALLS = 'ai_upstream_calls'
+
+LOCK_PREFIX = 'food:flight:lock:'
+RESULT_PREFIX = 'food:flight:result:'
+
+
+def make_key(*parts):
+    """Hash the normalized request parts into a flight key"""
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _should_share(result):
+    """Only share successful (value, error) results across workers"""
+    return not (isinstance(result, tuple) and len(result) == 2 and result[1])
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+def _acquire_lock(key):
+    token = uuid.uuid4().hex
+    if cache.add(LOCK_PREFIX + key, token, timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def _release_lock(key, token):
+    if cache.get(LOCK_PREFIX + key) == token:
+        cache.delete(LOCK_PREFIX + key)
+
+
+def _run_as_leader(key, token, fn):
+    try:
+        metrics.incr(UPSTREAM_CALLS)
+        result = fn()
+        if _should_share(result):
+            cache.set(RESULT_PREFIX + key, result, timeout=settings.SINGLE_FLIGHT_RESULT_TTL)
+        return result
+    finally:
+        _release_lock(key, token)
+
+
+def _call_across_workers(key, fn):
+    """Run fn under the shared cache lock, or wait for the worker holding it"""
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_LOCK_TIMEOUT
+    while True:
+        # Result first: the leader publishes it just before unlocking
+        shared = cache.get(RESULT_PREFIX + key)
+        if shared is not None:
+            metrics.incr(COALESCED)
+            return shared
+
+        token = _acquire_lock(key)
+        if token:
+            return _run_as_leader(key, token, fn)
+
+        if time.monotonic() >= deadline:
+            # The other worker is stuck: give up waiting and call upstream
+            metrics.incr(UPSTREAM_CALLS)
+            return fn()
+        time.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+
+
+def do(key, fn):
+    """
+    Call fn() once for all concurrent callers with the same key and
+    return its result to each of them
+    """
+    with _calls_lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+
+    if not leader:
+        metrics.incr(COALESCED)
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = _call_across_workers(key, fn)
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _calls_lock:
+            del _calls[key]
+        call.done.set()
+
+
+def lead_or_wait(key, ready):
+    """
+    Coalescing for streamed responses, which can't be handed to followers
+    while they arrive. The leader holds the flight lock for the whole
+    stream and stores its result where ready() finds it; everyone else
+    waits for the lock to go, then reads that.
+    Returns: (token, None) to call upstream and release(key, token) after,
+    or (None, ready()'s result) once another caller has produced it, or
+    (None, None) to call upstream unlocked when the leader seems stuck
+    """
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_LOCK_TIMEOUT
+    waited = False
+    while True:
+        result = ready()
+        if result is not None:
+            if waited:
+                metrics.incr(COALESCED)
+            return None, result
+
+        token = _acquire_lock(key)
+        if token:
+            metrics.incr(UPSTREAM_CALLS)
+            return token, None
+
+        if time.monotonic() >= deadline:
+            metrics.incr(UPSTREAM_CALLS)
+            return None, None
+        waited = True
+        time.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+
+
+def release(key, token):
+    """Give up the flight lock taken by lead_or_wait()"""
+    if token:
+        _release_lock(key, token)
+
+
+_async_calls = {}
+
+
+async def ado(key, coro_fn):
+    """Async version of do(): coro_fn() is awaited once per key and event loop"""
+    loop = asyncio.get_running_loop()
+    flight = (id(loop), key)
+
+    future = _async_calls.get(flight)
+    if future is not None:
+        await sync_to_async(metrics.incr)(COALESCED)
+        return await asyncio.shield(future)
+
+    future = _async_calls[flight] = loop.create_future()
+    try:
+        result = await _acall_across_workers(key, coro_fn)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        # Mark retrieved so an unawaited failure is not logged as lost
+        future.exception()
+        raise
+    finally:
+        if not future.done():
+            # The leader was cancelled: let the followers fail too
+            future.cancel()
+        del _async_calls[flight]
+
+
+async def _acall_across_workers(key, coro_fn):
+    # Cache backends may hit the database, so they run off the event loop
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_LOCK_TIMEOUT
+    while True:
+        shared = await sync_to_async(cache.get)(RESULT_PREFIX + key)
+        if shared is not None:
+            await sync_to_async(metrics.incr)(COALESCED)
+            return shared
+
+        token = await sync_to_async(_acquire_lock)(key)
+        if token:
+            try:
+                await sync_to_async(metrics.incr)(UPSTREAM_CALLS)
+                result = await coro_fn()
+                if _should_share(result):
+                    await sync_to_async(cache.set)(
+                        RESULT_PREFIX + key, result, settings.SINGLE_FLIGHT_RESULT_TTL
+                    )
+                return result
+            finally:
+                await sync_to_async(_release_lock)(key, token)
+
+        if time.monotonic() >= deadline:
+            await sync_to_async(metrics.incr)(UPSTREAM_CALLS)
+            return await coro_fn()
+        await asyncio.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
@@ -1,3 +1,1539 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+)
+from unittest import skipUnless
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import ai_cache, benchmark, cookable, gemini, jobs, metrics, ratelimit, search, singleflight, transfer, views
+from .expiry import get_expiry_counts
+from .fake_gemini import FakeGeminiServer
+from .ingredients import match_ingredients, normalize_ingredient
+from .models import (
+    Grocery, GroceryType, Ingredient, IngredientTrigram, Receipe, Receipe_Ingredients, RecipeJob,
+    RecipeSuggestionCache, ShoppingList
+)
+from .pagination import encode_cursor, seek_after
+from .jsonstream import JSONArrayStream
+from .recipes import clean_recipe, create_recipe, parse_recipes
+from .seed import seed_data
+from .urls import urlpatterns
+
+
+class FakeGeminiMixin:
+    """Run each test against a local stub of the Gemini API"""
+    gemini_text = json.dumps([{
+        "name": "Test Omelette",
+        "summary": "Eggs, milk and cheese.",
+        "ingredients": [{"name": "Eggs", "quantity": 3, "unit": "pcs"}, {"name": "Milk", "quantity": 0.5, "unit": "cup"}],
+        "steps": ["Whisk the eggs with the milk.", "Cook in a hot pan."],
+        "cook_time_minutes": 10,
+        "difficulty": "Easy"
+    }])
+
+    def setUp(self):
+        super().setUp()
+        self.gemini_server = FakeGeminiServer(text=self.gemini_text).start()
+        self.addCleanup(self.gemini_server.stop)
+
+        settings_override = override_settings(
+            GEMINI_API_BASE=self.gemini_server.base_url,
+            GEMINI_RETRY_BACKOFF=0,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        env = mock.patch.dict(os.environ, {'GEMINI_API_KEY': 'test-key'})
+        env.start()
+        self.addCleanup(env.stop)
+
+        gemini.reset_session()
+        self.addCleanup(gemini.reset_session)
+
+
+class GeminiClientTests(FakeGeminiMixin, TestCase):
+    def test_generate_content_returns_text(self):
+        text, error = gemini.generate_content("prompt", {"temperature": 0.5})
+        self.assertIsNone(error)
+        self.assertEqual(text, self.gemini_text)
+
+        request = self.gemini_server.requests[0]
+        self.assertEqual(request['path'], '/v1/models/gemini-2.5-flash:generateContent')
+        self.assertEqual(request['payload']['contents'][0]['parts'][0]['text'], "prompt")
+
+    def test_connections_are_reused(self):
+        for _ in range(3):
+            gemini.generate_content("prompt", {})
+        self.assertEqual(len(self.gemini_server.requests), 3)
+        self.assertEqual(self.gemini_server.connections, 1)
+
+    def test_retries_on_rate_limit(self):
+        self.gemini_server.httpd.statuses = [429, 503]
+        text, error = gemini.generate_content("prompt", {})
+        self.assertIsNone(error)
+        self.assertEqual(len(self.gemini_server.requests), 3)
+
+    def test_gives_up_after_max_retries(self):
+        self.gemini_server.httpd.statuses = [503, 503, 503, 503]
+        text, error = gemini.generate_content("prompt", {})
+        self.assertIsNone(text)
+        self.assertEqual(error, "API Error: Fake error 503")
+
+    def test_parse_response_max_tokens(self):
+        text, error = gemini.parse_response({
+            "candidates": [{"content": {"role": "model"}, "finishReason": "MAX_TOKENS"}]
+        })
+        self.assertIsNone(text)
+        self.assertIn("token limit", error)
+
+
+class RecipeCacheTests(TestCase):
+    def store(self, key, text='[]'):
+        ai_cache.store_response(key, 'test-model', text)
+
+    def age(self, key, **delta):
+        RecipeSuggestionCache.objects.filter(key=key).update(last_accessed=timezone.now() - timedelta(**delta))
+
+    def expire(self, key):
+        RecipeSuggestionCache.objects.filter(key=key).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    def keys(self):
+        return set(RecipeSuggestionCache.objects.values_list('key', flat=True))
+
+    def counters(self):
+        return metrics.get_counter(ai_cache.HITS), metrics.get_counter(ai_cache.MISSES)
+
+    def test_counts_hits_and_misses(self):
+        self.assertIsNone(ai_cache.get_cached_response('pantry'))
+        self.store('pantry', '["Omelette"]')
+        self.assertEqual(ai_cache.get_cached_response('pantry'), '["Omelette"]')
+        self.assertEqual(self.counters(), (1, 1))
+
+    def test_hits_update_hit_count_and_last_accessed(self):
+        self.store('pantry')
+        self.age('pantry', hours=1)
+        ai_cache.get_cached_response('pantry')
+        ai_cache.get_cached_response('pantry')
+        entry = RecipeSuggestionCache.objects.get()
+        self.assertEqual(entry.hit_count, 2)
+        self.assertGreater(entry.last_accessed, timezone.now() - timedelta(minutes=1))
+
+    @override_settings(RECIPE_CACHE_TTL=60)
+    def test_entries_expire_after_the_ttl(self):
+        self.store('pantry')
+        entry = RecipeSuggestionCache.objects.get()
+        self.assertAlmostEqual((entry.expires_at - entry.last_accessed).total_seconds(), 60, delta=1)
+
+        self.expire('pantry')
+        self.assertIsNone(ai_cache.get_cached_response('pantry'))
+        self.assertEqual(self.counters(), (0, 1))
+
+    @override_settings(RECIPE_CACHE_MAX_ENTRIES=2)
+    def test_store_trims_to_the_least_recently_used(self):
+        self.store('old')
+        self.store('newer')
+        self.age('old', hours=2)
+        self.age('newer', hours=1)
+        # A hit makes the oldest entry the most recently used
+        ai_cache.get_cached_response('old')
+        self.store('newest')
+        self.assertEqual(self.keys(), {'old', 'newest'})
+
+    def test_store_drops_expired_entries(self):
+        self.store('stale')
+        self.expire('stale')
+        self.store('fresh')
+        self.assertEqual(self.keys(), {'fresh'})
+
+    def test_purge_command(self):
+        self.store('stale')
+        self.store('fresh')
+        self.expire('stale')
+
+        out = StringIO()
+        call_command('purge_recipe_cache', expired_only=True, stdout=out)
+        self.assertIn('Removed 1 cached', out.getvalue())
+        self.assertEqual(self.keys(), {'fresh'})
+
+        ai_cache.get_cached_response('fresh')
+        ai_cache.get_cached_response('missing')
+        out = StringIO()
+        call_command('purge_recipe_cache', stats=True, stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'entries=1 hits=1 misses=1 coalesced=0 upstream_calls=0')
+        self.assertEqual(self.keys(), {'fresh'})
+
+        call_command('purge_recipe_cache', stdout=StringIO())
+        self.assertEqual(self.keys(), set())
+
+
+class StreamRecipesTests(FakeGeminiMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('cook', 'cook@example.com', 'password123')
+        dairy = GroceryType.objects.create(type_name='Dairy')
+        Grocery.objects.create(
+            grocery_name='Milk', ex_date=date.today() + timedelta(days=2),
+            grocerie_type=dairy, user=self.user
+        )
+        self.client.force_login(self.user)
+
+    def read_events(self):
+        response = self.client.get(reverse('stream_recipes'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join(response.streaming_content).decode()
+
+    def test_streams_recipes_then_done(self):
+        body = self.read_events()
+        self.assertEqual(body.count('event: recipe'), 1)
+        self.assertIn('Whisk the eggs with the milk.', body)
+        self.assertTrue(body.endswith('event: done\ndata: {}\n\n'))
+        self.assertIn(':streamGenerateContent', self.gemini_server.requests[0]['path'])
+
+    def test_second_request_is_served_from_cache(self):
+        self.read_events()
+        body = self.read_events()
+        self.assertIn('Test Omelette', body)
+        self.assertEqual(len(self.gemini_server.requests), 1)
+
+    def test_waits_for_the_stream_already_in_flight(self):
+        cache_key = ai_cache.make_cache_key(
+            ['Milk'], '', settings.GEMINI_MODEL, views.RECIPE_GENERATION_CONFIG
+        )
+        cache.add(singleflight.LOCK_PREFIX + cache_key, 'other-request')
+
+        polls = []
+
+        def leader_finishes_on_third_poll(seconds):
+            polls.append(seconds)
+            if len(polls) == 3:
+                ai_cache.store_response(cache_key, settings.GEMINI_MODEL, json.dumps([
+                    {'name': 'Shared Omelette', 'ingredients': ['Milk'], 'steps': ['Cook.']}
+                ]))
+                cache.delete(singleflight.LOCK_PREFIX + cache_key)
+
+        with mock.patch.object(singleflight.time, 'sleep', side_effect=leader_finishes_on_third_poll):
+            body = self.read_events()
+        self.assertIn('Shared Omelette', body)
+        self.assertEqual(self.gemini_server.requests, [])
+        self.assertEqual(metrics.get_counter(singleflight.COALESCED), 1)
+        # The polls while waiting are not cache lookups of their own
+        self.assertEqual((metrics.get_counter(ai_cache.HITS), metrics.get_counter(ai_cache.MISSES)), (1, 0))
+
+
+class AsyncViewsTests(FakeGeminiMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('cook', 'cook@example.com', 'password123')
+        dairy = GroceryType.objects.create(type_name='Dairy')
+        Grocery.objects.create(
+            grocery_name='Milk', ex_date=date.today() + timedelta(days=2),
+            grocerie_type=dairy, user=self.user
+        )
+        self.factory = AsyncRequestFactory()
+
+    def authenticate(self, request):
+        async def auser():
+            return self.user
+        request.auser = auser
+        return request
+
+    async def test_arefine_recipe(self):
+        request = self.authenticate(self.factory.post(
+            '/recipes/refine/',
+            data={'recipes': [{'name': 'Omelette'}], 'preferences': 'vegan'},
+            content_type='application/json'
+        ))
+        response = await views.arefine_recipe(request)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data['recipes'][0]['name'], 'Test Omelette')
+        self.assertIn('recipe-card', data['html'])
+
+    @override_settings(GEMINI_STREAM_SUGGESTIONS=False)
+    async def test_asuggest_recipes_renders_recipes(self):
+        request = self.authenticate(self.factory.get('/recipes/suggest/'))
+        response = await views.asuggest_recipes(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Test Omelette', response.content.decode())
+
+    async def test_anonymous_user_is_redirected(self):
+        request = self.factory.get('/recipes/suggest/')
+
+        async def auser():
+            return AnonymousUser()
+        request.auser = auser
+        response = await views.asuggest_recipes(request)
+        self.assertEqual(response.status_code, 302)
+
+
+class LoadTestCommandTests(TransactionTestCase):
+    def test_runs_both_modes_past_the_rate_limits(self):
+        out = StringIO()
+        # More calls than the per-user burst allows
+        call_command('loadtest_ai', levels='1,5', latency=0.01, workers=2, stdout=out)
+        rows = [line.split() for line in out.getvalue().splitlines()[2:]]
+        self.assertEqual([(mode, level) for mode, level, *_ in rows], [
+            ('WSGI', '1'), ('ASGI', '1'), ('WSGI', '5'), ('ASGI', '5'),
+        ])
+
+
+@override_settings(RECIPE_JOBS_ENABLED=True, RECIPE_JOB_RETRY_BACKOFF=0)
+class RecipeJobTests(FakeGeminiMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('cook', 'cook@example.com', 'password123')
+        dairy = GroceryType.objects.create(type_name='Dairy')
+        Grocery.objects.create(
+            grocery_name='Milk', ex_date=date.today() + timedelta(days=2),
+            grocerie_type=dairy, user=self.user
+        )
+        self.client.force_login(self.user)
+
+    def test_suggest_enqueues_without_calling_gemini(self):
+        response = self.client.get(reverse('suggest_recipes'))
+        job = RecipeJob.objects.get()
+        self.assertEqual(response.context['job_url'], reverse('recipe_job_status', args=[job.pk]))
+        self.assertEqual(job.payload, {'ingredients': ['Milk'], 'preferences': ''})
+        self.assertEqual(self.gemini_server.requests, [])
+
+        self.assertEqual(self.client.get(response.context['job_url']).json()['status'], 'pending')
+
+    def test_identical_requests_share_one_job(self):
+        first, created = jobs.enqueue(self.user, RecipeJob.SUGGEST, {'ingredients': ['Milk']})
+        second, created_again = jobs.enqueue(self.user, RecipeJob.SUGGEST, {'ingredients': ['Milk']})
+        self.assertEqual((first.pk, created, created_again), (second.pk, True, False))
+
+        # A finished job no longer absorbs new requests
+        RecipeJob.objects.update(status=RecipeJob.DONE)
+        third, created = jobs.enqueue(self.user, RecipeJob.SUGGEST, {'ingredients': ['Milk']})
+        self.assertTrue(created)
+
+    def test_claimed_job_stores_recipes_for_polling(self):
+        response = self.client.post(
+            reverse('refine_recipe'),
+            data={'recipes': [{'name': 'Omelette'}], 'preferences': 'vegan'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 202)
+
+        [job] = jobs.claim_jobs('test', 10)
+        self.assertEqual(jobs.claim_jobs('other', 10), [])
+        self.assertEqual(jobs.process_job(job), RecipeJob.DONE)
+
+        data = self.client.get(response.json()['poll_url']).json()
+        self.assertEqual(data['recipes'][0]['name'], 'Test Omelette')
+        self.assertIn('recipe-card', data['html'])
+
+    @override_settings(RECIPE_JOB_MAX_ATTEMPTS=2)
+    def test_errors_are_retried_then_fail(self):
+        job, _ = jobs.enqueue(self.user, RecipeJob.SUGGEST, {'ingredients': ['Milk']})
+        with mock.patch.object(views, 'get_ai_recipe_suggestion', return_value=(None, 'Upstream down')):
+            [claimed] = jobs.claim_jobs('test', 10)
+            self.assertEqual(jobs.process_job(claimed), RecipeJob.QUEUED)
+            [claimed] = jobs.claim_jobs('test', 10)
+            self.assertEqual(jobs.process_job(claimed), RecipeJob.FAILED)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), (RecipeJob.FAILED, 2, 'Upstream down'))
+
+    def test_stale_running_jobs_are_requeued(self):
+        job, _ = jobs.enqueue(self.user, RecipeJob.SUGGEST, {'ingredients': ['Milk']})
+        jobs.claim_jobs('crashed', 10)
+        RecipeJob.objects.update(locked_at=job.created_at - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale_jobs(), 1)
+        self.assertEqual(len(jobs.claim_jobs('test', 10)), 1)
+
+
+@override_settings(GEMINI_USER_RATE_LIMIT_PER_MINUTE=600, GEMINI_USER_RATE_LIMIT_BURST=10)
+class RecipeWorkerTests(FakeGeminiMixin, TransactionTestCase):
+    def test_worker_drains_the_queue_concurrently(self):
+        user = User.objects.create_user('cook', 'cook@example.com', 'password123')
+        for n in range(6):
+            jobs.enqueue(user, RecipeJob.SUGGEST, {'ingredients': ['Milk'], 'preferences': str(n)})
+
+        self.assertEqual(jobs.run_worker(concurrency=3, poll_interval=0.01, once=True), 6)
+        self.assertEqual(RecipeJob.objects.filter(status=RecipeJob.DONE).count(), 6)
+        self.assertEqual(len(self.gemini_server.requests), 6)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    SINGLE_FLIGHT_POLL_INTERVAL=0.01,
+)
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def slow_call(self):
+        self.calls += 1
+        time.sleep(0.2)
+        return ['recipe'], None
+
+    def test_concurrent_threads_share_one_call(self):
+        results = []
+
+        def request():
+            results.append(singleflight.do('pantry', self.slow_call))
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [(['recipe'], None)] * 5)
+        self.assertEqual(metrics.get_counter(singleflight.COALESCED), 4)
+
+    def test_waits_for_the_worker_holding_the_cache_lock(self):
+        cache.add(singleflight.LOCK_PREFIX + 'pantry', 'other-worker')
+
+        def other_worker_finishes():
+            time.sleep(0.1)
+            cache.set(singleflight.RESULT_PREFIX + 'pantry', (['shared'], None))
+            cache.delete(singleflight.LOCK_PREFIX + 'pantry')
+
+        threading.Thread(target=other_worker_finishes).start()
+        self.assertEqual(singleflight.do('pantry', self.slow_call), (['shared'], None))
+        self.assertEqual(self.calls, 0)
+
+    def test_errors_are_not_shared_across_workers(self):
+        singleflight.do('pantry', lambda: (None, 'Upstream down'))
+        self.assertEqual(singleflight.do('pantry', self.slow_call), (['recipe'], None))
+
+    def test_concurrent_coroutines_share_one_call(self):
+        async def slow_call():
+            self.calls += 1
+            await asyncio.sleep(0.1)
+            return ['recipe'], None
+
+        async def main():
+            return await asyncio.gather(*(singleflight.ado('pantry', slow_call) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), [(['recipe'], None)] * 5)
+        self.assertEqual(self.calls, 1)
+
+
+@override_settings(
+    GEMINI_RATE_LIMIT_PER_MINUTE=60, GEMINI_RATE_LIMIT_BURST=4,
+    GEMINI_USER_RATE_LIMIT_PER_MINUTE=30, GEMINI_USER_RATE_LIMIT_BURST=2,
+    GEMINI_RATE_LIMIT_MAX_WAIT=0,
+)
+class RateLimitTests(FakeGeminiMixin, TestCase):
+    def test_user_bucket_allows_burst_then_reports_wait(self):
+        now = 1000.0
+        self.assertEqual([ratelimit.acquire(1, now), ratelimit.acquire(1, now)], [0, 0])
+        self.assertAlmostEqual(ratelimit.acquire(1, now), 2.0)
+        # Tokens refill at 30 a minute
+        self.assertEqual(ratelimit.acquire(1, now + 2.0), 0)
+
+    def test_global_budget_is_shared_fairly(self):
+        now = 1000.0
+        ratelimit.acquire(1, now)
+        ratelimit.acquire(1, now)
+        ratelimit.acquire(1, now)  # rejected, must not spend a global token
+        self.assertEqual([ratelimit.acquire(2, now), ratelimit.acquire(2, now)], [0, 0])
+        self.assertAlmostEqual(ratelimit.acquire(3, now), 1.0)
+
+    def test_overrunning_holder_leaves_the_next_lock_alone(self):
+        get_many = cache.get_many
+
+        def lock_expires_meanwhile(*args, **kwargs):
+            # Another worker took the lock after ours timed out
+            cache.set(ratelimit.LOCK_KEY, 'other-worker')
+            return get_many(*args, **kwargs)
+
+        with mock.patch.object(ratelimit.cache, 'get_many', side_effect=lock_expires_meanwhile):
+            ratelimit.acquire(1)
+        self.assertEqual(cache.get(ratelimit.LOCK_KEY), 'other-worker')
+
+    def sign_in_with_expiring_milk(self):
+        user = User.objects.create_user('cook', 'cook@example.com', 'password123')
+        Grocery.objects.create(
+            grocery_name='Milk', ex_date=date.today() + timedelta(days=2),
+            grocerie_type=GroceryType.objects.create(type_name='Dairy'), user=user
+        )
+        self.client.force_login(user)
+        return user
+
+    def stream(self):
+        return b''.join(self.client.get(reverse('stream_recipes')).streaming_content).decode()
+
+    def test_refine_rejects_with_retry_after(self):
+        self.sign_in_with_expiring_milk()
+
+        def refine(preferences):
+            return self.client.post(
+                reverse('refine_recipe'),
+                data={'recipes': [{'name': 'Omelette'}], 'preferences': preferences},
+                content_type='application/json'
+            )
+
+        self.assertEqual([refine('vegan').status_code, refine('spicy').status_code], [200, 200])
+        upstream_calls = len(self.gemini_server.requests)
+        response = refine('quick')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertEqual(len(self.gemini_server.requests), upstream_calls)
+
+    def test_cached_answers_take_no_token(self):
+        self.sign_in_with_expiring_milk()
+        bodies = [self.stream() for _ in range(4)]
+        self.assertEqual(len(self.gemini_server.requests), 1)
+        self.assertTrue(all('Test Omelette' in body for body in bodies))
+
+    def test_stream_over_budget_sends_an_error_event(self):
+        user = self.sign_in_with_expiring_milk()
+        ratelimit.acquire(user.pk)
+        ratelimit.acquire(user.pk)
+        body = self.stream()
+        self.assertIn('event: error', body)
+        self.assertIn('Too many recipe requests', body)
+        self.assertEqual(self.gemini_server.requests, [])
+
+    def test_job_over_budget_is_requeued_without_an_attempt(self):
+        user = self.sign_in_with_expiring_milk()
+        job, _ = jobs.enqueue(user, RecipeJob.SUGGEST, {'ingredients': ['Milk']})
+        ratelimit.acquire(user.pk)
+        ratelimit.acquire(user.pk)
+        [claimed] = jobs.claim_jobs('test', 10)
+        self.assertEqual(jobs.process_job(claimed), RecipeJob.QUEUED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (RecipeJob.QUEUED, 0))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(self.gemini_server.requests, [])
+
+
+@override_settings(
+    GEMINI_MAX_RETRIES=0, GEMINI_CIRCUIT_FAILURE_THRESHOLD=2, GEMINI_CIRCUIT_RESET_TIMEOUT=30,
+    GEMINI_STREAM_SUGGESTIONS=False,
+)
+class CircuitBreakerTests(FakeGeminiMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('cook', 'cook@example.com', 'password123')
+        dairy = GroceryType.objects.create(type_name='Dairy')
+        for name in ('Milk', 'Eggs'):
+            Grocery.objects.create(
+                grocery_name=name, ex_date=date.today() + timedelta(days=2),
+                grocerie_type=dairy, user=self.user
+            )
+        self.client.force_login(self.user)
+
+    def trip(self):
+        self.gemini_server.httpd.statuses = [500, 500]
+        for _ in range(2):
+            gemini.generate_content("prompt", {})
+
+    def test_opens_after_threshold_and_fails_fast(self):
+        self.trip()
+        self.assertTrue(gemini.gemini_breaker.is_open())
+
+        text, error = gemini.generate_content("prompt", {})
+        self.assertIsNone(text)
+        self.assertEqual(error, gemini.CIRCUIT_OPEN_MESSAGE)
+        self.assertEqual(len(self.gemini_server.requests), 2)
+
+    def test_half_open_trial_closes_on_success(self):
+        self.trip()
+        later = time.time() + 31
+        with mock.patch('food.circuit.time.time', return_value=later):
+            self.assertFalse(gemini.gemini_breaker.is_open())
+            text, error = gemini.generate_content("prompt", {})
+        self.assertIsNone(error)
+        self.assertEqual(cache.get(gemini.gemini_breaker.opened_key), None)
+        self.assertEqual(cache.get(gemini.gemini_breaker.failures_key), None)
+
+    def test_suggest_falls_back_to_saved_recipes(self):
+        create_recipe(clean_recipe({'name': 'Custard', 'ingredients': ['Milk', 'Eggs', 'Sugar']}))
+        create_recipe(clean_recipe({'name': 'Latte', 'ingredients': ['Milk', 'Coffee']}))
+        create_recipe(clean_recipe({'name': 'Toast', 'ingredients': ['Bread']}))
+        self.trip()
+
+        response = self.client.get(reverse('suggest_recipes'))
+        self.assertEqual(response.status_code, 200)
+        names = [recipe['name'] for recipe in response.context['recipes']]
+        self.assertEqual(names, ['Custard', 'Latte'])
+        self.assertEqual(response.context['recipes'][0]['uses'], ['Egg', 'Milk'])
+        self.assertEqual(len(self.gemini_server.requests), 2)
+
+    def test_stream_sends_saved_recipes_with_notice(self):
+        create_recipe(clean_recipe({'name': 'Custard', 'ingredients': ['Milk', 'Eggs']}))
+        self.trip()
+
+        response = self.client.get(reverse('stream_recipes'))
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('event: notice', body)
+        self.assertEqual(body.count('event: recipe'), 1)
+        self.assertIn('View Recipe', body)
+        self.assertTrue(body.endswith('event: done\ndata: {}\n\n'))
+
+    def test_refine_returns_503_while_open(self):
+        self.trip()
+        response = self.client.post(
+            reverse('refine_recipe'),
+            data={'recipes': [{'name': 'Omelette'}], 'preferences': 'vegan'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+
+
+class ExpiryWarningsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('cook', 'cook@example.com', 'password123')
+        self.dairy = GroceryType.objects.create(type_name='Dairy')
+        for days in (-3, -1, 0, 5, 30):
+            Grocery.objects.create(
+                grocery_name=f'Item {days}', ex_date=date.today() + timedelta(days=days),
+                grocerie_type=self.dairy, user=self.user
+            )
+
+    def context_for_new_request(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        return views.add_expiry_warnings(request)['expiry_warnings']
+
+    def test_counts_use_one_query_then_cache(self):
+        def pantry_queries(captured):
+            # The database cache wraps its writes in a savepoint
+            return [query for query in captured if 'food_cache' not in query['sql'] and 'SAVEPOINT' not in query['sql']]
+
+        with CaptureQueriesContext(connection) as captured:
+            warnings = self.context_for_new_request()
+        self.assertEqual(len(pantry_queries(captured)), 1)
+        self.assertEqual(warnings['expired_count'], 2)
+        self.assertEqual(warnings['expiring_soon_count'], 2)
+
+        with CaptureQueriesContext(connection) as captured:
+            self.context_for_new_request()
+        self.assertEqual(pantry_queries(captured), [])
+        # Runs on the configured cache: on the database cache a hit is still a query
+        self.assertEqual(len(captured), 1 if settings.CACHE_BACKEND == 'db' else 0)
+
+    def test_saving_a_grocery_invalidates_counts(self):
+        self.context_for_new_request()
+        with self.captureOnCommitCallbacks(execute=True):
+            Grocery.objects.create(
+                grocery_name='Yogurt', ex_date=date.today() - timedelta(days=1),
+                grocerie_type=self.dairy, user=self.user
+            )
+        self.assertEqual(self.context_for_new_request()['expired_count'], 3)
+
+    def test_memoized_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        views.add_expiry_warnings(request)
+        with self.assertNumQueries(0):
+            views.add_expiry_warnings(request)
+
+
+class ExpiryStatusTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', 'cook@example.com', 'password123')
+        self.dairy = GroceryType.objects.create(type_name='Dairy')
+        self.today = date.today()
+        for name, days in [('Old Milk', -2), ('Yogurt', 0), ('Cheese', 3), ('Butter', 7), ('Ghee', 30)]:
+            Grocery.objects.create(
+                grocery_name=name, ex_date=self.today + timedelta(days=days),
+                grocerie_type=self.dairy, user=self.user
+            )
+
+    def test_status_and_days_are_computed_in_sql(self):
+        rows = Grocery.objects.with_expiry_status(self.today).order_by('ex_date')
+        self.assertEqual(
+            [(g.grocery_name, g.expiry_status, g.days_remaining) for g in rows],
+            [('Old Milk', 'expired', -2), ('Yogurt', 'soon', 0), ('Cheese', 'soon', 3),
+             ('Butter', 'soon', 7), ('Ghee', 'ok', 30)]
+        )
+
+    def test_properties_read_the_annotation(self):
+        grocery = Grocery.objects.with_expiry_status(self.today - timedelta(days=5)).get(grocery_name='Old Milk')
+        with mock.patch('food.models.date') as fake_date:
+            self.assertFalse(grocery.is_expired)
+            self.assertTrue(grocery.is_expiring_soon)
+        fake_date.today.assert_not_called()
+
+    def test_pantry_rows_show_status(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, '<span class="badge bg-danger">Expired</span>', html=True)
+        self.assertContains(response, '3 days left')
+        self.assertContains(response, '<span class="badge bg-warning text-dark">Today</span>', html=True)
+
+
+class SeedDataTests(TestCase):
+    def test_seeds_requested_counts(self):
+        counts = seed_data(users=3, groceries=40, shopping=5, recipes=30, ingredients=60, prefix='t')
+        self.assertEqual(len(counts['users']), 3)
+        self.assertEqual(Grocery.objects.filter(user__in=counts['users']).count(), 120)
+        self.assertEqual(ShoppingList.objects.filter(user__in=counts['users']).count(), 15)
+        self.assertEqual(counts['ingredients'], 60)
+        self.assertEqual(Receipe.objects.count(), 30)
+        # Bulk-created ingredients are normalized and fuzzy-matchable
+        ingredient = Ingredient.objects.get(name='Olive oil')
+        self.assertEqual(ingredient.normalized_name, 'olive oil')
+        self.assertTrue(IngredientTrigram.objects.filter(ingredient=ingredient).exists())
+
+    def test_pantries_mix_expired_soon_and_fresh(self):
+        counts = seed_data(users=1, groceries=200, shopping=0, recipes=0, ingredients=0, prefix='t')
+        statuses = set(
+            Grocery.objects.filter(user=counts['users'][0]).with_expiry_status().values_list('expiry_status', flat=True)
+        )
+        self.assertEqual(statuses, {'expired', 'soon', 'ok'})
+
+    def test_same_seed_same_data(self):
+        first = seed_data(users=1, groceries=20, shopping=0, recipes=0, ingredients=0, prefix='a', seed=7)
+        second = seed_data(users=1, groceries=20, shopping=0, recipes=0, ingredients=0, prefix='b', seed=7)
+
+        def pantry(user):
+            return list(Grocery.objects.filter(user=user).order_by('id').values_list('grocery_name', 'ex_date'))
+        self.assertEqual(pantry(first['users'][0]), pantry(second['users'][0]))
+
+
+class ViewBenchmarkTests(TestCase):
+    tiny = {'users': 2, 'groceries': 60, 'shopping': 5, 'recipes': 40, 'ingredients': 80}
+
+    def setUp(self):
+        cookable.recipe_index.reset()
+        self.addCleanup(cookable.recipe_index.reset)
+
+    def test_every_url_has_a_scenario(self):
+        user = User.objects.create_user('bench', 'bench@example.com', 'password123')
+        GroceryType.objects.create(type_name='Dairy')
+        covered = {name.split(':')[0] for name, _ in benchmark.ViewBenchmark(user).scenarios()}
+        self.assertEqual(covered, {pattern.name for pattern in urlpatterns})
+
+    def test_query_counts_do_not_grow_with_data(self):
+        bigger = {**self.tiny, 'groceries': 240, 'recipes': 160}
+        results = benchmark.run_benchmarks({'tiny': self.tiny, 'bigger': bigger}, repeat=1)
+
+        self.assertEqual(benchmark.regressions(results, {}, check_time=False), [])
+        self.assertEqual(
+            {name: result['queries'] for name, result in results['tiny'].items()},
+            {name: result['queries'] for name, result in results['bigger'].items()}
+        )
+        # Nothing seeded by the benchmark is left behind
+        self.assertFalse(User.objects.filter(username__startswith='benchmark').exists())
+
+    def test_query_counts_within_stored_baseline(self):
+        results = benchmark.run_benchmarks({'small': self.tiny}, repeat=1)
+        baseline = benchmark.load_baseline()
+        self.assertEqual(set(results['small']), set(baseline['small']))
+        self.assertEqual(benchmark.regressions(results, baseline, check_time=False), [])
+
+    def test_regressions_flag_queries_time_and_errors(self):
+        baseline = {'small': {'index': {'queries': 5, 'ms': 10}, 'shopping': {'queries': 4, 'ms': 10}}}
+        results = {'small': {
+            'index': {'queries': 6, 'ms': 10},
+            'shopping': {'queries': 4, 'ms': 100},
+            'add': {'error': 'OperationalError: boom'},
+        }}
+        self.assertEqual(len(benchmark.regressions(results, baseline)), 3)
+        self.assertEqual(len(benchmark.regressions(results, baseline, check_time=False)), 2)
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN output is SQLite specific")
+class QueryPlanTests(TestCase):
+    """The hot pantry queries must be index searches, not table scans"""
+    ROWS = 1_000_000
+    USERS = 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create(
+            User(username=f'user{i}', email=f'user{i}@example.com') for i in range(cls.USERS)
+        )
+        cls.users = list(User.objects.order_by('id')[:2])
+        dairy = GroceryType.objects.create(type_name='Dairy')
+        with connection.cursor() as cursor:
+            # Search indexing is not under test here; the class transaction
+            # rolls the trigger drop back afterwards
+            cursor.execute("DROP TRIGGER food_groceries_fts_insert")
+            # ROWS / USERS groceries per user, inserted in user order
+            cursor.execute(
+                """
+                WITH RECURSIVE seq(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM seq WHERE n < %s - 1)
+                INSERT INTO food_groceries (grocery_name, ex_date, quantity, grocerie_type_id, user_id)
+                SELECT 'item ' || (n %% 1000), date('now', '+' || (n %% 60) || ' days'), 1, %s,
+                       %s + n / %s
+                FROM seq
+                """,
+                [cls.ROWS, dairy.id, cls.users[0].id, cls.ROWS // cls.USERS]
+            )
+            cursor.execute("ANALYZE")
+
+    def assert_uses_index(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotRegex(plan, r'SCAN food_groceries\b')
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_pantry_ordered_by_expiry(self):
+        groceries = Grocery.objects.filter(user=self.users[0]).select_related('grocerie_type').order_by('ex_date')
+        self.assert_uses_index(groceries, 'food_groc_user_exdate_idx')
+
+    def test_expiring_soon_range(self):
+        today = date.today()
+        groceries = Grocery.objects.filter(
+            user=self.users[0],
+            ex_date__gte=today,
+            ex_date__lte=today + timedelta(days=7)
+        ).order_by('ex_date')
+        self.assert_uses_index(groceries, 'food_groc_user_exdate_idx')
+
+    def test_shopping_picker_ordered_by_name(self):
+        groceries = Grocery.objects.filter(user=self.users[0]).order_by('grocery_name')
+        self.assert_uses_index(groceries, 'food_groc_user_name_idx')
+
+    def test_keyset_next_page_seeks_in_the_index(self):
+        cursor = encode_cursor([date.today() + timedelta(days=30), 10**9])
+        groceries = Grocery.objects.filter(user=self.users[0])
+        plan = seek_after(groceries, ('ex_date', 'id'), cursor).explain()
+        self.assertIn('food_groc_user_exdate_idx (user_id=? AND ex_date>?)', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_shopping_list_lookup_uses_unique_constraint(self):
+        # SQLite backs the unique constraint with an automatic index
+        plan = ShoppingList.objects.filter(user=self.users[0], grocery_id=1).explain()
+        self.assertIn('SEARCH food_shop_list USING INDEX', plan)
+        self.assertIn('(user_id=? AND grocery_id=?)', plan)
+
+    def test_email_backend_lookup(self):
+        plan = User.objects.filter(email='user1@example.com').explain()
+        self.assertIn('food_auth_user_email_idx', plan)
+
+
+class MetricsTests(FakeGeminiMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Drop what earlier tests left buffered in this process
+        metrics.flush()
+        cache.clear()
+
+    def scrape(self, **headers):
+        response = self.client.get(reverse('metrics'), **headers)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_requests_are_timed_per_url_name(self):
+        user = User.objects.create_user('cook', 'cook@example.com', 'password123')
+        self.client.force_login(user)
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        self.client.get('/no-such-page/')
+
+        text = self.scrape()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertIn('http_request_duration_seconds_count{view="index"} 2', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="index",le="+Inf"} 2', text)
+        self.assertIn('http_responses_total{method="GET",status="200",view="index"} 2', text)
+        self.assertIn('http_responses_total{method="GET",status="404",view="unmatched"} 1', text)
+        self.assertIn('http_db_queries_count{view="index"} 2', text)
+        self.assertRegex(text, r'http_db_queries_sum\{view="index"\} [1-9]')
+
+    def test_gemini_latency_finish_reason_and_tokens(self):
+        gemini.generate_content("prompt", {})
+        self.gemini_server.httpd.finish_reason = 'MAX_TOKENS'
+        list(gemini.stream_generate_content("prompt", {}))
+
+        text = self.scrape()
+        self.assertIn('gemini_request_duration_seconds_count{method="generateContent",status="200"} 1', text)
+        self.assertIn('gemini_request_duration_seconds_count{method="streamGenerateContent",status="200"} 1', text)
+        self.assertIn('gemini_finish_reasons_total{reason="STOP"} 1', text)
+        self.assertIn('gemini_finish_reasons_total{reason="MAX_TOKENS"} 1', text)
+        # The fake reports 12 prompt tokens per call, counted once per stream
+        self.assertIn('gemini_tokens_total{kind="prompt"} 24', text)
+
+    def test_failed_gemini_calls_are_labelled(self):
+        self.gemini_server.httpd.statuses = [503, 503, 503]
+        gemini.generate_content("prompt", {})
+        self.assertIn('gemini_request_duration_seconds_count{method="generateContent",status="503"} 3', self.scrape())
+
+    def test_existing_counters_are_exported(self):
+        metrics.incr('ai_cache_hits', 3)
+        self.assertIn('ai_cache_hits 3', self.scrape())
+
+    def test_no_flush_inside_a_transaction(self):
+        metrics.observe('http_request_duration_seconds', 0.2, view='index')
+        with override_settings(METRICS_FLUSH_INTERVAL=0):
+            metrics.maybe_flush()
+        self.assertIsNone(cache.get(metrics.KEY_PREFIX + 'http_request_duration_seconds_count{view="index"}'))
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token_required_when_configured(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        self.scrape(HTTP_AUTHORIZATION='Bearer s3cret')
+
+
+@skipUnless(connection.vendor == 'sqlite', "SQLite pragmas")
+class SQLiteTuningTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connections_use_wal_and_configured_pragmas(self):
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('busy_timeout'), 20000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+        self.assertEqual(self.pragma('temp_store'), 2)  # MEMORY
+
+    def test_benchmark_command_compares_both_configurations(self):
+        out = StringIO()
+        call_command('benchmark_sqlite', duration=0.2, rows=200, readers=2, writers=2, stdout=out)
+        self.assertIn('stock', out.getvalue())
+        self.assertIn('tuned', out.getvalue())
+
+
+@override_settings(DATABASE_READ_REPLICA='replica')
+class ReadReplicaTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        # The test replica is a separate database, so each grocery shows
+        # which side a page read from
+        self.user = User.objects.create_user('cook', 'cook@example.com', 'password123')
+        User.objects.using('replica').create(id=self.user.id, username='cook', password=self.user.password)
+        for alias, side in (('default', 'Primary'), ('replica', 'Replica')):
+            fridge = GroceryType.objects.using(alias).create(type_name=f'{side} fridge')
+            Grocery.objects.using(alias).create(
+                grocery_name=f'{side} milk', ex_date=date.today() + timedelta(days=30),
+                grocerie_type=fridge, user_id=self.user.id
+            )
+        self.client.force_login(self.user)
+
+    def test_read_only_views_read_the_replica(self):
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Replica milk')
+        self.assertNotContains(response, 'Primary milk')
+
+    def test_other_views_read_the_primary(self):
+        response = self.client.get(reverse('add'))
+        self.assertContains(response, 'Primary fridge')
+        self.assertNotContains(response, 'Replica fridge')
+
+    def test_writer_sticks_to_the_primary(self):
+        response = self.client.post(reverse('add'), {
+            'grocery_name': 'Eggs', 'ex_date': (date.today() + timedelta(days=7)).isoformat(),
+            'grocerie_type': GroceryType.objects.get().id, 'quantity': 1,
+        })
+        self.assertIn('db_primary', response.cookies)
+        self.assertFalse(Grocery.objects.using('replica').filter(grocery_name='Eggs').exists())
+
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Primary milk')
+        self.assertContains(response, 'Eggs')
+
+    def test_get_that_writes_sticks_to_the_primary(self):
+        milk = Grocery.objects.get(grocery_name='Primary milk')
+        response = self.client.get(reverse('delete', args=[milk.pk]))
+        self.assertIn('db_primary', response.cookies)
+
+        # Replica lag would still show the deleted row, so index reads the primary
+        response = self.client.get(reverse('index'))
+        self.assertNotContains(response, 'Replica milk')
+        self.assertNotContains(response, 'Primary milk')
+
+    def test_reads_leave_the_replica_in_use(self):
+        self.assertNotIn('db_primary', self.client.get(reverse('add')).cookies)
+        self.assertNotIn('db_primary', self.client.post(reverse('add'), {}).cookies)
+
+    @override_settings(DATABASE_READ_REPLICA=None)
+    def test_disabled_reads_the_primary(self):
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Primary milk')
+        self.assertNotIn('db_primary', self.client.post(reverse('add'), {}).cookies)
+
+
+class SharedCacheTests(TestCase):
+    def test_session_survives_losing_the_cache(self):
+        user = User.objects.create_user('cook', 'cook@example.com', 'password123')
+        self.client.force_login(user)
+        cache.clear()
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+
+
+class GrocerySearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='cook', email='cook@example.com')
+        self.other = User.objects.create(username='other', email='other@example.com')
+        self.dairy = GroceryType.objects.create(type_name='Dairy')
+        self.veg = GroceryType.objects.create(type_name='Vegetables')
+        soon = date.today() + timedelta(days=3)
+        self.milk = Grocery.objects.create(grocery_name='Whole Milk', ex_date=soon, grocerie_type=self.dairy, user=self.user)
+        self.tomato = Grocery.objects.create(grocery_name='Cherry Tomatoes', ex_date=soon, grocerie_type=self.veg, user=self.user)
+        Grocery.objects.create(grocery_name='Milk', ex_date=soon, grocerie_type=self.dairy, user=self.other)
+
+    def search(self, query):
+        groceries = Grocery.objects.filter(user=self.user)
+        return set(search.search_groceries(groceries, self.user, query).values_list('grocery_name', flat=True))
+
+    def test_prefix_and_category_match(self):
+        self.assertEqual(self.search('mil'), {'Whole Milk'})
+        self.assertEqual(self.search('dairy'), {'Whole Milk'})
+        self.assertEqual(self.search('cherry tom'), {'Cherry Tomatoes'})
+        self.assertEqual(self.search('!!'), set())
+
+    def test_index_follows_updates_and_deletes(self):
+        self.milk.grocery_name = 'Oat Drink'
+        self.milk.save()
+        self.assertEqual(self.search('milk'), set())
+        self.assertEqual(self.search('oat'), {'Oat Drink'})
+
+        self.dairy.type_name = 'Fridge'
+        self.dairy.save()
+        self.assertEqual(self.search('fridge'), {'Oat Drink'})
+
+        self.tomato.delete()
+        self.assertEqual(self.search('tomato'), set())
+
+    def test_ranked_search_puts_name_matches_first(self):
+        Grocery.objects.create(
+            grocery_name='Butter', ex_date=date.today(),
+            grocerie_type=GroceryType.objects.create(type_name='Tomato sauces'), user=self.user
+        )
+        names = [g.grocery_name for g in search.ranked_search(self.user, 'tomato')]
+        self.assertEqual(names, ['Cherry Tomatoes', 'Butter'])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='cook', email='cook@example.com')
+        dairy = GroceryType.objects.create(type_name='Dairy')
+        # Repeated expiry dates so the id tie-breaker matters
+        for i in range(7):
+            Grocery.objects.create(
+                grocery_name=f'Item {i}', ex_date=date.today() + timedelta(days=i // 3),
+                grocerie_type=dairy, user=self.user
+            )
+        self.client.force_login(self.user)
+
+    def test_fragment_endpoint_walks_every_row_once(self):
+        expected = list(Grocery.objects.order_by('ex_date', 'id').values_list('grocery_name', flat=True))
+        seen, cursor = [], None
+        while True:
+            params = {'page_size': 3}
+            if cursor:
+                params['after'] = cursor
+            data = self.client.get(reverse('grocery_page'), params).json()
+            seen += [name for name in expected if f'<td>{name}</td>' in data['html']]
+            cursor = data['next']
+            if not cursor:
+                break
+        self.assertEqual(seen, expected)
+
+    def test_index_renders_first_page_with_cursor(self):
+        response = self.client.get(reverse('index'), {'page_size': 5})
+        self.assertEqual(len(response.context['groceries']), 5)
+        self.assertEqual(response.context['total_count'], 7)
+        self.assertIsNotNone(response.context['next_cursor'])
+
+    def test_invalid_cursor_starts_from_the_beginning(self):
+        response = self.client.get(reverse('shopping'), {'after': 'not-a-cursor', 'page_size': 2})
+        names = [g.grocery_name for g in response.context['groceries']]
+        self.assertEqual(names, ['Item 0', 'Item 1'])
+
+        # Well-formed cursors with values of the wrong type
+        for values in (['garbage', 1], ['2026-01-01', 'x'], ['2026-01-01', True], [None, 1], [[], {}]):
+            cursor = encode_cursor(values)
+            response = self.client.get(reverse('index'), {'after': cursor, 'page_size': 2})
+            self.assertEqual([g.grocery_name for g in response.context['groceries']], ['Item 0', 'Item 1'])
+            response = self.client.get(reverse('grocery_page'), {'after': cursor, 'page_size': 2})
+            self.assertEqual(response.status_code, 200, values)
+        response = self.client.get(reverse('shopping'), {'after': encode_cursor([5, 1]), 'page_size': 2})
+        self.assertEqual([g.grocery_name for g in response.context['groceries']], ['Item 0', 'Item 1'])
+
+
+class ShoppingListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='cook', email='cook@example.com')
+        self.other = User.objects.create(username='other', email='other@example.com')
+        self.dairy = GroceryType.objects.create(type_name='Dairy')
+        self.groceries = [
+            Grocery.objects.create(
+                grocery_name=f'Item {days}', ex_date=date.today() + timedelta(days=days),
+                grocerie_type=self.dairy, user=self.user
+            )
+            for days in (-2, 3, 30)
+        ]
+        self.client.force_login(self.user)
+
+    def quantities(self):
+        return dict(ShoppingList.objects.values_list('grocery__grocery_name', 'quantity'))
+
+    def test_repeated_adds_increment_one_row(self):
+        grocery = self.groceries[0]
+        for _ in range(3):
+            self.client.post(reverse('add_to_shopping_list', args=[grocery.pk]))
+        self.assertEqual(self.quantities(), {'Item -2': 3})
+
+    def test_increment_is_done_by_the_database(self):
+        grocery = self.groceries[0]
+        self.assertEqual(views.add_groceries_to_shopping_list(self.user, [grocery.pk]), 1)
+        # A stale instance saved elsewhere must not be the base of the next add
+        item = ShoppingList.objects.get()
+        views.add_groceries_to_shopping_list(self.user, [grocery.pk])
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 2)
+
+    def test_bulk_add_expiring(self):
+        views.add_groceries_to_shopping_list(self.user, [self.groceries[0].pk])
+        self.client.post(reverse('bulk_add_to_shopping_list'), {'expiring': '1'})
+        self.assertEqual(self.quantities(), {'Item -2': 2, 'Item 3': 1})
+
+    def test_bulk_add_ignores_other_users_groceries(self):
+        theirs = Grocery.objects.create(
+            grocery_name='Theirs', ex_date=date.today(), grocerie_type=self.dairy, user=self.other
+        )
+        self.client.post(reverse('bulk_add_to_shopping_list'), {
+            'grocery_ids': [self.groceries[2].pk, theirs.pk, 'junk']
+        })
+        self.assertEqual(self.quantities(), {'Item 30': 1})
+
+    def test_bulk_add_query_count_is_constant(self):
+        def queries_for(groceries):
+            ShoppingList.objects.all().delete()
+            with CaptureQueriesContext(connection) as captured:
+                self.client.post(reverse('bulk_add_to_shopping_list'), {
+                    'grocery_ids': [grocery.pk for grocery in groceries]
+                })
+            return len(captured)
+
+        more = self.groceries + [
+            Grocery.objects.create(
+                grocery_name=f'Extra {i}', ex_date=date.today(), grocerie_type=self.dairy, user=self.user
+            )
+            for i in range(20)
+        ]
+        self.assertEqual(queries_for(self.groceries[:1]), queries_for(more))
+        self.assertEqual(ShoppingList.objects.count(), 23)
+
+
+class GroceryTransferTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='cook', email='cook@example.com')
+        self.dairy = GroceryType.objects.create(type_name='Dairy')
+        self.client.force_login(self.user)
+
+    def upload(self, name, content, **data):
+        return self.client.post(reverse('import_groceries'), {
+            'file': SimpleUploadedFile(name, content.encode()), **data
+        }, follow=True)
+
+    def test_csv_import_skips_and_reports_bad_rows(self):
+        response = self.upload('pantry.csv', (
+            'grocery_name,ex_date,quantity,category\n'
+            'Milk,2030-01-02,2,dairy\n'
+            ',2030-01-02,1,Dairy\n'
+            'Cheese,next week,1,Dairy\n'
+            f'Yoghurt,2030-01-03,,{self.dairy.pk}\n'
+            'Bread,2030-01-03,1,Bakery\n'
+        ))
+        self.assertEqual(
+            list(Grocery.objects.order_by('id').values_list('grocery_name', 'quantity', 'grocerie_type')),
+            [('Milk', 2, self.dairy.pk), ('Yoghurt', 1, self.dairy.pk)]
+        )
+        text = ' '.join(str(message) for message in response.context['messages'])
+        self.assertIn('Imported 2 groceries', text)
+        self.assertIn('Row 2: Missing grocery_name', text)
+        self.assertIn('Row 3: ex_date', text)
+        self.assertIn('Row 5: Unknown category "Bakery"', text)
+
+    def test_json_import_in_batches(self):
+        rows = [
+            {'grocery_name': f'Item {i}', 'ex_date': '2030-01-01', 'category': 'Dairy'} for i in range(25)
+        ]
+        result = transfer.import_groceries(
+            self.user, transfer.read_rows(iter([json.dumps(rows)[:40], json.dumps(rows)[40:]]), 'json'),
+            batch_size=10
+        )
+        self.assertEqual(result, {'imported': 25, 'error_count': 0, 'errors': []})
+        self.assertEqual(Grocery.objects.filter(user=self.user).count(), 25)
+
+    def test_import_drops_cached_expiry_counts(self):
+        self.assertEqual(get_expiry_counts(self.user)['expired_count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            transfer.import_groceries(self.user, [
+                {'grocery_name': 'Old milk', 'ex_date': '2000-01-01', 'category': 'Dairy'}
+            ])
+        self.assertEqual(get_expiry_counts(self.user)['expired_count'], 1)
+
+    def test_export_round_trips(self):
+        Grocery.objects.create(
+            grocery_name='Milk, whole', ex_date=date(2030, 1, 2), quantity=3, grocerie_type=self.dairy, user=self.user
+        )
+        for export_format in transfer.FORMATS:
+            response = self.client.get(reverse('export_groceries'), {'format': export_format})
+            self.assertTrue(response.streaming)
+            content = b''.join(response.streaming_content).decode()
+
+            Grocery.objects.all().delete()
+            self.upload(f'export.{export_format}', content)
+            self.assertEqual(
+                list(Grocery.objects.values_list('grocery_name', 'ex_date', 'quantity')),
+                [('Milk, whole', date(2030, 1, 2), 3)]
+            )
+
+    def test_export_rejects_unknown_format(self):
+        self.assertEqual(self.client.get(reverse('export_groceries'), {'format': 'xml'}).status_code, 400)
+
+    def test_import_command(self):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'pantry.csv')
+        with open(path, 'w') as file:
+            file.write('grocery_name,ex_date,quantity,category\nMilk,2030-01-02,1,Dairy\nBad,,1,Dairy\n')
+        out, err = StringIO(), StringIO()
+        call_command('import_groceries', path, user='cook@example.com', stdout=out, stderr=err)
+        self.assertIn('Imported 1 groceries', out.getvalue())
+        self.assertIn('Row 2', err.getvalue())
+
+
+class BulkGroceryEditTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='cook', email='cook@example.com')
+        self.other = User.objects.create(username='other', email='other@example.com')
+        self.dairy = GroceryType.objects.create(type_name='Dairy')
+        self.veg = GroceryType.objects.create(type_name='Vegetables')
+        self.today = date.today()
+        self.groceries = [
+            Grocery.objects.create(
+                grocery_name=f'Item {days}', ex_date=self.today + timedelta(days=days),
+                grocerie_type=self.dairy, user=self.user
+            )
+            for days in (-3, -1, 2, 10)
+        ]
+        self.theirs = Grocery.objects.create(
+            grocery_name='Theirs', ex_date=self.today - timedelta(days=5), grocerie_type=self.dairy, user=self.other
+        )
+        self.client.force_login(self.user)
+
+    def post(self, **data):
+        return self.client.post(reverse('bulk_edit_groceries'), data, content_type='application/json')
+
+    def names(self):
+        return set(Grocery.objects.filter(user=self.user).values_list('grocery_name', flat=True))
+
+    def test_delete_selected_takes_shopping_entries_along(self):
+        ShoppingList.objects.create(user=self.user, grocery=self.groceries[0])
+        response = self.post(action='delete', ids=[self.groceries[0].pk, self.groceries[2].pk, self.theirs.pk])
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(self.names(), {'Item -1', 'Item 10'})
+        self.assertFalse(ShoppingList.objects.exists())
+        self.assertTrue(Grocery.objects.filter(pk=self.theirs.pk).exists())
+
+    def test_delete_expired_refreshes_banner_counts(self):
+        self.assertEqual(get_expiry_counts(self.user)['expired_count'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.post(action='delete_expired').json()['count'], 2)
+        self.assertEqual(self.names(), {'Item 2', 'Item 10'})
+        self.assertEqual(get_expiry_counts(self.user)['expired_count'], 0)
+        self.assertTrue(Grocery.objects.filter(pk=self.theirs.pk).exists())
+
+    def test_delete_query_count_does_not_grow_with_rows(self):
+        def delete_expired(count):
+            Grocery.objects.bulk_create(
+                Grocery(grocery_name=f'Old {i}', ex_date=self.today - timedelta(days=1),
+                        grocerie_type=self.dairy, user=self.user)
+                for i in range(count)
+            )
+            with CaptureQueriesContext(connection) as captured:
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.post(action='delete_expired')
+            return [query['sql'] for query in captured]
+
+        # The first call also takes the two expired groceries from setUp
+        few, many = delete_expired(2), delete_expired(50)
+        self.assertFalse(Grocery.objects.filter(user=self.user, ex_date__lt=self.today).exists())
+        self.assertEqual(len(few), len(many))
+        # The expiry counts are dropped once for the whole delete
+        self.assertEqual(sum('food_cache' in sql and sql.startswith('DELETE') for sql in many), 1)
+
+    def test_shift_expiry(self):
+        self.post(action='shift_expiry', ids=[g.pk for g in self.groceries[:2]], days=7)
+        self.assertEqual(
+            dict(Grocery.objects.filter(user=self.user).values_list('grocery_name', 'ex_date')),
+            {
+                'Item -3': self.today + timedelta(days=4), 'Item -1': self.today + timedelta(days=6),
+                'Item 2': self.today + timedelta(days=2), 'Item 10': self.today + timedelta(days=10),
+            }
+        )
+
+    def test_set_category_is_one_update(self):
+        ids = [g.pk for g in self.groceries] + [self.theirs.pk]
+        with CaptureQueriesContext(connection) as captured:
+            self.post(action='set_category', ids=ids, category=self.veg.pk)
+        self.assertEqual(sum(query['sql'].startswith('UPDATE "food_groceries"') for query in captured), 1)
+        self.assertEqual(Grocery.objects.filter(grocerie_type=self.veg).count(), 4)
+        self.assertEqual(Grocery.objects.get(pk=self.theirs.pk).grocerie_type, self.dairy)
+
+    def test_bad_requests(self):
+        for data in (
+            {'action': 'explode', 'ids': [1]},
+            {'action': 'delete', 'ids': []},
+            {'action': 'delete', 'ids': ['x']},
+            {'action': 'shift_expiry', 'ids': [self.groceries[0].pk], 'days': 'soon'},
+            {'action': 'set_category', 'ids': [self.groceries[0].pk], 'category': 999},
+        ):
+            response = self.post(**data)
+            self.assertEqual(response.status_code, 400, data)
+            self.assertEqual(response.json()['status'], 'error')
+        self.assertEqual(len(self.names()), 4)
+
+    def test_pantry_rows_have_checkboxes(self):
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, f'class="form-check-input grocery-select" value="{self.groceries[0].pk}"')
+        self.assertContains(response, 'Delete all 2 expired')
+
+
+class SaveRecipeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='cook', email='cook@example.com')
+        self.client.force_login(self.user)
+
+    def save(self, ingredient_names):
+        return self.client.post(
+            reverse('save_recipe'),
+            data={
+                'recipe_name': 'Stew',
+                'instructions': 'Simmer everything.',
+                'ingredients': {name: '' for name in ingredient_names}
+            },
+            content_type='application/json'
+        )
+
+    def test_query_count_does_not_grow_with_known_ingredients(self):
+        spices = ['Cumin', 'Paprika', 'Nutmeg', 'Oregano', 'Basil', 'Thyme', 'Sage', 'Dill', 'Fennel', 'Saffron']
+        create_recipe(clean_recipe({'name': 'Rub', 'ingredients': spices}))
+        # savepoint, recipe insert, normalized IN lookup, join insert, release
+        for count in (2, 10):
+            with self.assertNumQueries(5):
+                recipe = create_recipe(clean_recipe({'name': 'Stew', 'ingredients': spices[:count]}))
+            self.assertEqual(recipe.receipe_ingredients_set.count(), count)
+
+    def test_query_count_does_not_grow_with_new_ingredients(self):
+        Ingredient.objects.create(name='Salt')
+        # savepoint, recipe insert, normalized IN lookup, one trigram lookup for
+        # all new names, ingredient insert, re-read, trigram insert, join insert, release
+        spices = ['Cumin', 'Paprika', 'Nutmeg', 'Oregano', 'Basil', 'Thyme', 'Sage', 'Dill', 'Fennel', 'Saffron']
+        for names in (['Salt'] + spices[:2], ['Salt'] + spices[2:]):
+            with self.assertNumQueries(9):
+                create_recipe(clean_recipe({'name': 'Stew', 'ingredients': names}))
+
+    def test_spellings_of_one_ingredient_share_a_row(self):
+        self.save(['Tomato', '2 tomatoes, diced', 'Cheddar cheese'])
+        self.save(['tomatoes', 'Chedar Cheese (grated)'])
+        self.assertEqual(
+            sorted(Ingredient.objects.values_list('name', 'normalized_name')),
+            [('Cheddar cheese', 'cheddar cheese'), ('Tomato', 'tomato')]
+        )
+        self.assertEqual(Receipe_Ingredients.objects.count(), 4)
+        self.assertEqual(IngredientTrigram.objects.filter(ingredient__name='Tomato').count(), 7)
+
+    def test_existing_ingredients_are_reused(self):
+        self.save(['Salt', 'Onion', 'Salt'])
+        self.save(['Onion', 'Carrot'])
+        self.assertEqual(Ingredient.objects.count(), 3)
+        self.assertEqual(Receipe_Ingredients.objects.count(), 4)
+
+    def test_failure_leaves_no_partial_recipe(self):
+        with mock.patch.object(Receipe_Ingredients.objects, 'bulk_create', side_effect=RuntimeError("boom")):
+            response = self.save(['Salt', 'Onion'])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Receipe.objects.exists())
+        self.assertFalse(Ingredient.objects.exists())
+
+    def test_structured_recipe_keeps_quantities_and_steps(self):
+        response = self.client.post(
+            reverse('save_recipe'),
+            data={'recipe': {
+                'name': 'Pancakes',
+                'ingredients': [{'name': 'Flour', 'quantity': 200, 'unit': 'g'}, {'name': 'Salt'}],
+                'steps': ['Mix.', 'Fry.'],
+                'cook_time_minutes': 15,
+                'difficulty': 'easy'
+            }},
+            content_type='application/json'
+        )
+        recipe = Receipe.objects.get(pk=response.json()['recipe_id'])
+        self.assertEqual(recipe.steps, ['Mix.', 'Fry.'])
+        self.assertEqual((recipe.cook_time_minutes, recipe.difficulty), (15, 'Easy'))
+        lines = {i.ingredient.name: (i.quantity, i.unit) for i in recipe.receipe_ingredients_set.all()}
+        self.assertEqual(lines, {'Flour': (200, 'g'), 'Salt': (1, 'as needed')})
+
+        response = self.client.get(reverse('recipe_detail', args=[recipe.pk]))
+        self.assertContains(response, '<li>Fry.</li>', html=True)
+
+
+class CookableNowTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', 'cook@example.com', 'password123')
+        self.client.force_login(self.user)
+        self.dairy = GroceryType.objects.create(type_name='Dairy')
+        self.today = date.today()
+        cookable.recipe_index.reset()
+        self.addCleanup(cookable.recipe_index.reset)
+
+    def stock(self, name, days):
+        Grocery.objects.create(
+            grocery_name=name, ex_date=self.today + timedelta(days=days),
+            grocerie_type=self.dairy, user=self.user
+        )
+
+    def recipe(self, name, ingredients):
+        return create_recipe(clean_recipe({'name': name, 'ingredients': ingredients}))
+
+    def test_ranks_by_weighted_coverage(self):
+        self.stock('milk', 1)
+        self.stock('Eggs', 30)
+        self.stock('Butter', -1)  # expired, must not count
+        full = self.recipe('Scramble', ['Eggs', 'Milk'])
+        expiring = self.recipe('Latte', ['Milk', 'Coffee'])
+        fresh = self.recipe('Boiled Eggs', ['Eggs', 'Salt'])
+        self.recipe('Toast', ['Bread', 'Butter'])
+
+        response = self.client.get(reverse('cookable_now'))
+        recipes = response.json()['recipes']
+        self.assertEqual([r['id'] for r in recipes], [full.pk, expiring.pk, fresh.pk])
+        self.assertEqual((recipes[0]['coverage'], recipes[0]['missing']), (1.0, 0))
+        self.assertEqual(recipes[1]['uses'], ['Milk'])
+        self.assertEqual(recipes[0]['url'], reverse('recipe_detail', args=[full.pk]))
+
+    def test_index_picks_up_saved_and_deleted_recipes(self):
+        self.stock('Milk', 3)
+        self.recipe('Latte', ['Milk', 'Coffee'])
+        self.assertEqual([r['name'] for r in cookable.cookable_recipes(self.user)], ['Latte'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            shake = self.recipe('Milkshake', ['Milk'])
+        self.assertEqual([r['name'] for r in cookable.cookable_recipes(self.user)], ['Milkshake', 'Latte'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            shake.receipe_ingredients_set.create(ingredient=Ingredient.objects.create(name='Ice Cream'), quantity=1)
+            Receipe.objects.get(name='Latte').delete()
+        recipes = cookable.cookable_recipes(self.user)
+        self.assertEqual([(r['name'], r['missing']) for r in recipes], [('Milkshake', 1)])
+
+    def test_deleting_recipes_announces_them_once(self):
+        ids = {self.recipe(f'Soup {i}', ['Water', 'Salt', 'Leek', 'Potato']).pk for i in range(3)}
+        with mock.patch('food.signals.recipes_changed') as changed:
+            with self.captureOnCommitCallbacks(execute=True):
+                Receipe.objects.filter(pk__in=ids).delete()
+        changed.assert_called_once()
+        self.assertEqual(set(changed.call_args.args), ids)
+
+    def test_bit_sliced_ranking_matches_brute_force(self):
+        index = cookable.RecipeIndex()
+        recipes = {1: (10, 11), 2: (10,), 3: (11, 12, 13), 4: (12, 13), 5: (14,)}
+        for recipe_id, ingredient_ids in recipes.items():
+            index.by_size[len(ingredient_ids)] |= 1 << index._add(recipe_id, ingredient_ids)
+        weights = {10: 7, 11: 14, 12: 9, 13: 7}
+
+        expected = sorted(
+            (-sum(weights.get(i, 0) for i in ids) / len(ids), recipe_id)
+            for recipe_id, ids in recipes.items() if set(ids) & set(weights)
+        )
+        ranked = index.rank(weights, limit=10)
+        self.assertEqual([recipe_id for recipe_id, _, _ in ranked], [recipe_id for _, recipe_id in expected])
+        self.assertEqual(ranked[0], (1, 21, 2))
+
+    def test_empty_pantry_skips_the_recipe_query(self):
+        self.recipe('Scramble', ['Eggs'])
+        with self.assertNumQueries(1):
+            self.assertEqual(cookable.cookable_recipes(self.user), [])
+
+
+class IngredientNormalizationTests(TestCase):
+    def test_normalize_strips_quantities_units_and_plurals(self):
+        cases = {
+            '2 Tomatoes, diced': 'tomato',
+            'Tomato (ripe)': 'tomato',
+            '½ tsp salt': 'salt',
+            '3 cloves garlic, minced': 'garlic',
+            '200g Cheddar Cheese': 'cheddar cheese',
+            'Bay Leaves': 'bay leaf',
+            'Berries': 'berry',
+            'Asparagus': 'asparagus',
+        }
+        self.assertEqual({name: normalize_ingredient(name) for name in cases}, cases)
+
+    def test_pantry_names_match_fuzzily(self):
+        tomato = Ingredient.objects.create(name='Tomatoes')
+        cheddar = Ingredient.objects.create(name='Cheddar Cheese')
+        Ingredient.objects.create(name='Cream')
+        # Exact lookup, one trigram query for all unmatched names, in_bulk
+        with self.assertNumQueries(3):
+            matches = match_ingredients(['tomato', 'Chedar cheese', 'Cherry Tomatoes', 'Ice cream'])
+        self.assertEqual(matches, {'tomato': tomato, 'Chedar cheese': cheddar})
+
+    def test_command_merges_existing_duplicates(self):
+        # Rows saved before normalization existed, bypassing the signals
+        Ingredient.objects.bulk_create([Ingredient(name=name) for name in ('Tomato', 'tomatoes', '2 Tomatoes', 'Basil')])
+        tomato, tomatoes, two_tomatoes, basil = Ingredient.objects.order_by('id')
+        recipe = Receipe.objects.create(name='Salad')
+        other = Receipe.objects.create(name='Sauce')
+        Receipe_Ingredients.objects.bulk_create([
+            Receipe_Ingredients(receipe=recipe, ingredient=tomato, quantity=1),
+            Receipe_Ingredients(receipe=recipe, ingredient=tomatoes, quantity=2),
+            Receipe_Ingredients(receipe=other, ingredient=tomatoes, quantity=3),
+            Receipe_Ingredients(receipe=other, ingredient=two_tomatoes, quantity=4),
+            Receipe_Ingredients(receipe=other, ingredient=basil, quantity=1),
+        ])
+
+        out = StringIO()
+        call_command('normalize_ingredients', stdout=out)
+        self.assertIn("Updated 4 normalized name(s), merged 2 duplicate ingredient(s)", out.getvalue())
+        self.assertEqual(list(Ingredient.objects.order_by('id').values_list('name', flat=True)), ['Tomato', 'Basil'])
+        self.assertEqual(
+            sorted(Receipe_Ingredients.objects.values_list('receipe__name', 'ingredient__name', 'quantity')),
+            [('Salad', 'Tomato', 1.0), ('Sauce', 'Basil', 1.0), ('Sauce', 'Tomato', 3.0)]
+        )
+        self.assertTrue(IngredientTrigram.objects.filter(ingredient=basil).exists())
+
+
+class StructuredRecipeTests(SimpleTestCase):
+    def test_parse_recipes_cleans_items(self):
+        recipes, error = parse_recipes(json.dumps([
+            {'name': ' Soup ', 'steps': ['Boil.', ''], 'difficulty': 'Impossible', 'cook_time_minutes': -5},
+            'not a recipe'
+        ]))
+        self.assertIsNone(error)
+        self.assertEqual(recipes, [{
+            'name': 'Soup', 'summary': '', 'ingredients': [], 'steps': ['Boil.'],
+            'cook_time_minutes': None, 'difficulty': ''
+        }])
+
+    def test_parse_recipes_rejects_free_text(self):
+        recipes, error = parse_recipes("## 1. Soup")
+        self.assertIsNone(recipes)
+        self.assertTrue(error)
+
+    def test_array_stream_yields_items_across_any_split(self):
+        items = [{'name': 'A "quoted" {brace}', 'steps': ['x]', 'y']}, {'name': 'B\\'}]
+        text = json.dumps(items)
+        for size in (1, 3, 7, len(text)):
+            stream = JSONArrayStream()
+            seen = []
+            for start in range(0, len(text), size):
+                seen.extend(stream.feed(text[start:start + size]))
+            self.assertEqual(seen, items)
@@ -0,0 +1,186 @@
+import codecs
+import csv
+import json
+from datetime import date
+
+from django.db import transaction
+
+from .expiry import invalidate_expiry_counts
+from .jsonstream import iter_array_items
+from .models import Grocery, GroceryType
+
+# ============================================
+# PANTRY IMPORT / EXPORT
+# ============================================
+#
+# Both directions stream: an import reads the upload line by line (CSV)
+# or piece by piece (JSON) and inserts every IMPORT_BATCH_SIZE valid
+# rows, and an export walks the pantry with .iterator(). Memory stays
+# flat however large the pantry is.
+
+FORMATS = ('csv', 'json')
+
+CONTENT_TYPES = {'csv': 'text/csv', 'json': 'application/json'}
+
+# Column order of exports, and the fields an import reads
+FIELDS = ('grocery_name', 'ex_date', 'quantity', 'category')
+
+IMPORT_BATCH_SIZE = 2000
+EXPORT_CHUNK_SIZE = 2000
+
+# Row errors reported back; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+MAX_NAME_LENGTH = Grocery._meta.get_field('grocery_name').max_length
+
+
+def guess_format(filename, default='csv'):
+    extension = str(filename).rsplit('.', 1)[-1].lower()
+    return extension if extension in FORMATS else default
+
+
+def grocery_type_map():
+    """Every grocery type by lower-cased name and by id, in one query"""
+    types = {}
+    for grocery_type in GroceryType.objects.all():
+        types[grocery_type.type_name.strip().lower()] = grocery_type.pk
+        types[str(grocery_type.pk)] = grocery_type.pk
+    return types
+
+
+def clean_grocery_row(row, types):
+    """
+    Validate one imported row into Grocery field values. Raises
+    ValueError with a message for the user if the row is unusable.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("Row must be an object")
+
+    name = str(row.get('grocery_name') or row.get('name') or '').strip()
+    if not name:
+        raise ValueError("Missing grocery_name")
+    if len(name) > MAX_NAME_LENGTH:
+        raise ValueError(f"grocery_name is longer than {MAX_NAME_LENGTH} characters")
+
+    try:
+        ex_date = date.fromisoformat(str(row.get('ex_date') or '').strip())
+    except ValueError:
+        raise ValueError("ex_date must be a YYYY-MM-DD date")
+
+    quantity = row.get('quantity')
+    try:
+        quantity = int(quantity) if str(quantity or '').strip() else 1
+    except (TypeError, ValueError):
+        raise ValueError("quantity must be a whole number")
+    if quantity < 1:
+        raise ValueError("quantity must be at least 1")
+
+    category = str(row.get('category') or row.get('grocerie_type') or '').strip()
+    type_id = types.get(category.lower())
+    if type_id is None:
+        raise ValueError(f'Unknown category "{category}"')
+
+    return {'grocery_name': name, 'ex_date': ex_date, 'quantity': quantity, 'grocerie_type_id': type_id}
+
+
+def read_rows(lines, import_format):
+    """
+    Rows of an upload as dicts, from an iterable of text lines (CSV) or
+    arbitrary text chunks (JSON array of objects)
+    """
+    if import_format == 'json':
+        return iter_array_items(lines)
+    return csv.DictReader(lines)
+
+
+def decode(chunks, encoding='utf-8-sig'):
+    """Text from byte chunks, keeping characters split across chunks whole"""
+    return codecs.iterdecode(chunks, encoding)
+
+
+def import_groceries(user, rows, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Validate and insert rows for user, batch_size at a time. Invalid rows
+    are skipped and reported; the valid ones are saved together or not
+    at all. Returns {'imported', 'error_count', 'errors'}.
+    """
+    types = grocery_type_map()
+    result = {'imported': 0, 'error_count': 0, 'errors': []}
+    batch = []
+
+    def insert():
+        Grocery.objects.bulk_create(batch)
+        result['imported'] += len(batch)
+        batch.clear()
+
+    with transaction.atomic():
+        for number, row in enumerate(rows, start=1):
+            try:
+                batch.append(Grocery(user_id=user.pk, **clean_grocery_row(row, types)))
+            except ValueError as e:
+                result['error_count'] += 1
+                if len(result['errors']) < MAX_REPORTED_ERRORS:
+                    result['errors'].append(f"Row {number}: {e}")
+                continue
+            if len(batch) >= batch_size:
+                insert()
+        if batch:
+            insert()
+        # bulk_create sends no post_save, so the banner counts are dropped here
+        transaction.on_commit(lambda: invalidate_expiry_counts(user.pk))
+
+    return result
+
+
+def export_rows(user, chunk_size=EXPORT_CHUNK_SIZE):
+    """(name, expiry, quantity, category) tuples of a pantry, fetched chunk_size at a time"""
+    return (
+        Grocery.objects.filter(user=user)
+        .order_by('ex_date', 'id')
+        .values_list('grocery_name', 'ex_date', 'quantity', 'grocerie_type__type_name')
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+class _Echo:
+    """File-like object for csv.writer that hands each line back"""
+
+    def write(self, value):
+        return value
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def export_csv(rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """CSV text in pieces of chunk_size rows"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS)
+    for batch in _batched(rows, chunk_size):
+        yield ''.join(writer.writerow(row) for row in batch)
+
+
+def export_json(rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """A JSON array of grocery objects, in pieces of chunk_size rows"""
+    yield '['
+    separator = '\n'
+    for batch in _batched(rows, chunk_size):
+        yield separator + ',\n'.join(
+            json.dumps({
+                'grocery_name': name, 'ex_date': ex_date.isoformat(), 'quantity': quantity, 'category': category,
+            })
+            for name, ex_date, quantity, category in batch
+        )
+        separator = ',\n'
+    yield '\n]\n'
+
+
+EXPORTERS = {'csv': export_csv, 'json': export_json}
@@ -1,23 +1,44 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under ASGI the AI views run as coroutines so Gemini waits don't pin workers
+if settings.ASYNC_AI_VIEWS:
+    suggest_recipes_view = views.asuggest_recipes
+    refine_recipe_view = views.arefine_recipe
+else:
+    suggest_recipes_view = views.suggest_recipes
+    refine_recipe_view = views.refine_recipe
+
 urlpatterns = [
     path('', views.index, name='index'),
     path('add/', views.add_grocery, name='add'),
     path('edit/<int:pk>/', views.edit_grocery, name='edit'),
     path('delete/<int:pk>/', views.delete_grocery, name='delete'),
+    path('groceries/search/', views.grocery_search, name='grocery_search'),
+    path('groceries/page/', views.grocery_page, name='grocery_page'),
+    path('groceries/import/', views.import_groceries, name='import_groceries'),
+    path('groceries/export/', views.export_groceries, name='export_groceries'),
+    path('groceries/bulk/', views.bulk_edit_groceries, name='bulk_edit_groceries'),
     path('shopping/', views.shopping_list, name='shopping'),
+    path('shopping/groceries/page/', views.shopping_grocery_page, name='shopping_grocery_page'),
+    path('shopping/add/', views.bulk_add_to_shopping_list, name='bulk_add_to_shopping_list'),
     path('shopping/add/<int:pk>/', views.add_to_shopping_list, name='add_to_shopping_list'),
     path('shopping/remove/<int:pk>/', views.remove_from_shopping_list, name='remove_from_shopping_list'),
     path('signin/', views.signin_view, name='signin'),
     path('signup/', views.signup_view, name='signup'),
     path('signout/', views.signout_view, name='signout'),
     # New recipe AI routes
-    path('recipes/suggest/', views.suggest_recipes, name='suggest_recipes'),
+    path('recipes/suggest/', suggest_recipes_view, name='suggest_recipes'),
+    path('recipes/suggest/stream/', views.stream_recipes, name='stream_recipes'),
     path('recipes/save/', views.save_recipe, name='save_recipe'),
-    path('recipes/refine/', views.refine_recipe, name='refine_recipe'),
+    path('recipes/refine/', refine_recipe_view, name='refine_recipe'),
+    path('recipes/jobs/<int:pk>/', views.recipe_job_status, name='recipe_job_status'),
     # View saved recipes
     path('recipes/', views.view_saved_recipes, name='view_saved_recipes'),
+    path('recipes/cookable/', views.cookable_now, name='cookable_now'),
     path('recipes/<int:pk>/', views.view_recipe_detail, name='recipe_detail'),
     path('recipes/<int:pk>/delete/', views.delete_recipe_view, name='delete_recipe'),
+    # Prometheus scrapes /metrics without a trailing slash
+    path('metrics', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
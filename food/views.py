@@ -1,16 +1,34 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
-from .models import Grocery, GroceryType, ShoppingList, Receipe, Receipe_Ingredients, Ingredient
-from .forms import GroceryForm, ShoppingListForm
+from django.contrib.auth.views import redirect_to_login
+from django.db import transaction
+from django.db.models import F, Prefetch
+from .models import Grocery, GroceryType, ShoppingList, Receipe, Receipe_Ingredients, RecipeJob
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from datetime import date, timedelta
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.urls import reverse
+from urllib.parse import urlencode
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from . import ai_cache, bulk, gemini, jobs, metrics, singleflight, transfer
+from .circuit import gemini_breaker
+from .cookable import cookable_recipes
+from .fallback import saved_recipe_matches
+from .ratelimit import RateLimited, atake_token, rate_limited, take_token
+from .replica import reading_from_replica
+from .expiry import EXPIRING_SOON_DAYS, get_expiry_counts
+from .search import ranked_search, search_groceries
+from .pagination import keyset_page
+from .jsonstream import JSONArrayStream
+from .recipes import RECIPE_SCHEMA, clean_recipe, create_recipe, parse_recipes
+import csv
 import json
-import requests
-import os
 
 # ============================================
 # EXPIRY WARNING SYSTEM
@@ -20,32 +38,38 @@ def get_expiry_warnings(user):
     """
     Get expiry status for all user groceries
     Returns: dict with expired and expiring_soon items
+    The counts come from one cached aggregate query; the item querysets
+    stay lazy so pages that only show counts never fetch rows.
     """
     today = date.today()
+    groceries = Grocery.objects.filter(user=user).with_expiry_status(today).select_related('grocerie_type')
     
-    expired = Grocery.objects.filter(
-        user=user,
-        ex_date__lt=today
-    ).select_related('grocerie_type')
-    
-    expiring_soon = Grocery.objects.filter(
-        user=user,
+    # Range filters rather than expiry_status so the (user, ex_date) index serves them
+    expired = groceries.filter(ex_date__lt=today)
+    expiring_soon = groceries.filter(
         ex_date__gte=today,
-        ex_date__lte=today + timedelta(days=7)
-    ).select_related('grocerie_type')
+        ex_date__lte=today + timedelta(days=EXPIRING_SOON_DAYS)
+    )
     
     return {
         'expired': expired,
         'expiring_soon': expiring_soon,
-        'expired_count': expired.count(),
-        'expiring_soon_count': expiring_soon.count()
+        **get_expiry_counts(user, today)
     }
 
+def get_request_expiry_warnings(request):
+    """get_expiry_warnings memoized on the request"""
+    if not hasattr(request, '_expiry_warnings'):
+        request._expiry_warnings = get_expiry_warnings(request.user)
+    return request._expiry_warnings
+
 # Context processor to add warnings to every page
 def add_expiry_warnings(request):
     """Add to context_processors in settings.py"""
     if request.user.is_authenticated:
-        warnings = get_expiry_warnings(request.user)
+        # Banner counts may lag a moment behind, so they can come from the replica
+        with reading_from_replica(request):
+            warnings = get_request_expiry_warnings(request)
         return {'expiry_warnings': warnings}
     return {}
 
@@ -53,21 +77,35 @@ def add_expiry_warnings(request):
 # HOME / INDEX - WITH EXPIRY WARNINGS
 # ============================================
 
-@login_required
-def index(request):
-    search_query = request.GET.get('search', '').strip()
-    groceries = Grocery.objects.filter(user=request.user).select_related('grocerie_type')
+PANTRY_ORDERING = ('ex_date', 'id')
+PICKER_ORDERING = ('grocery_name', 'id')
+
+def get_page_size(request):
+    """Page size from ?page_size=, clamped to GROCERY_PAGE_SIZE_MAX"""
+    try:
+        page_size = int(request.GET.get('page_size', settings.GROCERY_PAGE_SIZE))
+    except ValueError:
+        page_size = settings.GROCERY_PAGE_SIZE
+    return max(1, min(page_size, settings.GROCERY_PAGE_SIZE_MAX))
+
+def get_user_groceries(request, search_query):
+    groceries = Grocery.objects.filter(user=request.user).with_expiry_status().select_related('grocerie_type')
     
     if search_query:
-        groceries = groceries.filter(
-            Q(grocery_name__icontains=search_query) |   
-            Q(grocerie_type__type_name__icontains=search_query)
-        )
+        groceries = search_groceries(groceries, request.user, search_query)
     
-    groceries = groceries.order_by('ex_date')
+    return groceries
+
+@login_required
+def index(request):
+    search_query = request.GET.get('search', '').strip()
+    groceries = get_user_groceries(request, search_query)
+    page, next_cursor = keyset_page(
+        groceries, PANTRY_ORDERING, request.GET.get('after'), get_page_size(request)
+    )
     
     # Get expiry warnings
-    warnings = get_expiry_warnings(request.user)
+    warnings = get_request_expiry_warnings(request)
     
     # Add warning messages
     if warnings['expired_count'] > 0:
@@ -77,18 +115,91 @@ def index(request):
         messages.warning(request, f"⏰ {warnings['expiring_soon_count']} item(s) expiring within 7 days!")
     
     return render(request, 'food/index.html', {
-        'groceries': groceries,
+        'groceries': page,
+        'total_count': groceries.count(),
+        'next_cursor': next_cursor,
         'search_query': search_query,
-        'warnings': warnings
+        'warnings': warnings,
+        'grocery_types': GroceryType.objects.all()
+    })
+
+@login_required
+def grocery_page(request):
+    """Infinite scroll: the next page of pantry rows as an HTML fragment"""
+    search_query = request.GET.get('search', '').strip()
+    page, next_cursor = keyset_page(
+        get_user_groceries(request, search_query),
+        PANTRY_ORDERING, request.GET.get('after'), get_page_size(request)
+    )
+    
+    return JsonResponse({
+        'html': render_to_string('food/grocery_rows.html', {'groceries': page}),
+        'next': next_cursor
+    })
+
+@login_required
+def grocery_search(request):
+    """Search-as-you-type: best matching groceries, most relevant first"""
+    query = request.GET.get('q', '').strip()
+    results = ranked_search(request.user, query) if query else []
+    
+    return JsonResponse({
+        'results': [
+            {
+                'id': g.id,
+                'name': g.grocery_name,
+                'category': g.grocerie_type.type_name,
+                'ex_date': g.ex_date.isoformat(),
+                'quantity': g.quantity
+            }
+            for g in results
+        ]
     })
 
 # ============================================
 # GOOGLE GEMINI API RECIPE GENERATION
 # ============================================
 
-def get_ai_recipe_suggestion(ingredients_list, preferences=""):
+RECIPE_GENERATION_CONFIG = {
+    "temperature": 0.5,
+    "maxOutputTokens": 4096,
+    "topP": 0.9,
+    # Structured output: the reply is a JSON array matching RECIPE_SCHEMA
+    "responseMimeType": "application/json",
+    "responseSchema": RECIPE_SCHEMA,
+}
+
+def build_recipe_prompt(ingredients_list, preferences=""):
+    ingredients_str = ', '.join(ingredients_list)
+    
+    return f"""Generate 3 creative, easy-to-make recipes that use as many of these ingredients as possible:
+
+Ingredients: {ingredients_str}
+{f'Preferences: {preferences}' if preferences else ''}
+
+Return a JSON array of recipes. For each recipe, provide:
+1. name and a one-sentence summary
+2. ingredients, each with a numeric quantity and a unit (e.g. "g", "cup", "pcs")
+3. steps: step-by-step instructions (5-8 steps)
+4. cook_time_minutes
+5. difficulty (Easy/Medium/Hard)
+
+Keep recipes practical and suitable for home cooking."""
+
+def build_refine_prompt(current_recipes, preferences):
+    if not isinstance(current_recipes, str):
+        current_recipes = json.dumps(current_recipes)
+    return f"""Modify these recipes based on the following preferences: {preferences}
+
+Current Recipes:
+{current_recipes}
+
+Return the modified recipes as a JSON array in the same format."""
+
+def get_ai_recipe_suggestion(ingredients_list, preferences="", user_id=None):
     """
-    Free AI recipe generation using Google Gemini API
+    Free AI recipe generation using Google Gemini API.
+    user_id pays for the call in the rate limiter, cache hits are free.
     
     Get free API key at: https://ai.google.dev/
     
@@ -100,126 +211,93 @@ def get_ai_recipe_suggestion(ingredients_list, preferences=""):
     """
     
     try:
-        # Get API key from environment variable
-        api_key = os.environ.get('GEMINI_API_KEY')
-        if not api_key:
-            return None, "Gemini API key not configured. Please set GEMINI_API_KEY environment variable."
-        
-        # Gemini API endpoint - use latest model
-        # Using gemini-2.5-flash (fastest, free tier)
-        url = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash:generateContent?key={api_key}"
-        
-        ingredients_str = ', '.join(ingredients_list)
+        model = settings.GEMINI_MODEL
+        generation_config = RECIPE_GENERATION_CONFIG
         
-        prompt = f"""Generate 3 creative, easy-to-make recipes that use as many of these ingredients as possible:
-
-Ingredients: {ingredients_str}
-{f'Preferences: {preferences}' if preferences else ''}
-
-For each recipe, provide:
-1. Recipe name
-2. Ingredients (with quantities from available items)
-3. Step-by-step instructions (5-8 steps)
-4. Cooking time
-5. Difficulty level (Easy/Medium/Hard)
-
-Keep recipes practical and suitable for home cooking."""
-
-        payload = {
-            "contents": [
-                {
-                    "parts": [
-                        {
-                            "text": prompt
-                        }
-                    ]
-                }
-            ],
-            "generationConfig": {
-                "temperature": 0.5,
-                "maxOutputTokens": 4096,
-                "topP": 0.9,
-            }
-        }
+        # Serve repeat requests for the same pantry from the cache
+        cache_key = ai_cache.make_cache_key(ingredients_list, preferences, model, generation_config)
+        cached_text = ai_cache.get_cached_response(cache_key)
+        if cached_text:
+            return parse_recipes(cached_text)
         
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Debug: Print response structure
-            print(f"API Response: {data}")
-            
-            # Extract text from Gemini response - with better error handling
-            if 'candidates' in data and len(data['candidates']) > 0:
-                candidate = data['candidates'][0]
-                
-                # Check if content exists and has parts
-                if 'content' in candidate and 'parts' in candidate['content']:
-                    content = candidate['content']
-                    if len(content['parts']) > 0:
-                        recipe_text = content['parts'][0].get('text', '')
-                        
-                        if recipe_text:
-                            return recipe_text, None
-                        else:
-                            # Check if API hit token limit
-                            finish_reason = candidate.get('finishReason', '')
-                            if finish_reason == 'MAX_TOKENS':
-                                return None, "API response was cut off. Increase token limit or simplify request."
-                            return None, "API returned empty text"
-                    else:
-                        return None, "No parts in content"
-                else:
-                    # Handle case where content exists but has no parts (MAX_TOKENS hit)
-                    finish_reason = candidate.get('finishReason', '')
-                    if finish_reason == 'MAX_TOKENS':
-                        return None, "Response cut off (token limit reached). Please try again."
-                    return None, "Invalid response structure: no content field"
-            else:
-                return None, "No candidates in response"
-        else:
-            # Handle error responses
-            try:
-                error_data = response.json()
-                error_msg = error_data.get('error', {}).get('message', f'HTTP {response.status_code}')
-                print(f"API Error Response: {error_data}")
-            except:
-                error_msg = f'HTTP {response.status_code}: {response.text}'
+        def generate():
+            if user_id is not None:
+                take_token(user_id)
+            prompt = build_recipe_prompt(ingredients_list, preferences)
+            recipe_text, error = gemini.generate_content(prompt, generation_config, model)
+            if error:
+                return None, error
             
-            return None, f"API Error: {error_msg}"
+            recipes, error = parse_recipes(recipe_text)
+            if recipes:
+                ai_cache.store_response(cache_key, model, recipe_text)
+            return recipes, error
+        
+        # Identical requests already in flight wait for that call instead
+        return singleflight.do(cache_key, generate)
             
-    except requests.Timeout:
-        return None, "Request timeout. The API took too long to respond. Please try again."
-    except requests.ConnectionError:
-        return None, "Connection error. Please check your internet connection."
-    except json.JSONDecodeError:
-        return None, "Invalid API response format."
+    except RateLimited:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         return None, f"Error generating recipes: {str(e)}"
 
+def refine_recipes(current_recipes, preferences, user_id=None):
+    """
+    Ask Gemini to adapt recipes to new preferences
+    Returns: (recipes, error)
+    """
+    prompt = build_refine_prompt(current_recipes, preferences)
+    
+    def generate():
+        if user_id is not None:
+            take_token(user_id)
+        refined_text, error = gemini.generate_content(prompt, RECIPE_GENERATION_CONFIG)
+        if error:
+            return None, error
+        return parse_recipes(refined_text)
+    
+    key = singleflight.make_key('refine', prompt, settings.GEMINI_MODEL)
+    return singleflight.do(key, generate)
+
 # ============================================
 # RECIPE SUGGESTION WITH EXPIRY WARNINGS
 # ============================================
 
+COOKABLE_LIMIT = 10
+COOKABLE_LIMIT_MAX = 50
+
+def get_expiring_soon(user):
+    """Items expiring within 7 days, soonest first"""
+    today = date.today()
+    return Grocery.objects.filter(
+        user=user,
+        ex_date__lte=today + timedelta(days=EXPIRING_SOON_DAYS),
+        ex_date__gte=today
+    ).with_expiry_status(today).select_related('grocerie_type').order_by('ex_date')
+
+OFFLINE_MESSAGE = "AI suggestions are unavailable right now, so here are saved recipes that use your expiring items."
+
+def offline_suggestions(request, expiring_items, context, error=None):
+    """
+    Answer from saved recipes when Gemini is down, instead of waiting on
+    it. Redirects with the error if no saved recipe uses these items.
+    """
+    recipes = saved_recipe_matches(expiring_items)
+    if not recipes:
+        messages.error(request, f"Could not generate recipes: {error or gemini.CIRCUIT_OPEN_MESSAGE}")
+        return redirect('index')
+    
+    messages.info(request, OFFLINE_MESSAGE)
+    return render(request, 'food/recipes_suggestion.html', {**context, 'recipes': recipes})
+
 @login_required
+@rate_limited
 def suggest_recipes(request):
     """Get AI-suggested recipes based on soon-expiring ingredients"""
-    user = request.user
-    today = date.today()
-    
     # Get items expiring within 7 days
-    expiring_soon = Grocery.objects.filter(
-        user=user,
-        ex_date__lte=today + timedelta(days=7),
-        ex_date__gte=today
-    ).select_related('grocerie_type').order_by('ex_date')
+    expiring_soon = get_expiring_soon(request.user)
     
     if not expiring_soon.exists():
         messages.info(request, "No ingredients expiring soon! Your fridge is in good shape.")
@@ -232,28 +310,161 @@ def suggest_recipes(request):
     # Get preferences from request if provided
     preferences = request.GET.get('preferences', '')
     
+    context = {
+        'expiring_items': expiring_soon,
+        'expiry_info': expiry_info,
+        'ingredients_list': ingredients
+    }
+    
+    # Circuit open: answer instantly instead of queueing behind a dead upstream
+    if gemini_breaker.is_open():
+        return offline_suggestions(request, expiring_soon, context)
+    
+    # Queue mode: a recipe_worker generates them, the page polls for the result
+    if settings.RECIPE_JOBS_ENABLED:
+        job, _ = jobs.enqueue(request.user, RecipeJob.SUGGEST, {
+            'ingredients': ingredients,
+            'preferences': preferences
+        })
+        return render(request, 'food/recipes_suggestion.html', {
+            'recipes': [],
+            'job_url': reverse('recipe_job_status', args=[job.pk]),
+            'expiring_items': expiring_soon,
+            'expiry_info': expiry_info,
+            'ingredients_list': ingredients
+        })
+    
+    # Streaming mode: render the page now, recipes arrive over SSE
+    if settings.GEMINI_STREAM_SUGGESTIONS:
+        return render(request, 'food/recipes_suggestion.html', {
+            'recipes': [],
+            'stream_url': f"{reverse('stream_recipes')}?{urlencode({'preferences': preferences})}",
+            'expiring_items': expiring_soon,
+            'expiry_info': expiry_info,
+            'ingredients_list': ingredients
+        })
+    
     # Generate recipes using Gemini API
-    recipes_text, error = get_ai_recipe_suggestion(ingredients, preferences)
+    recipes, error = get_ai_recipe_suggestion(ingredients, preferences, request.user.pk)
     
     if error:
-        messages.error(request, f"Could not generate recipes: {error}")
-        return redirect('index')
+        return offline_suggestions(request, expiring_soon, context, error)
     
-    if not recipes_text:
+    if not recipes:
         messages.error(request, "Failed to generate recipes. Please try again.")
         return redirect('index')
     
-    return render(request, 'food/recipes_suggestion.html', {
-        'recipes': recipes_text,
-        'expiring_items': expiring_soon,
-        'expiry_info': expiry_info,
-        'ingredients_list': ingredients
+    return render(request, 'food/recipes_suggestion.html', {**context, 'recipes': recipes})
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def recipe_event(index, recipe):
+    """SSE message carrying one parsed recipe and its rendered card"""
+    return sse_event('recipe', {
+        'index': index,
+        'recipe': recipe,
+        'html': render_to_string('food/recipe_card.html', {'recipe': recipe, 'idx': index})
     })
 
+@login_required
+def stream_recipes(request):
+    """Relay Gemini streamGenerateContent as one SSE event per finished recipe"""
+    expiring_items = list(get_expiring_soon(request.user))
+    ingredients = [g.grocery_name for g in expiring_items]
+    preferences = request.GET.get('preferences', '')
+    
+    def offline_events(error):
+        recipes = saved_recipe_matches(expiring_items)
+        if not recipes:
+            yield sse_event('error', {'message': error})
+            return
+        yield sse_event('notice', {'message': OFFLINE_MESSAGE})
+        for index, recipe in enumerate(recipes):
+            yield recipe_event(index, recipe)
+        yield sse_event('done', {})
+    
+    def event_stream():
+        if not ingredients:
+            yield sse_event('error', {'message': "No ingredients expiring soon!"})
+            return
+        
+        model = settings.GEMINI_MODEL
+        cache_key = ai_cache.make_cache_key(ingredients, preferences, model, RECIPE_GENERATION_CONFIG)
+        # Identical concurrent loads wait for one stream, then read its cached text
+        token, cached_text = singleflight.lead_or_wait(
+            cache_key, lambda: ai_cache.peek_cached_response(cache_key)
+        )
+        # However often the wait polled, the request counts as one lookup
+        ai_cache.record_lookup(cache_key, hit=cached_text is not None)
+        if cached_text:
+            recipes, error = parse_recipes(cached_text)
+            if error:
+                yield sse_event('error', {'message': error})
+                return
+            for index, recipe in enumerate(recipes):
+                yield recipe_event(index, recipe)
+            yield sse_event('done', {})
+            return
+        
+        try:
+            yield from upstream_events(cache_key, model)
+        finally:
+            # Also runs when the client disconnects and the generator is closed
+            singleflight.release(cache_key, token)
+    
+    def upstream_events(cache_key, model):
+        try:
+            take_token(request.user.pk)
+        except RateLimited as e:
+            yield sse_event('error', {'message': str(e)})
+            return
+        prompt = build_recipe_prompt(ingredients, preferences)
+        chunks = []
+        stream = JSONArrayStream()
+        count = 0
+        try:
+            for text in gemini.stream_generate_content(prompt, RECIPE_GENERATION_CONFIG, model):
+                chunks.append(text)
+                # Each recipe is sent as soon as its closing brace arrives
+                for item in stream.feed(text):
+                    try:
+                        recipe = clean_recipe(item)
+                    except ValueError:
+                        continue
+                    yield recipe_event(count, recipe)
+                    count += 1
+        except (gemini.GeminiError, ValueError) as e:
+            if count:
+                yield sse_event('error', {'message': str(e)})
+            else:
+                yield from offline_events(str(e))
+            return
+        
+        if not count:
+            yield sse_event('error', {'message': "API returned no recipes."})
+            return
+        
+        # Stored before the lock is released, so waiting requests find it
+        ai_cache.store_response(cache_key, model, ''.join(chunks))
+        yield sse_event('done', {})
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 def view_saved_recipes(request):
     """View all saved recipes"""
-    recipes = Receipe.objects.all().prefetch_related('receipe_ingredients_set__ingredient')
+    # Lines joined to their ingredient: a separate ingredient prefetch lists
+    # every id in one expression, which SQLite rejects past ~1000 ingredients
+    recipes = Receipe.objects.all().prefetch_related(Prefetch(
+        'receipe_ingredients_set',
+        queryset=Receipe_Ingredients.objects.select_related('ingredient')
+    ))
     
     return render(request, 'food/saved_recipes.html', {
         'recipes': recipes
@@ -263,7 +474,7 @@ def view_saved_recipes(request):
 def view_recipe_detail(request, pk):
     """View a single recipe in detail"""
     recipe = get_object_or_404(Receipe, pk=pk)
-    ingredients = recipe.receipe_ingredients_set.all()
+    ingredients = recipe.receipe_ingredients_set.select_related('ingredient')
     
     return render(request, 'food/recipe_detail.html', {
         'recipe': recipe,
@@ -281,6 +492,20 @@ def delete_recipe_view(request, pk):
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+@login_required
+def cookable_now(request):
+    """Saved recipes ranked by how much of them the pantry covers"""
+    try:
+        limit = int(request.GET.get('limit', COOKABLE_LIMIT))
+    except ValueError:
+        limit = COOKABLE_LIMIT
+    recipes = cookable_recipes(request.user, limit=max(1, min(limit, COOKABLE_LIMIT_MAX)))
+    
+    for recipe in recipes:
+        recipe['url'] = reverse('recipe_detail', args=[recipe['id']])
+    
+    return JsonResponse({'status': 'success', 'recipes': recipes})
+
 @login_required
 def save_recipe(request):
     """Save generated recipe to database"""
@@ -288,23 +513,18 @@ def save_recipe(request):
         try:
             data = json.loads(request.body)
             
-            recipe = Receipe.objects.create(
-                name=data.get('recipe_name', 'Unnamed Recipe'),
-                description=data.get('instructions', '')
-            )
+            if 'recipe' in data:
+                recipe_data = clean_recipe(data['recipe'])
+            else:
+                # Legacy payload: free-text instructions and bare ingredient names
+                recipe_data = clean_recipe({
+                    'name': data.get('recipe_name'),
+                    'summary': data.get('instructions'),
+                    'ingredients': list(data.get('ingredients', {}))
+                })
             
-            # Save ingredients
-            ingredients_dict = data.get('ingredients', {})
-            for ingredient_name in ingredients_dict.keys():
-                ingredient, _ = Ingredient.objects.get_or_create(
-                    name=ingredient_name
-                )
-                Receipe_Ingredients.objects.create(
-                    receipe=recipe,
-                    ingredient=ingredient,
-                    quantity=1,
-                    unit='as needed'
-                )
+            # Recipe and ingredients are saved together or not at all
+            recipe = create_recipe(recipe_data)
             
             return JsonResponse({
                 'status': 'success',
@@ -319,13 +539,26 @@ def save_recipe(request):
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+def circuit_open_response():
+    """503 while the Gemini circuit is open, with when to try again"""
+    response = JsonResponse({
+        'status': 'error',
+        'message': gemini.CIRCUIT_OPEN_MESSAGE
+    }, status=503)
+    response['Retry-After'] = str(max(1, round(gemini_breaker.retry_after())))
+    return response
+
 @login_required
+@rate_limited
 def refine_recipe(request):
     """Refine recipe based on user preferences"""
     if request.method == 'POST':
+        if gemini_breaker.is_open():
+            return circuit_open_response()
+        
         try:
             data = json.loads(request.body)
-            current_recipe = data.get('recipe', '')
+            current_recipes = data.get('recipes') or data.get('recipe', '')
             preferences = data.get('preferences', '')
             
             if not preferences:
@@ -334,78 +567,232 @@ def refine_recipe(request):
                     'message': 'Please specify preferences'
                 }, status=400)
             
-            api_key = os.environ.get('GEMINI_API_KEY')
-            if not api_key:
+            if settings.RECIPE_JOBS_ENABLED:
+                job, _ = jobs.enqueue(request.user, RecipeJob.REFINE, {
+                    'recipes': current_recipes,
+                    'preferences': preferences
+                })
+                return queued_job_response(job)
+            
+            recipes, error = refine_recipes(current_recipes, preferences, request.user.pk)
+            
+            if error:
                 return JsonResponse({
                     'status': 'error',
-                    'message': 'API not configured'
+                    'message': error
                 }, status=400)
             
-            # Use same API endpoint as recipe generation
-            url = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash:generateContent?key={api_key}"
+            return JsonResponse({
+                'status': 'success',
+                'recipes': recipes,
+                'html': render_to_string('food/recipe_cards.html', {'recipes': recipes})
+            })
+                
+        except RateLimited:
+            raise
+        except Exception as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
+    
+    return JsonResponse({'error': 'Invalid request'}, status=400)
+
+# ============================================
+# BACKGROUND RECIPE JOBS
+# ============================================
+
+def queued_job_response(job):
+    """202 pointing the page at the job's status endpoint"""
+    return JsonResponse({
+        'status': 'queued',
+        'job_id': job.pk,
+        'poll_url': reverse('recipe_job_status', args=[job.pk])
+    }, status=202)
+
+@login_required
+def recipe_job_status(request, pk):
+    """Poll a recipe job: pending until the worker stores the recipes"""
+    job = get_object_or_404(RecipeJob, pk=pk, user=request.user)
+    
+    if job.status == RecipeJob.DONE:
+        return JsonResponse({
+            'status': 'success',
+            'recipes': job.result,
+            'html': render_to_string('food/recipe_cards.html', {'recipes': job.result})
+        })
+    
+    if job.status == RecipeJob.FAILED:
+        return JsonResponse({
+            'status': 'error',
+            'message': job.error or "Failed to generate recipes. Please try again."
+        })
+    
+    return JsonResponse({
+        'status': 'pending',
+        'job_status': job.status,
+        'attempts': job.attempts
+    })
+
+# ============================================
+# METRICS
+# ============================================
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, behind a bearer token when METRICS_TOKEN is set"""
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if not constant_time_compare(request.headers.get('Authorization', ''), expected):
+            return HttpResponse("Unauthorized", status=401, content_type='text/plain')
+    
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# ============================================
+# ASYNC AI VIEWS (ASGI)
+# ============================================
+
+def async_login_required(view):
+    """login_required for async views, resolves the user without blocking"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+async def aget_ai_recipe_suggestion(ingredients_list, preferences="", user_id=None):
+    """Async version of get_ai_recipe_suggestion"""
+    try:
+        model = settings.GEMINI_MODEL
+        cache_key = ai_cache.make_cache_key(ingredients_list, preferences, model, RECIPE_GENERATION_CONFIG)
+        cached_text = await sync_to_async(ai_cache.get_cached_response)(cache_key)
+        if cached_text:
+            return parse_recipes(cached_text)
+        
+        async def generate():
+            if user_id is not None:
+                await atake_token(user_id)
+            prompt = build_recipe_prompt(ingredients_list, preferences)
+            recipe_text, error = await gemini.agenerate_content(prompt, RECIPE_GENERATION_CONFIG, model)
+            if error:
+                return None, error
             
-            prompt = f"""Modify this recipe based on the following preferences: {preferences}
+            recipes, error = parse_recipes(recipe_text)
+            if recipes:
+                await sync_to_async(ai_cache.store_response)(cache_key, model, recipe_text)
+            return recipes, error
+        
+        return await singleflight.ado(cache_key, generate)
+    
+    except RateLimited:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return None, f"Error generating recipes: {str(e)}"
 
-Current Recipe:
-{current_recipe}
+@async_login_required
+@rate_limited
+async def asuggest_recipes(request):
+    """Async version of suggest_recipes, the Gemini wait does not hold a thread"""
+    expiring_soon = get_expiring_soon(request.user)
+    
+    if not await expiring_soon.aexists():
+        messages.info(request, "No ingredients expiring soon! Your fridge is in good shape.")
+        return redirect('index')
+    
+    expiring_items = [g async for g in expiring_soon]
+    ingredients = [g.grocery_name for g in expiring_items]
+    expiry_info = [(g.grocery_name, g.ex_date) for g in expiring_items]
+    preferences = request.GET.get('preferences', '')
+    
+    context = {
+        'recipes': [],
+        'expiring_items': expiring_items,
+        'expiry_info': expiry_info,
+        'ingredients_list': ingredients
+    }
+    
+    if await sync_to_async(gemini_breaker.is_open)():
+        return await sync_to_async(offline_suggestions)(request, expiring_items, context)
+    
+    if settings.RECIPE_JOBS_ENABLED:
+        job, _ = await sync_to_async(jobs.enqueue)(request.user, RecipeJob.SUGGEST, {
+            'ingredients': ingredients,
+            'preferences': preferences
+        })
+        context['job_url'] = reverse('recipe_job_status', args=[job.pk])
+    elif settings.GEMINI_STREAM_SUGGESTIONS:
+        context['stream_url'] = f"{reverse('stream_recipes')}?{urlencode({'preferences': preferences})}"
+    else:
+        recipes, error = await aget_ai_recipe_suggestion(ingredients, preferences, request.user.pk)
+        
+        if error:
+            return await sync_to_async(offline_suggestions)(request, expiring_items, context, error)
+        
+        if not recipes:
+            messages.error(request, "Failed to generate recipes. Please try again.")
+            return redirect('index')
+        
+        context['recipes'] = recipes
+    
+    # Context processors hit the database, so render off the event loop
+    return await sync_to_async(render)(request, 'food/recipes_suggestion.html', context)
 
-Provide the modified recipe with the same format as before."""
+@async_login_required
+@rate_limited
+async def arefine_recipe(request):
+    """Async version of refine_recipe"""
+    if request.method == 'POST':
+        if await sync_to_async(gemini_breaker.is_open)():
+            return await sync_to_async(circuit_open_response)()
+        
+        try:
+            data = json.loads(request.body)
+            current_recipes = data.get('recipes') or data.get('recipe', '')
+            preferences = data.get('preferences', '')
             
-            payload = {
-                "contents": [
-                    {
-                        "parts": [
-                            {
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ],
-                "generationConfig": {
-                    "temperature": 0.5,
-                    "maxOutputTokens": 4096,
-                    "topP": 0.9,
-                }
-            }
+            if not preferences:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': 'Please specify preferences'
+                }, status=400)
             
-            headers = {
-                "Content-Type": "application/json"
-            }
+            if settings.RECIPE_JOBS_ENABLED:
+                job, _ = await sync_to_async(jobs.enqueue)(request.user, RecipeJob.REFINE, {
+                    'recipes': current_recipes,
+                    'preferences': preferences
+                })
+                return queued_job_response(job)
             
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
+            prompt = build_refine_prompt(current_recipes, preferences)
             
-            if response.status_code == 200:
-                data = response.json()
-                if 'candidates' in data and len(data['candidates']) > 0:
-                    candidate = data['candidates'][0]
-                    if 'content' in candidate and 'parts' in candidate['content']:
-                        refined_recipe = candidate['content']['parts'][0]['text']
-                        return JsonResponse({
-                            'status': 'success',
-                            'recipe': refined_recipe
-                        })
-                    else:
-                        finish_reason = candidate.get('finishReason', '')
-                        if finish_reason == 'MAX_TOKENS':
-                            return JsonResponse({
-                                'status': 'error',
-                                'message': 'Response was cut off. Please try again.'
-                            }, status=400)
-                        return JsonResponse({
-                            'status': 'error',
-                            'message': 'No response from API'
-                        }, status=400)
-                else:
-                    return JsonResponse({
-                        'status': 'error',
-                        'message': 'No response from API'
-                    }, status=400)
-            else:
+            async def generate():
+                await atake_token(request.user.pk)
+                refined_text, error = await gemini.agenerate_content(prompt, RECIPE_GENERATION_CONFIG)
+                if error:
+                    return None, error
+                return parse_recipes(refined_text)
+            
+            key = singleflight.make_key('refine', prompt, settings.GEMINI_MODEL)
+            recipes, error = await singleflight.ado(key, generate)
+            
+            if error:
                 return JsonResponse({
                     'status': 'error',
-                    'message': 'Failed to refine recipe'
+                    'message': error
                 }, status=400)
-                
+            
+            return JsonResponse({
+                'status': 'success',
+                'recipes': recipes,
+                'html': render_to_string('food/recipe_cards.html', {'recipes': recipes})
+            })
+        
+        except RateLimited:
+            raise
         except Exception as e:
             return JsonResponse({
                 'status': 'error',
@@ -414,6 +801,98 @@ Provide the modified recipe with the same format as before."""
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+# ============================================
+# PANTRY IMPORT / EXPORT
+# ============================================
+
+@login_required
+def import_groceries(request):
+    """Add groceries from an uploaded CSV or JSON file, streamed in batches"""
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if upload is None:
+            messages.error(request, 'Choose a CSV or JSON file to import.')
+            return redirect('index')
+        
+        import_format = request.POST.get('format') or transfer.guess_format(upload.name)
+        if import_format not in transfer.FORMATS:
+            messages.error(request, f'Unsupported format "{import_format}".')
+            return redirect('index')
+        
+        # CSV is read line by line, JSON in upload-sized chunks
+        chunks = upload if import_format == 'csv' else upload.chunks()
+        try:
+            result = transfer.import_groceries(
+                request.user, transfer.read_rows(transfer.decode(chunks), import_format)
+            )
+        except (UnicodeDecodeError, csv.Error, json.JSONDecodeError) as e:
+            messages.error(request, f'Could not read {upload.name}: {e}')
+            return redirect('index')
+        
+        imported = result['imported']
+        messages.success(request, f'Imported {imported} grocer{"ies" if imported != 1 else "y"}.')
+        if result['error_count']:
+            messages.warning(request, (
+                f"Skipped {result['error_count']} invalid row{'s' if result['error_count'] != 1 else ''}: "
+                + '; '.join(result['errors'])
+            ))
+    return redirect('index')
+
+@login_required
+def export_groceries(request):
+    """Download the whole pantry as CSV (default) or JSON, streamed"""
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in transfer.FORMATS:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Unsupported format "{export_format}"'
+        }, status=400)
+    
+    response = StreamingHttpResponse(
+        transfer.EXPORTERS[export_format](transfer.export_rows(request.user)),
+        content_type=transfer.CONTENT_TYPES[export_format]
+    )
+    response['Content-Disposition'] = f'attachment; filename="groceries-{date.today().isoformat()}.{export_format}"'
+    return response
+
+# ============================================
+# BULK GROCERY EDITS
+# ============================================
+
+@login_required
+def bulk_edit_groceries(request):
+    """
+    JSON API for the pantry checkboxes: {"action": ..., "ids": [...]}
+    plus "days" for shift_expiry or "category" for set_category.
+    delete_expired needs no ids.
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Request body must be a JSON object'
+            }, status=400)
+        
+        count, error = bulk.apply_action(request.user, data)
+        if error:
+            return JsonResponse({
+                'status': 'error',
+                'message': error
+            }, status=400)
+        
+        verb = 'deleted' if data['action'].startswith('delete') else 'updated'
+        return JsonResponse({
+            'status': 'success',
+            'message': f'{count} grocer{"ies" if count != 1 else "y"} {verb}.',
+            'count': count
+        })
+    
+    return JsonResponse({'error': 'Invalid request'}, status=400)
+
 # ============================================
 # EXISTING FUNCTIONS (Keep as is)
 # ============================================
@@ -494,36 +973,82 @@ def delete_grocery(request, pk):
 def shopping_list(request):
     search_query = request.GET.get('search', '').strip()
     shop_list = ShoppingList.objects.filter(user=request.user).select_related('grocery', 'grocery__grocerie_type')
-    groceries = Grocery.objects.filter(user=request.user).select_related('grocerie_type')
-    
-    if search_query:
-        groceries = groceries.filter(
-            Q(grocery_name__icontains=search_query) |
-            Q(grocerie_type__type_name__icontains=search_query)
-        )
-    
-    groceries = groceries.order_by('grocery_name')
+    groceries = get_user_groceries(request, search_query)
+    page, next_cursor = keyset_page(
+        groceries, PICKER_ORDERING, request.GET.get('after'), get_page_size(request)
+    )
     
     return render(request, 'food/shopping.html', {
         'shop_list': shop_list,
-        'groceries': groceries,
+        'groceries': page,
+        'total_count': groceries.count() if search_query else None,
+        'next_cursor': next_cursor,
         'search_query': search_query
     })
 
 @login_required
-def add_to_shopping_list(request, pk):
-    grocery = get_object_or_404(Grocery, pk=pk, user=request.user)
-    shop_item, created = ShoppingList.objects.get_or_create(
-        user=request.user,
-        grocery=grocery,
-        defaults={'quantity': 1}
+def shopping_grocery_page(request):
+    """Infinite scroll: the next page of the shopping grocery picker"""
+    search_query = request.GET.get('search', '').strip()
+    page, next_cursor = keyset_page(
+        get_user_groceries(request, search_query),
+        PICKER_ORDERING, request.GET.get('after'), get_page_size(request)
     )
-    if not created:
-        shop_item.quantity += 1
-        shop_item.save()
+    
+    return JsonResponse({
+        'html': render_to_string('food/shopping_grocery_rows.html', {'groceries': page}),
+        'next': next_cursor
+    })
+
+def add_groceries_to_shopping_list(user, grocery_ids):
+    """
+    Add one of each grocery to the user's shopping list: insert the
+    missing rows at zero, then increment them all in a single UPDATE.
+    The increment is done by the database, so concurrent clicks never
+    lose one, and the query count doesn't grow with the batch (until
+    bulk_create splits it to stay under SQLite's parameter limit).
+    Returns the number of list rows incremented.
+    """
+    grocery_ids = list(grocery_ids)
+    if not grocery_ids:
+        return 0
+    with transaction.atomic():
+        ShoppingList.objects.bulk_create(
+            [ShoppingList(user=user, grocery_id=grocery_id, quantity=0) for grocery_id in grocery_ids],
+            ignore_conflicts=True
+        )
+        return ShoppingList.objects.filter(user=user, grocery_id__in=grocery_ids).update(
+            quantity=F('quantity') + 1
+        )
+
+@login_required
+def add_to_shopping_list(request, pk):
+    grocery = get_object_or_404(Grocery.objects.only('grocery_name'), pk=pk, user=request.user)
+    add_groceries_to_shopping_list(request.user, [grocery.pk])
     messages.success(request, f'{grocery.grocery_name} added to your shopping list!')
     return redirect('shopping')
 
+@login_required
+def bulk_add_to_shopping_list(request):
+    """
+    Add several groceries at once: the ticked grocery_ids, or with
+    expiring=1 everything expired or expiring soon
+    """
+    if request.method == 'POST':
+        groceries = Grocery.objects.filter(user=request.user)
+        if request.POST.get('expiring'):
+            groceries = groceries.filter(ex_date__lte=date.today() + timedelta(days=EXPIRING_SOON_DAYS))
+        else:
+            grocery_ids = [value for value in request.POST.getlist('grocery_ids') if value.isdigit()]
+            groceries = groceries.filter(pk__in=grocery_ids)
+        
+        added = add_groceries_to_shopping_list(request.user, groceries.values_list('pk', flat=True))
+        if added:
+            messages.success(request, f'{added} item{"s" if added != 1 else ""} added to your shopping list!')
+        else:
+            messages.info(request, 'No groceries to add.')
+    return redirect('shopping')
+
 @login_required
 def remove_from_shopping_list(request, pk):
     shop_item = get_object_or_404(ShoppingList, pk=pk, user=request.user)